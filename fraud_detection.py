@@ -1,509 +1,521 @@
+import datetime
+import os
+import time
+from contextlib import closing
+
 import streamlit as st
-import pandas as pd
-from io import BytesIO
-import numpy as np
-from datetime import datetime
+
+from fraud_engine import (
+    ChainBudget,
+    EntityIndex,
+    ResultCache,
+    SCENARIO_HOPS,
+    RunArchive,
+    RunProfile,
+    Scheduler,
+    b2w_send_w2b_repetitions,
+    cache_key,
+    cashin_w2b_repetitions,
+    chain_labels,
+    chains_by_distributor,
+    classify_transactions,
+    content_hash,
+    detect_b2w_send_w2b,
+    detect_cashin_w2b,
+    detect_circular,
+    detect_money_chains,
+    detect_repeats,
+    detect_rings,
+    detect_velocity,
+    load_risk_rules,
+    load_transactions,
+    page_of,
+    recurrent_clients,
+    ring_wallets,
+    row_count,
+    run_detection,
+    summarize_circular,
+)
+from fraud_engine.archive import run_params
+from fraud_engine.classify import DEFAULT_CLASSIFIER
+from fraud_engine.database import (
+    ConnectionPool,
+    DatabaseSource,
+    connect_from_env,
+    default_table,
+    default_version_column,
+)
+from fraud_engine.export import csv_bytes, excel_bytes
+from fraud_engine.paging import page_count
+from fraud_engine.profiles import ProfileStore
+from fraud_engine.pipeline import BACKENDS, finalize_results
+from fraud_engine.repeats import REPEAT_RESULTS
+from fraud_engine.rings import RING_HOP_DELAY
+from fraud_engine.scheduler import DONE, FAILED, FINISHED_STATES, RUNNING, TIMEOUT
+from fraud_engine.velocity import VELOCITY_BURST_RATIO, VELOCITY_WINDOWS
+
+# Tailles de page proposées pour les tableaux de résultats
+PAGE_SIZES = [100, 500, 1000]
+
+# Profondeur maximale de recherche des chaînes Cash In → Send Money (N) → W2B
+CHAIN_MAX_DEPTH = 10
+
+# Délai maximal proposé par défaut pour chaque étape en fenêtre glissante (minutes)
+DEFAULT_HOP_DELAY = 120
+
+# Intervalle de rafraîchissement de l'avancement des détecteurs (secondes)
+PROGRESS_POLL = 0.5
+
+# Jours proposés par défaut pour une lecture en base de données
+DEFAULT_DB_DAYS = 7
+
+# Nombre maximal de détections archivées affichées par recherche
+ARCHIVE_HIT_LIMIT = 10000
+
+# Titres des tableaux répétitifs de l'historique
+HISTORY_TITLES = {
+    'repeat_mp': "⚠️ Paiement Marchand >2",
+    'redeem': "✨ Points de Fidélité",
+    'repeat_cashin': "✨ CASH IN",
+    'repeat_w2b': "✨ W2B",
+    'cashin_volume': "✨ Volume Cash In par bénéficiaire",
+}
+
+# Titres des tableaux de détection dans la fiche d'une entité
+DETECTION_TITLES = {
+    'repeat_mp': "⚠️ Paiement Marchand >2",
+    'redeem': "✨ Points de Fidélité",
+    'repeat_cashin': "✨ CASH IN",
+    'repeat_w2b': "✨ W2B",
+    'circular': "🔁 Scénarios circulaires",
+    'cashin_w2b': "🚨 Cash In suivi de W2B",
+    'chains': "🚨 Chaînes Cash In → Send Money (N) → W2B",
+    'b2w_send_w2b': "🚨 B2W → Send Money → W2B",
+    'rings': "🔄 Anneaux de Send Money",
+    'velocity': "⚡ Rafales de transactions",
+}
+
+# Étapes mesurées (et profilables avec cProfile) dans le panneau Performance
+STAGES = [
+    'preprocessed', 'types', 'repeats', 'circular', 'cashin_w2b', 'chains', 'b2w_send_w2b', 'rings', 'velocity',
+    'entities',
+]
+
+
+@st.cache_resource
+def get_risk_rules():
+    """Règles de score (FRAUD_RISK_RULES ou config/risk_rules.json)."""
+    return load_risk_rules()
+
+
+@st.cache_resource
+def get_result_cache():
+    """Cache partagé entre les sessions et les reruns Streamlit."""
+    return ResultCache(
+        max_bytes=int(os.environ.get('FRAUD_CACHE_MAX_MB', 2048)) * 1024 ** 2,
+        disk_dir=os.environ.get('FRAUD_CACHE_DIR') or None,
+    )
+
+
+@st.cache_resource
+def get_connection_pool():
+    """Pool de connexions partagé entre les sessions (None si aucune base FRAUD_DB_* n'est configurée)."""
+    connect = connect_from_env()
+    return ConnectionPool(connect) if connect else None
+
+
+@st.cache_resource
+def get_profile_store():
+    """Historique des agrégats partagé entre les sessions (None si FRAUD_PROFILE_DIR n'est pas défini)."""
+    profile_dir = os.environ.get('FRAUD_PROFILE_DIR')
+    return ProfileStore(profile_dir) if profile_dir else None
+
+
+@st.cache_resource
+def get_run_archive():
+    """Archive des exécutions partagée entre les sessions (None si FRAUD_ARCHIVE_DB n'est pas défini)."""
+    archive_path = os.environ.get('FRAUD_ARCHIVE_DB')
+    return RunArchive(archive_path) if archive_path else None
+
+
+def window_label(minutes):
+    """Durée lisible d'une fenêtre : 10 min, 1 h, 24 h."""
+    return f"{minutes // 60:g} h" if minutes % 60 == 0 else f"{minutes:g} min"
+
+
+def show_table(table, key, columns=None):
+    """
+    Affiche un tableau de résultats page par page : filtre, tri et pagination
+    sont calculés côté serveur et seule la page visible est envoyée au navigateur.
+
+    Args:
+        table: DataFrame complet
+        key: préfixe unique des widgets du tableau
+        columns: colonnes affichées, None = toutes
+    """
+    columns = list(columns if columns is not None else table.columns)
+    if len(table) <= PAGE_SIZES[0]:
+        st.dataframe(chain_labels(table[columns]), use_container_width=True)
+    else:
+        filter_col, sort_col, order_col, size_col, page_col = st.columns([3, 2, 1, 1, 1])
+        query = filter_col.text_input("🔎 Filtrer", key=f"{key}_query")
+        sort_by = sort_col.selectbox("Trier par", [None] + columns, key=f"{key}_sort",
+                                     format_func=lambda column: "Ordre d'origine" if column is None else column)
+        descending = order_col.checkbox("Décroissant", key=f"{key}_desc")
+        page_size = size_col.selectbox("Lignes", PAGE_SIZES, key=f"{key}_size")
+        page = page_col.number_input("Page", min_value=1, value=1, step=1, key=f"{key}_page")
+
+        rows, total = page_of(table, page, page_size, sort_by=sort_by, ascending=not descending,
+                              query=query, columns=columns)
+        # Libellés des parcours construits pour la seule page affichée
+        st.dataframe(chain_labels(rows), use_container_width=True)
+        first = (min(page, page_count(total, page_size)) - 1) * page_size + 1 if total else 0
+        st.caption(f"Lignes {first}–{first + len(rows) - 1 if total else 0} sur {total} ({len(table)} au total)")
+    st.download_button("📥 CSV", lambda: csv_bytes(table), file_name=f"{key}.csv", mime="text/csv",
+                       key=f"{key}_csv")
+
+
+@st.fragment
+def render_archive(run_archive):
+    """Recherche dans l'archive des exécutions (fragment : une recherche ne relance pas les détecteurs)."""
+    runs = run_archive.runs()
+    if runs.empty:
+        st.info("Archive vide : chaque analyse terminée y est ajoutée.")
+        return
+    msisdn_col, start_col, end_col = st.columns([2, 1, 1])
+    msisdn = msisdn_col.text_input("🔎 MSISDN", key='archive_msisdn').strip() or None
+    start = start_col.date_input("Du", value=None, key='archive_start')
+    end = end_col.date_input("Au", value=None, key='archive_end')
+    scenario_col, run_col = st.columns(2)
+    scenarios = scenario_col.multiselect("Scénarios", list(DETECTION_TITLES), format_func=DETECTION_TITLES.get,
+                                         key='archive_scenarios') or None
+    run_labels = {row.run_id: f"{row.run_id} — {row.source} ({row.created_at})" for row in runs.itertuples()}
+    run_id = run_col.selectbox("Exécution", [None] + list(run_labels), key='archive_run',
+                               format_func=lambda run: "Toutes" if run is None else run_labels[run])
+    if msisdn is None and start is None and end is None and scenarios is None and run_id is None:
+        st.caption(f"{len(runs)} exécution(s) archivée(s)")
+        show_table(runs, 'archive_runs')
+        return
+
+    started = time.perf_counter()
+    hits = run_archive.hits(msisdn=msisdn, start=start, end=end, scenarios=scenarios, run_id=run_id,
+                            limit=ARCHIVE_HIT_LIMIT)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if hits.empty:
+        st.info("Aucune détection archivée pour cette recherche.")
+        return
+    limited = " (limite atteinte)" if len(hits) == ARCHIVE_HIT_LIMIT else ""
+    st.caption(f"{len(hits)} détection(s){limited} dans {hits['run_id'].nunique()} exécution(s), "
+               f"trouvées en {elapsed_ms:.0f} ms")
+    for name, rows in RunArchive.detections(hits).items():
+        st.markdown(f"**{DETECTION_TITLES[name]}**")
+        show_table(rows, f"archive_{name}")
+
 
 st.set_page_config(page_title="Détection des Scénarios de fraude", layout="wide")
 st.title("🕵️ Détection des Scénarios de fraude")
 
-uploaded_file = st.file_uploader("📤 Charger le fichier CSV des transactions", type=["csv"])
-
-if uploaded_file:
-    # ✅ Lecture unique du fichier avec optimisations
-    with st.spinner("Chargement et prétraitement des données..."):
-        df = pd.read_csv(
-            uploaded_file,
-            dtype={
-                'DEBIT_MSISDN': 'str',
-                'CREDIT_MSISDN': 'str',
-                'REASON_NAME': 'str',
-                'ACTUAL_AMOUNT': 'float32'
-            },
-            parse_dates=['INITATE_DATE']
-        )
-        
-        # Prétraitement global une seule fois
-        df['REASON_NAME'] = df['REASON_NAME'].str.strip().str.lower()
-        df['DEBIT_MSISDN'] = df['DEBIT_MSISDN'].str.strip()
-        df['CREDIT_MSISDN'] = df['CREDIT_MSISDN'].str.strip()
-        df['DATE'] = df['INITATE_DATE'].dt.date
-        
-        # Créer des indexes pour accélérer les filtres
-        df = df.sort_values('INITATE_DATE').reset_index(drop=True)
-
-    # ✅ Pré-filtrage par type de transaction (une seule fois)
-    with st.spinner("Classification des transactions..."):
-        mp_all = df[df['REASON_NAME'].str.contains("merchant payment", na=False)].copy()
-        cashin_all = df[df['REASON_NAME'].str.contains("customer cash in", na=False)].copy()
-        cashout_all = df[df['REASON_NAME'].str.contains("cash out", na=False)].copy()
-        w2b_all = df[df['REASON_NAME'].str.contains("w2b", na=False)].copy()
-        b2w_all = df[df['REASON_NAME'].str.contains("b2w", na=False)].copy()
-        send_all = df[df['REASON_NAME'].str.contains("send money", na=False)].copy()
-        redeem_all = df[df['REASON_NAME'].str.contains("customer redeem point to balance", na=False)].copy()
+# 📥 Source : fichier CSV chargé ou table de la base configurée (FRAUD_DB_*)
+connection_pool = get_connection_pool()
+source_kind = st.radio(
+    "📥 Source des transactions", ["Fichier CSV", "Base de données"], horizontal=True,
+    disabled=connection_pool is None,
+    help="Base de données : lecture en flux, seules la plage de dates et les transactions utiles aux "
+         "détecteurs sont transférées. À configurer par les variables FRAUD_DB_*."
+)
+if source_kind == "Base de données":
+    start_col, end_col = st.columns(2)
+    end_day = end_col.date_input("Au", value=datetime.date.today())
+    start_day = start_col.date_input("Du", value=end_day - datetime.timedelta(days=DEFAULT_DB_DAYS - 1))
+    source = DatabaseSource(connection_pool, default_table(), start=start_day, end=end_day,
+                            version_column=default_version_column())
+else:
+    source = st.file_uploader("📤 Charger le fichier CSV des transactions", type=["csv"])
 
-    # ==========================================
-    # 1️⃣ DÉTECTIONS SIMPLES (Agrégations)
-    # ==========================================
-    with st.spinner("Détection des patterns répétitifs..."):
-        
-        # Paiements marchands répétitifs
-        repeat_df = (
-            mp_all.groupby(['DEBIT_MSISDN', 'CREDIT_MSISDN'], as_index=False)
-            .size()
-            .rename(columns={'size': 'nb_paiements'})
-            .query('nb_paiements > 2')
-        )
-        
-        # Cash In répétitifs
-        repeat_cashin_df = (
-            cashin_all.groupby(['DEBIT_MSISDN', 'CREDIT_MSISDN'], as_index=False)
-            .size()
-            .rename(columns={'size': 'nb_cashin'})
-            .query('nb_cashin >= 2')
-        )
-        
-        # W2B répétitifs
-        repeat_w2b_df = (
-            w2b_all.groupby(['DEBIT_MSISDN', 'CREDIT_MSISDN'], as_index=False)
-            .size()
-            .rename(columns={'size': 'nb_W2B'})
-            .query('nb_W2B >= 2')
-        )
-        
-        # Points de fidélité
-        redeem_df = (
-            redeem_all.groupby('CREDIT_MSISDN', as_index=False)
-            .agg(
-                volume=('ACTUAL_AMOUNT', 'count'),
-                valeur=('ACTUAL_AMOUNT', 'sum')
-            )
-        )
-        
-        # Cash In fragmenté
-        cashin_df = (
-            cashin_all.groupby('CREDIT_MSISDN', as_index=False)
-            .agg(
-                volume=('ACTUAL_AMOUNT', 'count'),
-                valeur=('ACTUAL_AMOUNT', 'sum')
+profiled_stage = st.sidebar.selectbox(
+    "🔬 Profiler une étape (cProfile)", ['Aucune'] + STAGES,
+    help="L'étape choisie est recalculée (hors cache) sous cProfile ; le résumé apparaît dans le panneau Performance."
+)
+
+backend = st.sidebar.selectbox(
+    "⚙️ Moteur d'exécution", BACKENDS,
+    help="duckdb : tous les détecteurs en SQL (DuckDB embarqué, multi-thread, débordement sur disque), "
+         "pour les fichiers plus gros que la mémoire. Résultats identiques à pandas."
+)
+
+# 🕐 Fenêtres glissantes : délai maximal par étape au lieu du jour calendaire
+windows = {}
+with st.sidebar.expander("🕐 Fenêtres glissantes"):
+    if st.checkbox("Joindre au-delà de minuit",
+                   help="Chaque étape d'un scénario doit suivre la précédente d'au plus le délai indiqué, "
+                        "même le jour suivant (sinon : même jour calendaire)."):
+        for scenario, hops in SCENARIO_HOPS.items():
+            windows[scenario] = tuple(
+                st.number_input(f"{hop} (min)", min_value=1, value=DEFAULT_HOP_DELAY, key=f"{scenario}_{index}")
+                for index, hop in enumerate(hops)
             )
+
+# 🔗 Budget de la recherche des chaînes (0 = illimité)
+with st.sidebar.expander("🔗 Recherche des chaînes"):
+    chain_budget = ChainBudget(
+        top_k=st.number_input("Meilleures chaînes conservées", min_value=0, value=0, step=100,
+                              help="Chaînes évaluées par lots, seules les N de plus haut score restent "
+                                   "en mémoire (0 = toutes).") or None,
+        max_paths=st.number_input("Chaînes max. par Cash In", min_value=0, value=0, step=10) or None,
+        max_nodes=st.number_input("Send Money explorés max. par Cash In", min_value=0, value=0, step=100) or None,
+        dedup=st.checkbox("Une chaîne par suite de clients",
+                          help="Pour un même Cash In, les chaînes passant par les mêmes clients "
+                               "(W2B ou Send Money répétés) ne sont comptées qu'une fois."),
+    )
+
+# ⚡ Vélocité : seuil de chaque fenêtre glissante et rapport à l'habitude du portefeuille
+with st.sidebar.expander("⚡ Vélocité"):
+    velocity_windows = {
+        minutes: st.number_input(f"Rafale sur {window_label(minutes)} (transactions)", min_value=1,
+                                 value=threshold, key=f"velocity_{minutes}")
+        for minutes, threshold in VELOCITY_WINDOWS.items()
+    }
+    velocity_ratio = st.number_input(
+        "Rapport à l'habitude", min_value=0.0, value=VELOCITY_BURST_RATIO, step=1.0,
+        help="Pic du jour d'un flux rapporté à la moyenne de ses pics des autres jours à partir duquel "
+             "il est une rafale (0 = seuils seulement)."
+    ) or None
+
+# ⏱️ Exécution : détecteurs en parallèle, chacun affiché dès qu'il se termine
+with st.sidebar.expander("⏱️ Exécution"):
+    time_budget = st.number_input(
+        "Budget de temps (s)", min_value=0, value=0, step=30,
+        help="Au-delà, les détecteurs non terminés sont interrompus (0 = illimité)."
+    ) or None
+
+# 🗂️ Archive : détections des analyses précédentes, par MSISDN, période ou scénario
+run_archive = get_run_archive()
+if run_archive is not None:
+    with st.expander("🗂️ Archive des détections", expanded=not source):
+        render_archive(run_archive)
+
+# Détecteurs annulés par l'utilisateur (bouton « ⏹️ Annuler » de leur panneau)
+cancelled = st.session_state.setdefault('cancelled_detectors', set())
+
+if source:
+    # ✅ Résultats mis en cache par empreinte du fichier ou de la requête (reruns instantanés)
+    result_cache = get_result_cache()
+    file_hash = content_hash(source)
+    risk_rules = get_risk_rules()
+    # Règles de classification (config/transaction_types.json ou FRAUD_TRANSACTION_TYPES) : dans toutes
+    # les clés dépendant des types, pour ne jamais resservir une classification périmée
+    classifier_fingerprint = DEFAULT_CLASSIFIER.fingerprint()
+
+    # 🗂️ Transactions déjà analysées avec les mêmes paramètres : résultats relus dans l'archive
+    # (mêmes paramètres que la ligne de commande : une exécution archivée par l'une est reconnue par l'autre)
+    archive_params = run_params(
+        max_depth=CHAIN_MAX_DEPTH, windows=windows, risk_rules=risk_rules, classifier=DEFAULT_CLASSIFIER,
+        chain_budget=chain_budget, velocity_windows=velocity_windows, velocity_ratio=velocity_ratio
+    )
+    archived_run = run_archive.find(file_hash, archive_params) if run_archive is not None else None
+
+    # ⏱️ Mesures par étape (temps, lignes, mémoire, tailles des jointures)
+    profile = RunProfile(profile_stages=[profiled_stage]).start()
+
+    def cached(stage, compute, **params):
+        with profile.stage(stage) as record:
+            if stage == profiled_stage:
+                record['cache'] = 'profilé'
+                value = compute()
+            else:
+                record['cache'] = 'hit'
+
+                def compute_recorded():
+                    record['cache'] = 'miss'
+                    return compute()
+
+                value = result_cache.get_or_compute(cache_key(stage, file_hash, **params), compute_recorded)
+            record['rows_out'] = row_count(value)
+        return value
+
+    # 🧵 Graphe des étapes : chargement → classification → détecteurs indépendants, exécutés en parallèle
+    scheduler = Scheduler(time_budget=time_budget)
+    # Étape fournissant tous les résultats en une fois (archive ou passe DuckDB), None = détecteurs pandas
+    results_stage = 'archive' if archived_run is not None else 'duckdb' if backend == 'duckdb' else None
+    if results_stage == 'archive':
+        st.info(f"♻️ Transactions déjà analysées avec ces paramètres : résultats de l'exécution "
+                f"{archived_run} relus dans l'archive.")
+        scheduler.add('archive', lambda: cached('archive', lambda: run_archive.load(archived_run), run=archived_run))
+    elif results_stage == 'duckdb':
+        # ⚙️ Backend DuckDB : tous les détecteurs en une passe SQL, hors mémoire
+        scheduler.add('duckdb', lambda: cached(
+            'duckdb',
+            lambda: run_detection(
+                source, backend='duckdb', workers=0, max_depth=CHAIN_MAX_DEPTH, windows=windows,
+                risk_rules=risk_rules, chain_budget=chain_budget, velocity_windows=velocity_windows,
+                velocity_ratio=velocity_ratio
+            ),
+            max_depth=CHAIN_MAX_DEPTH,
+            window=windows,
+            rules=risk_rules.fingerprint(),
+            budget=chain_budget.to_dict(),
+            velocity=velocity_windows,
+            velocity_ratio=velocity_ratio,
+            classifier=classifier_fingerprint
+        ))
+    else:
+        # 📥 Backend pandas : lecture de la source puis classification par type, en cache, dont dépendent
+        # tous les détecteurs du graphe
+        scheduler.add('preprocessed', lambda: cached('preprocessed', lambda: load_transactions(source)))
+        scheduler.add(
+            'types', lambda preprocessed: cached(
+                'types', lambda: classify_transactions(preprocessed), classifier=classifier_fingerprint
+            ),
+            after=['preprocessed']
         )
 
-    # 📊 Affichage des résultats simples
-    col1, col2, col3, col4 = st.columns(4)
+    detector_params = {}
 
-    with col1:
-        st.subheader("⚠️ Paiement Marchand >2")
-        if not repeat_df.empty:
-            st.dataframe(repeat_df, use_container_width=True)
+    def detector(stage, compute, **params):
+        """Ajoute un détecteur au graphe : calculé (pandas) à partir des types ou issu de results_stage."""
+        if stage in cancelled:
+            return
+        params = dict(params, classifier=classifier_fingerprint)
+        detector_params[stage] = params
+        if results_stage is not None:
+            if stage == 'repeats':
+                scheduler.add(stage, lambda all_results: {name: all_results[name] for name in REPEAT_RESULTS},
+                              after=[results_stage])
+            else:
+                scheduler.add(stage, lambda all_results: all_results[stage], after=[results_stage])
         else:
-            st.info("Aucun paiement marchand répétitif.")
+            scheduler.add(stage, lambda types: cached(stage, lambda: compute(types), **params), after=['types'])
 
-    with col2:
-        st.subheader("✨ Points de Fidélité")
-        if not redeem_df.empty:
-            st.dataframe(redeem_df, use_container_width=True)
-        else:
-            st.info("Aucune conversion de points.")
+    detector('repeats', detect_repeats)
+    detector(
+        'circular',
+        lambda types: detect_circular(
+            types['mp'], types['cashin'], types['cashout'], max_delays=windows.get('circular'),
+            risk_rules=risk_rules
+        ),
+        window=windows.get('circular'),
+        rules=risk_rules.fingerprint()
+    )
+    cashin_w2b_window = windows.get('cashin_w2b')
+    detector(
+        'cashin_w2b',
+        lambda types: detect_cashin_w2b(
+            types['cashin'], types['w2b'], max_delay=cashin_w2b_window[0] if cashin_w2b_window else None
+        ),
+        window=cashin_w2b_window
+    )
+    detector(
+        'chains',
+        lambda types: detect_money_chains(
+            types['cashin'], types['send'], types['w2b'], max_depth=CHAIN_MAX_DEPTH,
+            max_hop_delay=windows['chains'][0] if 'chains' in windows else None, by_day='chains' not in windows,
+            risk_rules=risk_rules, budget=chain_budget
+        ),
+        max_depth=CHAIN_MAX_DEPTH,
+        window=windows.get('chains'),
+        rules=risk_rules.fingerprint(),
+        budget=chain_budget.to_dict()
+    )
+    detector(
+        'b2w_send_w2b',
+        lambda types: detect_b2w_send_w2b(
+            types['b2w'], types['send'], types['w2b'], max_delays=windows.get('b2w_send_w2b')
+        ),
+        window=windows.get('b2w_send_w2b')
+    )
+    detector(
+        'rings',
+        lambda types: detect_rings(
+            types['send'], max_hop_delay=windows['rings'][0] if 'rings' in windows else RING_HOP_DELAY,
+            by_day='rings' not in windows, risk_rules=risk_rules
+        ),
+        window=windows.get('rings'),
+        rules=risk_rules.fingerprint()
+    )
+    detector(
+        'velocity',
+        lambda types: detect_velocity(types, velocity_windows, velocity_ratio, risk_rules),
+        velocity=velocity_windows,
+        velocity_ratio=velocity_ratio,
+        rules=risk_rules.fingerprint()
+    )
 
-    with col3:
-        st.subheader("✨ CASH IN")
-        if not repeat_cashin_df.empty:
-            st.dataframe(repeat_cashin_df, use_container_width=True)
-        else:
-            st.info("Aucun Cash In répétitif.")
+    # ==========================================
+    # 1️⃣ DÉTECTIONS SIMPLES (Agrégations)
+    # ==========================================
+    def render_repeats(repeats):
+        # 📊 Affichage des résultats simples
+        col1, col2, col3, col4 = st.columns(4)
 
-    with col4:
-        st.subheader("✨ W2B")
-        if not repeat_w2b_df.empty:
-            st.dataframe(repeat_w2b_df, use_container_width=True)
-        else:
-            st.info("Aucun W2B répétitif.")
+        with col1:
+            st.subheader("⚠️ Paiement Marchand >2")
+            if not repeats['repeat_mp'].empty:
+                show_table(repeats['repeat_mp'], 'repeat_mp')
+            else:
+                st.info("Aucun paiement marchand répétitif.")
+
+        with col2:
+            st.subheader("✨ Points de Fidélité")
+            if not repeats['redeem'].empty:
+                show_table(repeats['redeem'], 'redeem')
+            else:
+                st.info("Aucune conversion de points.")
+
+        with col3:
+            st.subheader("✨ CASH IN")
+            if not repeats['repeat_cashin'].empty:
+                show_table(repeats['repeat_cashin'], 'repeat_cashin')
+            else:
+                st.info("Aucun Cash In répétitif.")
+
+        with col4:
+            st.subheader("✨ W2B")
+            if not repeats['repeat_w2b'].empty:
+                show_table(repeats['repeat_w2b'], 'repeat_w2b')
+            else:
+                st.info("Aucun W2B répétitif.")
 
     # ==========================================
     # 2️⃣ DÉTECTION CIRCULAIRE OPTIMISÉE
     # ==========================================
-    with st.spinner("Analyse des scénarios circulaires (optimisée)..."):
-        suspicious = []
-        
-        # Grouper par jour une seule fois
-        mp_daily = mp_all.set_index('DATE').sort_values('INITATE_DATE')
-        cashin_daily = cashin_all.set_index('DATE').sort_values('INITATE_DATE')
-        cashout_daily = cashout_all.set_index('DATE').sort_values('INITATE_DATE')
-        
-        unique_days = mp_all['DATE'].unique()
-        
-        for day in unique_days:
-            if day not in mp_daily.index:
-                continue
-                
-            mp_day = mp_daily.loc[day] if isinstance(mp_daily.loc[day], pd.DataFrame) else mp_daily.loc[[day]]
-            
-            if day not in cashin_daily.index or day not in cashout_daily.index:
-                continue
-                
-            cashin_day = cashin_daily.loc[day] if isinstance(cashin_daily.loc[day], pd.DataFrame) else cashin_daily.loc[[day]]
-            cashout_day = cashout_daily.loc[day] if isinstance(cashout_daily.loc[day], pd.DataFrame) else cashout_daily.loc[[day]]
-            
-            # Créer des dictionnaires pour accès rapide
-            cashin_by_client = cashin_day.groupby('CREDIT_MSISDN')
-            cashout_by_merchant = cashout_day.groupby('DEBIT_MSISDN')
-            
-            for _, mp_row in mp_day.iterrows():
-                merchant = mp_row['CREDIT_MSISDN']
-                client = mp_row['DEBIT_MSISDN']
-                amount = mp_row['ACTUAL_AMOUNT']
-                time1 = mp_row['INITATE_DATE']
-                
-                # Dernier Cash In du client
-                if client not in cashin_by_client.groups:
-                    continue
-                    
-                ci_group = cashin_by_client.get_group(client)
-                ci_before = ci_group[ci_group['INITATE_DATE'] < time1]
-                
-                if ci_before.empty:
-                    continue
-                    
-                ci = ci_before.iloc[-1]  # Le plus récent
-                cashin_from = ci['DEBIT_MSISDN']
-                ci_time = ci['INITATE_DATE']
-                
-                # Cash Out du marchand
-                if merchant not in cashout_by_merchant.groups:
-                    continue
-                    
-                bco_group = cashout_by_merchant.get_group(merchant)
-                bco_matches = bco_group[
-                    (bco_group['ACTUAL_AMOUNT'] == amount) &
-                    (bco_group['INITATE_DATE'] > time1)
-                ]
-                
-                for _, bco_row in bco_matches.iterrows():
-                    bco_time = bco_row['INITATE_DATE']
-                    cashout_to = bco_row['CREDIT_MSISDN']
-                    delay = (bco_time - time1).total_seconds() / 60
-                    
-                    risk_score = 0
-                    flags = []
-                    
-                    if delay < 10:
-                        risk_score += 40
-                        flags.append("Cashout rapide (<10 min)")
-                    
-                    if amount >= 20000:
-                        risk_score += 90
-                        flags.append("Montant élevé (>=20,000)")
-                    
-                    if client == cashout_to:
-                        risk_score += 30
-                        flags.append("Client = receveur cashout")
-                    
-                    if cashin_from == cashout_to:
-                        risk_score += 100
-                        flags.append("Même distributeur CashIn & CashOut")
-                    
-                    if risk_score == 0:
-                        risk_score = 10
-                        flags.append("Activité inhabituelle")
-                    
-                    suspicious.append({
-                        'date': day,
-                        'cashin_from': cashin_from,
-                        'ci_time': ci_time,
-                        'client': client,
-                        'merchant': merchant,
-                        'mp_time': time1,
-                        'mp_reason': mp_row['REASON_NAME'],
-                        'bco_time': bco_time,
-                        'bco_reason': bco_row['REASON_NAME'],
-                        'amount': amount,
-                        'cashout_to': cashout_to,
-                        'delay_minutes': delay,
-                        'risk_score': risk_score,
-                        'flags': "; ".join(flags),
-                    })
-
-    # Affichage scénarios circulaires
-    result_df = pd.DataFrame(suspicious)
-    if not result_df.empty:
-        grouped_df = result_df.groupby(['date', 'merchant']).agg(
-            nb_cas=('amount', 'count'),
-            montant_total=('amount', 'sum'),
-            score_moyen=('risk_score', 'mean')
-        ).reset_index()
-
-        st.subheader("📋 Détails Cas Individuels")
-        st.dataframe(result_df, use_container_width=True)
-
-        st.subheader("📊 Résumé Groupé")
-        st.dataframe(grouped_df, use_container_width=True)
-    else:
-        st.warning("Aucun scénario circulaire suspect.")
+    def render_circular(result_df):
+        # Affichage scénarios circulaires
+        if not result_df.empty:
+            st.subheader("📋 Détails Cas Individuels")
+            show_table(result_df, 'circular')
+
+            st.subheader("📊 Résumé Groupé")
+            show_table(summarize_circular(result_df), 'circular_summary')
+        else:
+            st.warning("Aucun scénario circulaire suspect.")
 
     # ==========================================
     # 3️⃣ SCÉNARIOS CHAÎNÉS OPTIMISÉS
     # ==========================================
-    
+
     # 🔍 Cash In → W2B
-    with st.spinner("Détection Cash In → W2B..."):
-        cashin_then_w2b = []
-        
-        cashin_indexed = cashin_all.set_index('DATE').sort_values('INITATE_DATE')
-        w2b_indexed = w2b_all.set_index('DATE').sort_values('INITATE_DATE')
-        
-        for day in cashin_all['DATE'].unique():
-            if day not in cashin_indexed.index or day not in w2b_indexed.index:
-                continue
-                
-            ci_day = cashin_indexed.loc[day] if isinstance(cashin_indexed.loc[day], pd.DataFrame) else cashin_indexed.loc[[day]]
-            w2b_day = w2b_indexed.loc[day] if isinstance(w2b_indexed.loc[day], pd.DataFrame) else w2b_indexed.loc[[day]]
-            
-            # Merge optimisé
-            merged = pd.merge(
-                ci_day.reset_index(),
-                w2b_day.reset_index(),
-                left_on='CREDIT_MSISDN',
-                right_on='DEBIT_MSISDN',
-                suffixes=('_ci', '_w2b')
-            )
-            
-            # Filtrer: W2B après Cash In
-            merged = merged[merged['INITATE_DATE_w2b'] > merged['INITATE_DATE_ci']]
-            
-            if not merged.empty:
-                merged['delay_minutes'] = (merged['INITATE_DATE_w2b'] - merged['INITATE_DATE_ci']).dt.total_seconds() / 60
-                
-                for _, row in merged.iterrows():
-                    cashin_then_w2b.append({
-                        'date': day,
-                        'Distributeur': row['DEBIT_MSISDN_ci'],
-                        'client': row['CREDIT_MSISDN_ci'],
-                        'cashin_amount': row['ACTUAL_AMOUNT_ci'],
-                        'cashin_time': row['INITATE_DATE_ci'],
-                        'w2b_amount': row['ACTUAL_AMOUNT_w2b'],
-                        'w2b_time': row['INITATE_DATE_w2b'],
-                        'Banque': row['CREDIT_MSISDN_w2b'],
-                        'delay_minutes': row['delay_minutes'],
-                        'scenario': 'Cash In suivi de W2B'
-                    })
-
-    if cashin_then_w2b:
-        scenario_df_cashin_w2b = pd.DataFrame(cashin_then_w2b)
-        
-        st.subheader("🚨 Cash In suivi de W2B")
-        st.dataframe(scenario_df_cashin_w2b, use_container_width=True)
-        
-        # Répétitions
-        repetition_df = (
-            scenario_df_cashin_w2b
-            .groupby(['Distributeur', 'client'], as_index=False)
-            .agg(
-                nb_occurrences=('scenario', 'count'),
-                montant_total_cashin=('cashin_amount', 'sum'),
-                montant_total_w2b=('w2b_amount', 'sum'),
-                premiere_date=('date', 'min'),
-                derniere_date=('date', 'max')
-            )
-            .query('nb_occurrences >= 1')
-        )
-        
-        st.subheader("🚩 Couples SD → RDS répétant le scénario")
-        if not repetition_df.empty:
-            st.dataframe(repetition_df, use_container_width=True)
-        else:
-            st.info("Aucun couple répétitif.")
-    else:
-        st.info("Aucun scénario Cash In → W2B détecté.")
+    def render_cashin_w2b(scenario_df_cashin_w2b):
+        if not scenario_df_cashin_w2b.empty:
+            st.subheader("🚨 Cash In suivi de W2B")
+            show_table(scenario_df_cashin_w2b, 'cashin_w2b')
 
+            # Répétitions
+            repetition_df = cashin_w2b_repetitions(scenario_df_cashin_w2b)
+
+            st.subheader("🚩 Couples SD → RDS répétant le scénario")
+            if not repetition_df.empty:
+                show_table(repetition_df, 'cashin_w2b_repetitions')
+            else:
+                st.info("Aucun couple répétitif.")
+        else:
+            st.info("Aucun scénario Cash In → W2B détecté.")
 
-   
-    
     # 🔍 DÉTECTION DE CHAÎNES CASH IN → SEND (N fois) → W2B
-    with st.spinner("Détection des chaînes Cash In → Send Money (N) → W2B..."):
-        
-        def find_money_chains(ci_row, send_day, w2b_day, max_depth=10):
-            """
-            Trouve toutes les chaînes de Send Money partant d'un Cash In jusqu'à un W2B
-            
-            Args:
-                ci_row: La transaction Cash In de départ
-                send_day: DataFrame des Send Money du jour
-                w2b_day: DataFrame des W2B du jour
-                max_depth: Profondeur maximale de recherche (nombre max de Send Money)
-            
-            Returns:
-                List of chains (chaque chain est une liste de transactions)
-            """
-            chains = []
-            
-            def explore_chain(current_client, current_time, path, depth):
-                """Exploration récursive des chaînes"""
-                
-                # Limite de profondeur pour éviter les boucles infinies
-                if depth > max_depth:
-                    return
-                
-                # Vérifier si ce client fait un W2B après current_time
-                w2b_matches = w2b_day[
-                    (w2b_day['DEBIT_MSISDN'] == current_client) &
-                    (w2b_day['INITATE_DATE'] > current_time)
-                ]
-                
-                # Si on trouve un W2B, on a une chaîne complète
-                for _, w2b_row in w2b_matches.iterrows():
-                    complete_chain = path + [{
-                        'type': 'w2b',
-                        'from': w2b_row['DEBIT_MSISDN'],
-                        'to': w2b_row['CREDIT_MSISDN'],
-                        'amount': w2b_row['ACTUAL_AMOUNT'],
-                        'time': w2b_row['INITATE_DATE'],
-                        'bank': w2b_row['CREDIT_MSISDN']
-                    }]
-                    chains.append(complete_chain)
-                
-                # Chercher les Send Money suivants
-                next_sends = send_day[
-                    (send_day['DEBIT_MSISDN'] == current_client) &
-                    (send_day['INITATE_DATE'] > current_time)
-                ]
-                
-                # Explorer chaque Send Money trouvé
-                for _, send_row in next_sends.iterrows():
-                    next_client = send_row['CREDIT_MSISDN']
-                    next_time = send_row['INITATE_DATE']
-                    
-                    # Éviter les cycles (client qui s'envoie à lui-même dans la chaîne)
-                    clients_in_path = [step['to'] for step in path if step['type'] == 'send']
-                    if next_client in clients_in_path:
-                        continue
-                    
-                    new_path = path + [{
-                        'type': 'send',
-                        'from': send_row['DEBIT_MSISDN'],
-                        'to': send_row['CREDIT_MSISDN'],
-                        'amount': send_row['ACTUAL_AMOUNT'],
-                        'time': send_row['INITATE_DATE']
-                    }]
-                    
-                    # Exploration récursive
-                    explore_chain(next_client, next_time, new_path, depth + 1)
-            
-            # Démarrer l'exploration depuis le client qui reçoit le Cash In
-            initial_client = ci_row['CREDIT_MSISDN']
-            initial_time = ci_row['INITATE_DATE']
-            
-            initial_path = [{
-                'type': 'cashin',
-                'from': ci_row['DEBIT_MSISDN'],
-                'to': ci_row['CREDIT_MSISDN'],
-                'amount': ci_row['ACTUAL_AMOUNT'],
-                'time': ci_row['INITATE_DATE'],
-                'distributor': ci_row['DEBIT_MSISDN']
-            }]
-            
-            explore_chain(initial_client, initial_time, initial_path, depth=1)
-            
-            return chains
-        
-        # Collecte de toutes les chaînes détectées
-        all_chains = []
-        
-        for day in cashin_all['DATE'].unique():
-            ci_day = cashin_all[cashin_all['DATE'] == day].copy()
-            send_day = send_all[send_all['DATE'] == day].copy()
-            w2b_day = w2b_all[w2b_all['DATE'] == day].copy()
-            
-            if ci_day.empty or send_day.empty or w2b_day.empty:
-                continue
-            
-            # Pour chaque Cash In, chercher les chaînes
-            for _, ci_row in ci_day.iterrows():
-                chains = find_money_chains(ci_row, send_day, w2b_day, max_depth=10)
-                
-                # Traiter chaque chaîne trouvée
-                for chain in chains:
-                    # Calculer les métriques de la chaîne
-                    nb_send = sum(1 for step in chain if step['type'] == 'send')
-                    
-                    # Extraire les clients impliqués
-                    clients = [step['to'] for step in chain if step['type'] in ['cashin', 'send']]
-                    
-                    # Calculer le délai total
-                    first_time = chain[0]['time']
-                    last_time = chain[-1]['time']
-                    total_delay = (last_time - first_time).total_seconds() / 60
-                    
-                    # Calculer les montants
-                    cashin_amount = chain[0]['amount']
-                    w2b_amount = chain[-1]['amount']
-                    send_amounts = [step['amount'] for step in chain if step['type'] == 'send']
-                    
-                    # Score de suspicion
-                    risk_score = 0
-                    flags = []
-                    
-                    # Plus il y a de Send Money, plus c'est suspect
-                    if nb_send >= 5:
-                        risk_score += 100
-                        flags.append(f"Chaîne très longue ({nb_send} Send Money)")
-                    elif nb_send >= 3:
-                        risk_score += 60
-                        flags.append(f"Chaîne longue ({nb_send} Send Money)")
-                    elif nb_send >= 2:
-                        risk_score += 30
-                        flags.append(f"Chaîne moyenne ({nb_send} Send Money)")
-                    
-                    # Délai court = plus suspect
-                    if total_delay < 30:
-                        risk_score += 50
-                        flags.append(f"Très rapide (<30 min)")
-                    elif total_delay < 60:
-                        risk_score += 30
-                        flags.append(f"Rapide (<1h)")
-                    
-                    # Montants élevés
-                    if cashin_amount >= 50000:
-                        risk_score += 40
-                        flags.append("Montant élevé")
-                    
-                    # Commission potentielle
-                    # D-Money: 2.56% sur Cash In, 0% sur Send Money
-                    cashin_commission = cashin_amount * 0.0256
-                    
-                    # Commission totale = seulement sur le Cash In
-                    total_commission = cashin_commission
-                    
-                    # Commission par intermédiaire (si la chaîne est longue, la commission est diluée)
-                    commission_per_intermediary = cashin_commission / (nb_send + 1) if nb_send > 0 else cashin_commission
-                    
-                    all_chains.append({
-                        'date': day,
-                        'distributor': chain[0]['from'],
-                        'nb_send_money': nb_send,
-                        'clients_chain': ' → '.join(clients),
-                        'cashin_amount': cashin_amount,
-                        'cashin_time': first_time,
-                        'w2b_amount': w2b_amount,
-                        'w2b_time': last_time,
-                        'w2b_bank': chain[-1]['bank'],
-                        'total_delay_minutes': round(total_delay, 2),
-                        'cashin_commission_djf': round(cashin_commission, 2),
-                        'commission_per_person': round(commission_per_intermediary, 2),
-                        'risk_score': risk_score,
-                        'flags': "; ".join(flags),
-                        'full_chain': ' → '.join([f"{step['type'].upper()}({step['amount']:.0f})" for step in chain])
-                    })
-        
+    def render_chains(chains_df):
         # Affichage des résultats
-        if all_chains:
-            chains_df = pd.DataFrame(all_chains)
-            
-            # Trier par nombre de Send Money (les plus longs d'abord)
-            chains_df = chains_df.sort_values(['nb_send_money', 'risk_score'], ascending=[False, False])
-            
+        if not chains_df.empty:
             st.subheader("🚨 Chaînes Cash In → Send Money (N) → W2B")
-            
+
             # Métriques clés
             col1, col2, col3, col4 = st.columns(4)
             with col1:
@@ -516,20 +528,20 @@ if uploaded_file:
             with col4:
                 avg_length = chains_df['nb_send_money'].mean()
                 st.metric("Longueur Moyenne", f"{avg_length:.1f}")
-            
+
             # Tableau détaillé
-            st.dataframe(
-                chains_df[[
+            show_table(
+                chains_df, 'chains',
+                columns=[
                     'date', 'distributor', 'nb_send_money', 'clients_chain',
                     'cashin_amount', 'cashin_commission_djf', 'commission_per_person',
                     'w2b_amount', 'total_delay_minutes', 'risk_score', 'flags'
-                ]],
-                use_container_width=True
+                ]
             )
-            
+
             # Afficher quelques exemples de chaînes complètes
             st.subheader("🔍 Détail des chaînes les plus suspectes")
-            top_chains = chains_df.nlargest(5, 'risk_score')
+            top_chains = chain_labels(chains_df.nlargest(5, 'risk_score'))
             for idx, row in top_chains.iterrows():
                 with st.expander(f"⚠️ Chaîne {idx+1}: {row['nb_send_money']} Send Money - Score: {row['risk_score']}"):
                     st.write(f"**Date:** {row['date']}")
@@ -540,146 +552,269 @@ if uploaded_file:
                     st.write(f"**Commission Cash In:** {row['cashin_commission_djf']:.2f} DJF (2.56%)")
                     st.write(f"**Commission par personne:** {row['commission_per_person']:.2f} DJF")
                     st.write(f"**Flags:** {row['flags']}")
-            
+
             # Analyse des répétitions par distributeur
             st.subheader("📊 Analyse par Distributeur")
-            distributor_analysis = (
-                chains_df.groupby('distributor')
-                .agg(
-                    nb_chaines=('nb_send_money', 'count'),
-                    longueur_moyenne=('nb_send_money', 'mean'),
-                    commission_cashin_totale=('cashin_commission_djf', 'sum'),
-                    montant_total_cashin=('cashin_amount', 'sum'),
-                    score_moyen=('risk_score', 'mean')
-                )
-                .reset_index()
-                .sort_values('commission_cashin_totale', ascending=False)
-            )
-            st.dataframe(distributor_analysis, use_container_width=True)
-            
+            show_table(chains_by_distributor(chains_df), 'chains_by_distributor')
+
             # Analyse des clients récurrents
             st.subheader("👥 Clients Récurrents dans les Chaînes")
-            all_clients_in_chains = []
-            for clients_str in chains_df['clients_chain']:
-                all_clients_in_chains.extend(clients_str.split(' → '))
-            
-            client_frequency = pd.Series(all_clients_in_chains).value_counts().reset_index()
-            client_frequency.columns = ['Client', 'Nb_Apparitions']
-            client_frequency = client_frequency[client_frequency['Nb_Apparitions'] > 1]
-            
+            client_frequency = recurrent_clients(chains_df)
+
             if not client_frequency.empty:
-                st.dataframe(client_frequency, use_container_width=True)
+                show_table(client_frequency, 'chain_clients')
             else:
                 st.info("Aucun client n'apparaît dans plusieurs chaînes.")
         else:
             st.info("Aucune chaîne Cash In → Send Money → W2B détectée.")
 
     # 🔍 B2W → Send Money → W2B
-    with st.spinner("Détection B2W → Send → W2B..."):
-        b2w_send_w2b = []
-        
-        for day in b2w_all['DATE'].unique():
-            b2w_day = b2w_all[b2w_all['DATE'] == day].copy()
-            send_day = send_all[send_all['DATE'] == day].copy()
-            w2b_day = w2b_all[w2b_all['DATE'] == day].copy()
-            
-            if b2w_day.empty or send_day.empty or w2b_day.empty:
-                continue
-            
-            # Renommer les colonnes AVANT le merge
-            b2w_day = b2w_day.rename(columns={
-                'INITATE_DATE': 'INITATE_DATE_b2w',
-                'ACTUAL_AMOUNT': 'ACTUAL_AMOUNT_b2w',
-                'DEBIT_MSISDN': 'DEBIT_MSISDN_b2w',
-                'CREDIT_MSISDN': 'CREDIT_MSISDN_b2w'
-            })
-            
-            send_day = send_day.rename(columns={
-                'INITATE_DATE': 'INITATE_DATE_send',
-                'ACTUAL_AMOUNT': 'ACTUAL_AMOUNT_send',
-                'DEBIT_MSISDN': 'DEBIT_MSISDN_send',
-                'CREDIT_MSISDN': 'CREDIT_MSISDN_send'
-            })
-            
-            w2b_day = w2b_day.rename(columns={
-                'INITATE_DATE': 'INITATE_DATE_w2b',
-                'ACTUAL_AMOUNT': 'ACTUAL_AMOUNT_w2b',
-                'DEBIT_MSISDN': 'DEBIT_MSISDN_w2b',
-                'CREDIT_MSISDN': 'CREDIT_MSISDN_w2b'
-            })
-            
-            # Merge B2W → Send
-            step1 = pd.merge(
-                b2w_day,
-                send_day,
-                left_on='CREDIT_MSISDN_b2w',
-                right_on='DEBIT_MSISDN_send',
-                how='inner'
-            )
-            step1 = step1[step1['INITATE_DATE_send'] > step1['INITATE_DATE_b2w']]
-            
-            if step1.empty:
-                continue
-            
-            # Merge Send → W2B
-            step2 = pd.merge(
-                step1,
-                w2b_day,
-                left_on='CREDIT_MSISDN_send',
-                right_on='DEBIT_MSISDN_w2b',
-                how='inner'
-            )
-            step2 = step2[step2['INITATE_DATE_w2b'] > step2['INITATE_DATE_send']]
-            
-            if not step2.empty:
-                step2['delay_1'] = (step2['INITATE_DATE_send'] - step2['INITATE_DATE_b2w']).dt.total_seconds() / 60
-                step2['delay_2'] = (step2['INITATE_DATE_w2b'] - step2['INITATE_DATE_send']).dt.total_seconds() / 60
-                
-                for _, row in step2.iterrows():
-                    b2w_send_w2b.append({
-                        'date': day,
-                        'Source Bank': row['DEBIT_MSISDN_b2w'],
-                        'client_A': row['CREDIT_MSISDN_b2w'],
-                        'b2w_amount': row['ACTUAL_AMOUNT_b2w'],
-                        'b2w_time': row['INITATE_DATE_b2w'],
-                        'client_B': row['CREDIT_MSISDN_send'],
-                        'send_amount': row['ACTUAL_AMOUNT_send'],
-                        'sm_time_1': row['INITATE_DATE_send'],
-                        'w2b_amount': row['ACTUAL_AMOUNT_w2b'],
-                        'w2b_time': row['INITATE_DATE_w2b'],
-                        'Destination Bank': row['CREDIT_MSISDN_w2b'],
-                        'delay_B2W_to_Send_min': row['delay_1'],
-                        'delay_Send_to_W2B_min': row['delay_2'],
-                        'scenario': 'B2W → Send Money → W2B'
-                    })
-
-    if b2w_send_w2b:
-        scenario_df = pd.DataFrame(b2w_send_w2b)
-        
-        st.subheader("🚨 B2W → Send Money → W2B")
-        st.dataframe(scenario_df, use_container_width=True)
-        
-        # Répétitions
-        repetition_df = (
-            scenario_df
-            .groupby(['client_A', 'client_B'], as_index=False)
-            .agg(
-                nb_occurrences=('scenario', 'count'),
-                montant_total_b2w=('b2w_amount', 'sum'),
-                montant_total_send=('send_amount', 'sum'),
-                montant_total_w2b=('w2b_amount', 'sum'),
-                premiere_date=('date', 'min'),
-                derniere_date=('date', 'max')
-            )
-            .query('nb_occurrences >= 1')
+    def render_b2w_send_w2b(scenario_df):
+        if not scenario_df.empty:
+            st.subheader("🚨 B2W → Send Money → W2B")
+            show_table(scenario_df, 'b2w_send_w2b')
+
+            # Répétitions
+            repetition_df = b2w_send_w2b_repetitions(scenario_df)
+
+            st.subheader("🚩 Couples Client A → Client B répétant le scénario")
+            if not repetition_df.empty:
+                show_table(repetition_df, 'b2w_send_w2b_repetitions')
+            else:
+                st.info("Aucun couple répétitif.")
+        else:
+            st.info("Aucun scénario B2W → Send → W2B détecté.")
+
+    # 🔍 Anneaux de Send Money A → B → ... → A
+    def render_rings(rings_df):
+        if not rings_df.empty:
+            st.subheader("🔄 Anneaux de Send Money")
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Total Anneaux", len(rings_df))
+            with col2:
+                st.metric("Anneau Max", rings_df['nb_wallets'].max(), "portefeuilles")
+            with col3:
+                st.metric("Montant Total", f"{rings_df['total_amount'].sum():,.0f} DJF")
+
+            show_table(rings_df, 'rings', columns=[column for column in rings_df.columns if column != 'full_ring'])
+
+            st.subheader("👥 Portefeuilles impliqués dans les anneaux")
+            show_table(ring_wallets(rings_df), 'ring_wallets')
+        else:
+            st.info("Aucun anneau de transferts détecté.")
+
+    # ==========================================
+    # 🧭 INDEX DES ENTITÉS (tous détecteurs)
+    # ==========================================
+    def render_entities(index):
+        st.subheader("🧭 Entités détectées")
+        if not len(index):
+            st.info("Aucune entité détectée.")
+            return
+
+        @st.fragment
+        def entity_search():
+            # Fragment : une recherche ne relance pas la page (ni l'attente des détecteurs)
+            msisdn = st.text_input("🔎 Rechercher un MSISDN", key='entity_search').strip()
+            if not msisdn:
+                return
+            entity = index.entity(msisdn)
+            if entity is None:
+                st.info(f"Le MSISDN {msisdn} n'apparaît dans aucune détection.")
+                return
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Score consolidé", entity['risk_score'])
+            with col2:
+                st.metric("Détections", entity['nb_detections'])
+            with col3:
+                st.metric("Scénarios", entity['nb_scenarios'])
+            with col4:
+                st.metric("Rôles", entity['nb_roles'], entity['roles'], delta_color='off')
+            st.caption(entity['flags'])
+            for name, rows in index.detections(msisdn).items():
+                st.markdown(f"**{DETECTION_TITLES[name]}**")
+                show_table(rows, f"entity_{name}")
+
+        entity_search()
+        st.subheader("📊 Entités par score consolidé")
+        show_table(index.entities, 'entities')
+
+    # ⚡ Rafales de transactions par portefeuille (vélocité)
+    def render_velocity(velocity_df):
+        if not velocity_df.empty:
+            st.subheader("⚡ Rafales de transactions par portefeuille")
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Total Rafales", len(velocity_df))
+            with col2:
+                st.metric("Portefeuilles", velocity_df['msisdn'].nunique())
+            with col3:
+                top = velocity_df.loc[velocity_df['nb_transactions'].idxmax()]
+                st.metric("Rafale Max", top['nb_transactions'], f"en {window_label(top['window_minutes'])}")
+
+            show_table(velocity_df, 'velocity')
+        else:
+            st.info("Aucune rafale de transactions détectée.")
+
+    # Panneaux dans l'ordre de la page : étape → (libellé, affichage)
+    detector_panels = {
+        'entities': ("Index des entités", render_entities),
+        'repeats': ("Détection des patterns répétitifs", render_repeats),
+        'circular': ("Analyse des scénarios circulaires (optimisée)", render_circular),
+        'cashin_w2b': ("Détection Cash In → W2B", render_cashin_w2b),
+        'chains': ("Détection des chaînes Cash In → Send Money (N) → W2B", render_chains),
+        'b2w_send_w2b': ("Détection B2W → Send → W2B", render_b2w_send_w2b),
+        'rings': ("Détection des anneaux de transferts", render_rings),
+        'velocity': ("Détection des rafales de transactions (vélocité)", render_velocity),
+    }
+
+    # 🧭 Index des entités, construit lorsque tous les détecteurs lancés sont terminés
+    indexed_stages = [stage for stage in detector_panels if stage in scheduler]
+
+    def build_entity_index(*stage_results):
+        results = {}
+        for stage, value in zip(indexed_stages, stage_results):
+            results.update(value if stage == 'repeats' else {stage: value})
+        return EntityIndex.from_results(results, risk_rules)
+
+    if 'entities' not in cancelled:
+        scheduler.add(
+            'entities',
+            lambda *stage_results: cached(
+                'entities', lambda: build_entity_index(*stage_results),
+                backend=backend, stages=detector_params, rules=risk_rules.fingerprint()
+            ),
+            after=indexed_stages
         )
-        
-        st.subheader("🚩 Couples Client A → Client B répétant le scénario")
-        if not repetition_df.empty:
-            st.dataframe(repetition_df, use_container_width=True)
+
+    # ⏳ Avancement global, puis un panneau par détecteur rempli dès que le détecteur se termine
+    progress_bar = st.progress(0.0, text="Chargement et classification des transactions...")
+    errors = st.container()
+    panels = {}
+    for stage, (label, _) in detector_panels.items():
+        panel = st.container()
+        status, action = panel.empty(), panel.empty()
+        if stage in cancelled:
+            status.warning(f"⏹️ {label} : annulé.")
+            action.button("▶️ Relancer", key=f"relaunch_{stage}", on_click=cancelled.discard, args=(stage,))
         else:
-            st.info("Aucun couple répétitif.")
+            status.caption(f"⏳ {label}...")
+            action.button("⏹️ Annuler", key=f"cancel_{stage}", on_click=cancelled.add, args=(stage,),
+                          help="Interrompt ce détecteur ; les autres continuent.")
+        panels[stage] = (panel, status, action)
+        if stage == 'repeats':
+            history_panel = st.container()
+
+    def show_error(message, stage):
+        st.error(message)
+        try:
+            scheduler.result(stage)
+        except Exception as error:
+            st.exception(error)
+
+    def show_panel(stage):
+        """Affiche le résultat (ou l'issue) d'un détecteur terminé dans son panneau."""
+        label, render = detector_panels[stage]
+        panel, status, action = panels[stage]
+        status.empty()
+        action.empty()
+        state = scheduler.state(stage)
+        with panel:
+            if state == DONE:
+                render(scheduler.result(stage))
+            elif state == FAILED:
+                show_error(f"❌ {label} : échec.", stage)
+            elif state == TIMEOUT:
+                st.warning(f"⏱️ {label} : interrompu, budget de temps atteint.")
+            else:
+                st.warning(f"⏹️ {label} : non exécuté (étape précédente interrompue).")
+
+    # Générateur fermé si la page est relancée (clic sur « Annuler », widget modifié) : étapes restantes annulées
+    with closing(scheduler.run(poll=PROGRESS_POLL)) as finished_stages:
+        for finished_stage in finished_stages:
+            progress = scheduler.progress()
+            done = int(progress['state'].isin(FINISHED_STATES).sum())
+            progress_bar.progress(done / len(progress), text=f"⏳ {done}/{len(progress)} étapes terminées")
+            for row in progress[progress['state'] == RUNNING].itertuples():
+                if row.stage in panels:
+                    panels[row.stage][1].caption(f"⏳ {detector_panels[row.stage][0]}... ({row.wall_s:.0f} s)")
+            if finished_stage in panels:
+                show_panel(finished_stage)
+            elif finished_stage is not None and scheduler.state(finished_stage) == FAILED:
+                with errors:
+                    show_error(f"❌ Étape {finished_stage} : échec.", finished_stage)
+    progress_bar.empty()
+
+    # 📚 Historique : répétitions sur plusieurs fichiers, pour une période quelconque
+    profile_store = get_profile_store()
+    if profile_store is not None:
+        with history_panel.expander("📚 Répétitions sur l'historique", expanded=False):
+            replace_days = st.checkbox(
+                "Remplacer les jours déjà présents", value=False,
+                help="Pour un export corrigé : les agrégats des jours déjà dans l'historique sont remplacés "
+                     "au lieu d'être refusés."
+            )
+            if st.button("➕ Ajouter ces transactions à l'historique"):
+                try:
+                    with st.spinner("Mise à jour de l'historique..."):
+                        added_days = profile_store.ingest(source, replace=replace_days)
+                except ValueError as exc:
+                    st.error(f"❌ {exc}")
+                else:
+                    if added_days:
+                        st.success(f"{len(added_days)} jour(s) ajouté(s) : {added_days[0]} → {added_days[-1]}")
+                    else:
+                        st.info("Ces transactions sont déjà dans l'historique.")
+            history_days = profile_store.days()
+            if not history_days:
+                st.info("Historique vide.")
+            else:
+                start_col, end_col = st.columns(2)
+                history_start = start_col.date_input("Du", value=history_days[0], min_value=history_days[0],
+                                                     max_value=history_days[-1], key='history_start')
+                history_end = end_col.date_input("Au", value=history_days[-1], min_value=history_days[0],
+                                                 max_value=history_days[-1], key='history_end')
+                history = profile_store.repeats(history_start, history_end)
+                for name, title in HISTORY_TITLES.items():
+                    st.markdown(f"**{title}**")
+                    show_table(history[name], f"history_{name}")
+
+    # 📥 Export : un classeur Excel (une feuille par tableau), généré au clic
+    st.subheader("📥 Export")
+    if all(stage in scheduler and scheduler.state(stage) == DONE for stage in detector_panels if stage != 'entities'):
+        results = {
+            **scheduler.result('repeats'),
+            **{stage: scheduler.result(stage) for stage in detector_panels if stage not in ('repeats', 'entities')},
+        }
+        if run_archive is not None and archived_run is None:
+            with st.spinner("🗂️ Archivage des résultats..."):
+                archived_run = run_archive.record(finalize_results(dict(results), risk_rules), file_hash,
+                                                  archive_params, source=getattr(source, 'name', source))
+            st.caption(f"🗂️ Résultats archivés : exécution {archived_run}")
+        st.download_button(
+            "📥 Exporter tous les résultats (Excel)",
+            lambda: excel_bytes(finalize_results(dict(results), risk_rules)),
+            file_name="resultats_fraude.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
     else:
-        st.info("Aucun scénario B2W → Send → W2B détecté.")
+        st.info("Export disponible lorsque tous les détecteurs sont terminés.")
+
+    profile.stop()
+    with st.expander("⏱️ Performance", expanded=False):
+        st.dataframe(profile.to_frame(), use_container_width=True)
+        st.download_button(
+            "📥 Exporter les mesures (JSON)", profile.to_json(),
+            file_name="performance.json", mime="application/json"
+        )
+        st.caption("États des étapes (graphe concurrent)")
+        st.dataframe(scheduler.progress(), use_container_width=True)
+        for stage, report in profile.profiles.items():
+            st.caption(f"cProfile — {stage}")
+            st.code(report, language=None)
 
     st.success("✅ Analyse terminée!")
@@ -0,0 +1,130 @@
+"""
+Moteur de détection des scénarios de fraude D-Money, indépendant de l'interface Streamlit.
+"""
+import importlib
+
+from .b2w_chain import b2w_send_w2b_repetitions, detect_b2w_send_w2b
+from .cache import ResultCache, cache_key, content_hash
+from .cashin_w2b import cashin_w2b_repetitions, detect_cashin_w2b
+from .chains import (
+    ChainBudget,
+    ChainSteps,
+    TransferIndex,
+    chain_labels,
+    chains_by_distributor,
+    detect_money_chains,
+    find_money_chains,
+    iter_money_chains,
+    recurrent_clients,
+)
+from .circular import detect_circular, summarize_circular
+from .classify import (
+    TRANSACTION_TYPES,
+    TransactionClassifier,
+    TypedTransactions,
+    classify_transactions,
+    load_classifier,
+)
+from .entities import EntityIndex
+from .export import write_csv, write_excel, write_results
+from .ingest import iter_chunks
+from .instrument import RunProfile, row_count
+from .loader import load_transactions, preprocess, read_transactions
+from .paging import page_of
+from .pipeline import run_detection, run_detectors, run_partitioned
+from .realtime import StreamingDetector
+from .repeats import combine_repeats, detect_repeats, partial_repeats, repeat_pairs, volume_by_receiver
+from .rings import detect_rings, ring_wallets
+from .scheduler import Scheduler
+from .scoring import RiskRules, load_risk_rules, score_cases
+from .synthetic import generate_transactions
+from .velocity import daily_peaks, detect_velocity, velocity_bursts
+from .windows import SCENARIO_HOPS, window_join
+
+__all__ = [
+    'ChainBudget',
+    'ChainSteps',
+    'CodeDictionary',
+    'ConnectionPool',
+    'DatabaseSource',
+    'EntityIndex',
+    'ProfileStore',
+    'ResultCache',
+    'RiskRules',
+    'RunArchive',
+    'RunProfile',
+    'SCENARIO_HOPS',
+    'Scheduler',
+    'StreamingDetector',
+    'TRANSACTION_TYPES',
+    'TransactionClassifier',
+    'TransactionStore',
+    'TransferIndex',
+    'TypedTransactions',
+    'b2w_send_w2b_repetitions',
+    'build_store',
+    'cache_key',
+    'cashin_w2b_repetitions',
+    'chain_labels',
+    'chains_by_distributor',
+    'classify_transactions',
+    'combine_repeats',
+    'content_hash',
+    'daily_peaks',
+    'detect_b2w_send_w2b',
+    'detect_cashin_w2b',
+    'detect_circular',
+    'detect_money_chains',
+    'detect_repeats',
+    'detect_rings',
+    'detect_velocity',
+    'find_money_chains',
+    'generate_transactions',
+    'iter_chunks',
+    'iter_money_chains',
+    'load_classifier',
+    'load_risk_rules',
+    'load_transactions',
+    'page_of',
+    'partial_repeats',
+    'preprocess',
+    'read_transactions',
+    'recurrent_clients',
+    'repeat_pairs',
+    'ring_wallets',
+    'row_count',
+    'run_detection',
+    'run_detectors',
+    'run_partitioned',
+    'score_cases',
+    'summarize_circular',
+    'velocity_bursts',
+    'volume_by_receiver',
+    'window_join',
+    'write_csv',
+    'write_excel',
+    'write_results',
+]
+
+# Chargés à la première utilisation : archive et profiles sont aussi des
+# commandes (python -m fraud_engine.archive), qui ne doivent pas être déjà
+# importées par le paquet ; store et database ne servent qu'au stockage
+# colonnaire et à la lecture en base
+_LAZY_EXPORTS = {
+    'CodeDictionary': 'store',
+    'ConnectionPool': 'database',
+    'DatabaseSource': 'database',
+    'ProfileStore': 'profiles',
+    'RunArchive': 'archive',
+    'TransactionStore': 'store',
+    'build_store': 'store',
+}
+
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,445 @@
+"""
+Archive persistante des exécutions de détection
+
+Chaque exécution (fichier ou requête analysé avec des paramètres donnés) est
+ajoutée à une base SQLite locale, sous un identifiant d'exécution :
+
+    runs         une ligne par exécution : empreinte de la source, paramètres (JSON), période
+    results      tableaux de résultats complets (Parquet), rechargés à l'identique
+    detections   une ligne par détection : scénario, date, score, ligne en JSON
+    members      MSISDN → détections (rôle), clé primaire en tête par MSISDN
+
+Les détections sont indexées par MSISDN, par scénario et par date : retrouver
+les anciennes détections d'une entité ou d'une période se fait par index
+B-tree en quelques millisecondes, sans relire les transactions. Une source
+déjà analysée avec les mêmes paramètres est reconnue par son empreinte
+(find) et ses résultats servis par l'archive (load).
+
+Exemple :
+    python -m fraud_engine.archive archive.sqlite runs
+    python -m fraud_engine.archive archive.sqlite hits --msisdn 25377000001 --start 2024-01-01
+"""
+import argparse
+import contextlib
+import datetime
+import hashlib
+import io
+import json
+import sqlite3
+import sys
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .b2w_chain import MAX_CANDIDATES_PER_CLIENT
+from .cache import cache_key, content_hash
+from .chains import ChainBudget, chain_labels
+from .classify import DEFAULT_CLASSIFIER
+from .entities import ENTITY_ROLES, ENTITY_SOURCES, _column_members
+from .rings import RING_HOP_DELAY, RING_MAX_LENGTH
+from .scoring import DEFAULT_RISK_RULES
+from .velocity import VELOCITY_BURST_RATIO, VELOCITY_WINDOWS
+
+ARCHIVE_VERSION = 1
+
+# Tableaux de détection indexés (une ligne = une détection)
+ARCHIVE_SCENARIOS = list(ENTITY_SOURCES)
+
+RUN_COLUMNS = ['run_id', 'created_at', 'source', 'file_hash', 'start_date', 'end_date', 'nb_detections', 'params']
+
+MEMBER_COLUMNS = ['msisdn', 'run_id', 'scenario', 'row', 'role']
+
+HIT_COLUMNS = ['run_id', 'created_at', 'source', 'scenario', 'row', 'date', 'msisdn', 'role', 'risk_score', 'record']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    run_key TEXT NOT NULL UNIQUE,
+    file_hash TEXT NOT NULL,
+    params TEXT NOT NULL,
+    source TEXT,
+    created_at TEXT NOT NULL,
+    start_date TEXT,
+    end_date TEXT,
+    nb_detections INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_file_hash ON runs (file_hash);
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS detections (
+    run_id TEXT NOT NULL,
+    scenario TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    date TEXT,
+    risk_score INTEGER,
+    record TEXT NOT NULL,
+    PRIMARY KEY (run_id, scenario, row)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS detections_scenario_date ON detections (scenario, date);
+CREATE INDEX IF NOT EXISTS detections_date ON detections (date);
+CREATE TABLE IF NOT EXISTS members (
+    msisdn TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    scenario TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    PRIMARY KEY (msisdn, run_id, scenario, row, role)
+) WITHOUT ROWID;
+"""
+
+
+def source_hash(*sources):
+    """Empreinte d'une ou plusieurs sources (empreinte des empreintes, dans l'ordre, si plusieurs)."""
+    hashes = [content_hash(source) for source in sources]
+    if len(hashes) == 1:
+        return hashes[0]
+    return hashlib.sha256(''.join(hashes).encode('utf-8')).hexdigest()
+
+
+def _minutes(value):
+    return None if value is None else float(value)
+
+
+def run_params(max_depth=10, max_hop_delay=None, windows=None, risk_rules=None, classifier=None, chain_budget=None,
+               velocity_windows=VELOCITY_WINDOWS, velocity_ratio=VELOCITY_BURST_RATIO, amount_tolerance=None,
+               max_candidates=MAX_CANDIDATES_PER_CLIENT, ring_length=RING_MAX_LENGTH, ring_hop_delay=RING_HOP_DELAY,
+               ring_payments=False, **options):
+    """
+    Paramètres archivés avec une exécution (ceux qui changent les résultats).
+
+    Mêmes noms et valeurs par défaut que pipeline.run_detection ; les règles
+    sont réduites à leur empreinte et les durées normalisées en minutes
+    décimales, pour que l'interface et la ligne de commande calculent la même
+    clé d'exécution (voir RunArchive.run_key).
+
+    Args:
+        risk_rules: RiskRules, défaut config/risk_rules.json
+        classifier: TransactionClassifier, défaut DEFAULT_CLASSIFIER
+        chain_budget: ChainBudget, None = recherche complète
+        options: options d'exécution sans effet sur les résultats (workers...), ignorées
+
+    Returns:
+        dict sérialisable en JSON
+    """
+    return {
+        'max_depth': max_depth,
+        'max_hop_delay': _minutes(max_hop_delay),
+        'windows': {scenario: [float(delay) for delay in delays] for scenario, delays in (windows or {}).items()},
+        'risk_rules': (risk_rules or DEFAULT_RISK_RULES).fingerprint(),
+        'classifier': (classifier or DEFAULT_CLASSIFIER).fingerprint(),
+        'chain_budget': (chain_budget or ChainBudget()).to_dict(),
+        'velocity_windows': [
+            [float(minutes), int(threshold)] for minutes, threshold in sorted(velocity_windows.items())
+        ],
+        'velocity_ratio': float(velocity_ratio) if velocity_ratio else None,
+        'amount_tolerance': amount_tolerance,
+        'max_candidates': max_candidates,
+        'ring_length': ring_length,
+        'ring_hop_delay': _minutes(ring_hop_delay),
+        'ring_payments': bool(ring_payments),
+    }
+
+
+def _iso_dates(values):
+    """Dates (date, datetime ou texte) → 'AAAA-MM-JJ', None si absente."""
+    days = pd.to_datetime(pd.Series(values), errors='coerce').dt.strftime('%Y-%m-%d')
+    return days.astype(object).where(days.notna(), None).tolist()
+
+
+def _list_dtype(arrow_type):
+    """Colonnes de listes (parcours des chaînes) relues en listes Arrow, les autres au type par défaut."""
+    return pd.ArrowDtype(pa.list_(arrow_type.value_type)) if pa.types.is_list(arrow_type) else None
+
+
+def _read_table(data):
+    """Tableau de résultats archivé (Parquet)."""
+    return pq.read_table(io.BytesIO(data)).to_pandas(types_mapper=_list_dtype)
+
+
+def _detection_rows(run_id, scenario, table):
+    """Lignes (detections) et appartenances (members) d'un tableau de détection."""
+    count = len(table)
+    dates = _iso_dates(table['date']) if 'date' in table else [None] * count
+    scores = (
+        [None if pd.isna(score) else int(score) for score in table['risk_score']]
+        if 'risk_score' in table else [None] * count
+    )
+    # Enregistrement lisible : parcours des chaînes en libellés
+    records = (
+        chain_labels(table).to_json(orient='records', lines=True, date_format='iso').split('\n')[:count]
+        if count else []
+    )
+    detections = list(zip([run_id] * count, [scenario] * count, range(count), dates, scores, records))
+
+    parts = [_column_members(table, column, role) for column, role in ENTITY_SOURCES[scenario]]
+    members = pd.DataFrame({
+        'msisdn': np.concatenate([msisdns for msisdns, _, _ in parts]),
+        'row': np.concatenate([rows for _, rows, _ in parts]),
+        'role': np.asarray(ENTITY_ROLES, dtype=object)[np.concatenate([roles for _, _, roles in parts])],
+    })
+    return detections, members.assign(run_id=run_id, scenario=scenario)
+
+
+class RunArchive:
+    """Archive SQLite des exécutions, interrogeable par MSISDN, scénario et période."""
+
+    def __init__(self, path):
+        """
+        Args:
+            path: fichier SQLite de l'archive (créé si besoin)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as connection:
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+            if version not in (0, ARCHIVE_VERSION):
+                raise ValueError(f"Archive {path} : version {version} non prise en charge")
+            # WAL : lectures (sessions Streamlit) concurrentes d'un ajout
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(_SCHEMA)
+            connection.execute(f'PRAGMA user_version = {ARCHIVE_VERSION}')
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Connexion propre à l'appel (utilisable depuis n'importe quel thread), validée à la sortie."""
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def run_key(file_hash, params):
+        """Clé d'une exécution : empreinte de la source et paramètres."""
+        return cache_key('run', file_hash, **params)
+
+    def find(self, file_hash, params):
+        """Identifiant de l'exécution de cette source avec ces paramètres, None si elle n'est pas archivée."""
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT run_id FROM runs WHERE run_key = ?', (self.run_key(file_hash, params),)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def record(self, results, file_hash, params, source=None):
+        """
+        Ajoute une exécution à l'archive (sans effet si la même source a déjà
+        été archivée avec les mêmes paramètres). Les ajouts concurrents sont sérialisés.
+
+        Args:
+            results: dict nom de résultat → DataFrame (voir pipeline.finalize_results)
+            file_hash: empreinte de la source (voir source_hash)
+            params: paramètres de détection (sérialisables en JSON)
+            source: libellé de la source (nom du fichier, requête)
+
+        Returns:
+            identifiant de l'exécution (celui de l'exécution déjà archivée le cas échéant)
+        """
+        run_key = self.run_key(file_hash, params)
+        with self._lock:
+            existing = self.find(file_hash, params)
+            if existing is not None:
+                return existing
+            run_id = uuid.uuid4().hex[:12]
+            detections, members = [], []
+            for scenario in ARCHIVE_SCENARIOS:
+                if scenario in results:
+                    scenario_detections, scenario_members = _detection_rows(run_id, scenario, results[scenario])
+                    detections.extend(scenario_detections)
+                    members.append(scenario_members)
+            # Appartenances uniques, triées dans l'ordre de la clé primaire : insertion
+            # en fin de plage de chaque MSISDN plutôt qu'au hasard dans l'arbre
+            members = (
+                pd.concat(members, ignore_index=True)[MEMBER_COLUMNS]
+                .drop_duplicates()
+                .sort_values(MEMBER_COLUMNS)
+            ) if members else pd.DataFrame(columns=MEMBER_COLUMNS)
+            dates = [row[3] for row in detections if row[3] is not None]
+            blobs = []
+            for position, (name, table) in enumerate(results.items()):
+                buffer = io.BytesIO()
+                table.to_parquet(buffer, index=False)
+                blobs.append((run_id, position, name, buffer.getvalue()))
+
+            with self._connect() as connection:
+                connection.execute(
+                    'INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (run_id, run_key, file_hash, json.dumps(params, sort_keys=True, default=str),
+                     None if source is None else str(source),
+                     datetime.datetime.now().isoformat(timespec='seconds'),
+                     min(dates, default=None), max(dates, default=None), len(detections))
+                )
+                connection.executemany('INSERT INTO results VALUES (?, ?, ?, ?)', blobs)
+                connection.executemany('INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?)', detections)
+                connection.executemany('INSERT INTO members VALUES (?, ?, ?, ?, ?)', zip(
+                    *(members[column].to_numpy(dtype=object).tolist() for column in MEMBER_COLUMNS)
+                ))
+        return run_id
+
+    def load(self, run_id):
+        """
+        Tableaux de résultats complets d'une exécution archivée.
+
+        Returns:
+            dict nom de résultat → DataFrame, dans l'ordre d'origine
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                'SELECT name, data FROM results WHERE run_id = ? ORDER BY position', (run_id,)
+            ).fetchall()
+        if not rows:
+            raise KeyError(f"Exécution {run_id!r} absente de l'archive")
+        return {name: _read_table(data) for name, data in rows}
+
+    def runs(self, file_hash=None):
+        """
+        Exécutions archivées, de la plus récente à la plus ancienne.
+
+        Args:
+            file_hash: ne garder que les exécutions de cette source, None = toutes
+
+        Returns:
+            DataFrame (colonnes RUN_COLUMNS)
+        """
+        query = f"SELECT {', '.join(RUN_COLUMNS)} FROM runs"
+        args = ()
+        if file_hash is not None:
+            query, args = query + ' WHERE file_hash = ?', (file_hash,)
+        with self._connect() as connection:
+            rows = connection.execute(query + ' ORDER BY created_at DESC, rowid DESC', args).fetchall()
+        return pd.DataFrame(rows, columns=RUN_COLUMNS)
+
+    def delete(self, run_id):
+        """Retire une exécution de l'archive."""
+        with self._lock, self._connect() as connection:
+            for table in ('members', 'detections', 'results', 'runs'):
+                connection.execute(f'DELETE FROM {table} WHERE run_id = ?', (run_id,))
+
+    def hits(self, msisdn=None, start=None, end=None, scenarios=None, run_id=None, limit=None):
+        """
+        Détections archivées d'une entité, d'une période ou de scénarios.
+
+        Les détections sans date (tableaux répétitifs) sont retenues si la
+        période de leur exécution recoupe la période demandée.
+
+        Args:
+            msisdn: MSISDN recherché (toutes ses détections, un rôle par ligne), None = tous
+            start: premier jour (date), None = depuis le début
+            end: dernier jour inclus (date), None = jusqu'à la fin
+            scenarios: tableaux de détection (ARCHIVE_SCENARIOS), None = tous
+            run_id: une seule exécution, None = toutes
+            limit: nombre maximal de lignes, None = illimité
+
+        Returns:
+            DataFrame (colonnes HIT_COLUMNS), des détections les plus récentes aux
+            plus anciennes ; record = ligne du tableau de détection en JSON
+        """
+        if msisdn is not None:
+            select = "SELECT r.run_id, r.created_at, r.source, d.scenario, d.row, d.date, m.msisdn, m.role"
+            source = (" FROM members m JOIN detections d USING (run_id, scenario, row)"
+                      " JOIN runs r ON r.run_id = d.run_id")
+            conditions, args = ['m.msisdn = ?'], [str(msisdn)]
+        else:
+            select = "SELECT r.run_id, r.created_at, r.source, d.scenario, d.row, d.date, NULL, NULL"
+            source = " FROM detections d JOIN runs r ON r.run_id = d.run_id"
+            conditions, args = [], []
+        if start is not None or end is not None:
+            # Deux termes indexés sur d.date : détections datées, puis sans date (période de l'exécution)
+            first = '0000-00-00' if start is None else start.isoformat()
+            last = '9999-99-99' if end is None else end.isoformat()
+            conditions.append(
+                '(d.date BETWEEN ? AND ? OR (d.date IS NULL AND r.start_date <= ? AND r.end_date >= ?))'
+            )
+            args.extend([first, last, last, first])
+        if scenarios is not None:
+            scenarios = list(scenarios)
+            conditions.append(f"d.scenario IN ({', '.join('?' * len(scenarios))})")
+            args.extend(scenarios)
+        if run_id is not None:
+            conditions.append('d.run_id = ?')
+            args.append(run_id)
+        query = select + ', d.risk_score, d.record' + source
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY d.date DESC, r.created_at DESC, d.scenario, d.row'
+        if limit is not None:
+            query += f' LIMIT {int(limit)}'
+        with self._connect() as connection:
+            rows = connection.execute(query, args).fetchall()
+        return pd.DataFrame(rows, columns=HIT_COLUMNS)
+
+    @staticmethod
+    def detections(hits):
+        """
+        Lignes des tableaux de détection trouvées par hits().
+
+        Returns:
+            dict scénario → DataFrame (run_id, role si recherche par MSISDN, puis
+            les colonnes du tableau de détection), scénarios sans détection omis
+        """
+        found = {}
+        for scenario, rows in hits.groupby('scenario', sort=False):
+            table = pd.DataFrame(rows['record'].map(json.loads).tolist(), index=rows.index)
+            prefix = ['run_id'] if rows['role'].isna().all() else ['run_id', 'role']
+            found[scenario] = pd.concat([rows[prefix], table], axis=1).reset_index(drop=True)
+        return found
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='fraud_engine.archive',
+        description="Archive persistante des exécutions de détection."
+    )
+    parser.add_argument('archive', help="Fichier SQLite de l'archive")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('runs', help="Lister les exécutions archivées")
+
+    hits = commands.add_parser('hits', help="Détections archivées d'une entité ou d'une période")
+    hits.add_argument('--msisdn', default=None, help="MSISDN recherché")
+    hits.add_argument('--start', type=datetime.date.fromisoformat, default=None, help="Premier jour (AAAA-MM-JJ)")
+    hits.add_argument('--end', type=datetime.date.fromisoformat, default=None, help="Dernier jour inclus (AAAA-MM-JJ)")
+    hits.add_argument('--scenario', action='append', choices=ARCHIVE_SCENARIOS, default=None,
+                      help="Tableau de détection, répétable (défaut : tous)")
+    hits.add_argument('--run', default=None, help="Identifiant d'exécution")
+    hits.add_argument('--limit', type=int, default=None, help="Nombre maximal de lignes")
+    hits.add_argument('-o', '--output', default=None, help="Fichier CSV écrit (défaut : affichage)")
+
+    delete = commands.add_parser('delete', help="Retirer une exécution de l'archive")
+    delete.add_argument('run', help="Identifiant d'exécution")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    archive = RunArchive(args.archive)
+    if args.command == 'runs':
+        table = archive.runs().drop(columns='params')
+    elif args.command == 'delete':
+        archive.delete(args.run)
+        print(f"🗑️ {args.run} retirée de l'archive")
+        return 0
+    else:
+        table = archive.hits(msisdn=args.msisdn, start=args.start, end=args.end, scenarios=args.scenario,
+                             run_id=args.run, limit=args.limit)
+        if args.output:
+            table.to_csv(args.output, index=False)
+            print(f"✅ {len(table)} détection(s) → {args.output}")
+            return 0
+        table = table.drop(columns='record')
+    print(table.to_string(index=False) if len(table) else "Aucun résultat.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
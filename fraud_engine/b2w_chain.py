@@ -0,0 +1,178 @@
+"""
+Scénario chaîné : B2W → Send Money → W2B (même jour ou délais maximaux)
+
+Les deux étapes sont des jointures ordonnées dans le temps (voir
+windows.range_pairs) : pour chaque B2W, seuls les Send Money postérieurs du
+client A (dans le délai) sont générés, sous forme de paires d'indices, puis de
+même pour les W2B du client B. Aucun couple violant l'ordre temporel n'est
+matérialisé, la tolérance de montant éventuelle est appliquée sur les paires
+d'indices avant l'étape suivante, et le nombre de candidats par client est
+plafonné pour borner la mémoire des journées les plus chargées. Le tableau de
+sortie est construit directement à partir des colonnes.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from .instrument import count
+from .scheduler import checkpoint
+from .windows import key_codes, range_pairs
+
+SCENARIO = 'B2W → Send Money → W2B'
+
+B2W_SEND_W2B_COLUMNS = [
+    'date', 'Source Bank', 'client_A', 'b2w_amount', 'b2w_time', 'client_B',
+    'send_amount', 'sm_time_1', 'w2b_amount', 'w2b_time', 'Destination Bank',
+    'delay_B2W_to_Send_min', 'delay_Send_to_W2B_min', 'scenario',
+]
+
+# Nombre maximal de paires candidates par client et par étape
+MAX_CANDIDATES_PER_CLIENT = 10_000
+
+_KEYS = ['INITATE_DATE', 'DEBIT_MSISDN', 'CREDIT_MSISDN']
+
+
+def _time_ns(df):
+    return df['INITATE_DATE'].to_numpy(dtype='datetime64[ns]').view('int64')
+
+
+def _minutes(later_ns, earlier_ns):
+    """Délai en minutes (même calcul que Timedelta.total_seconds() / 60)."""
+    return (later_ns - earlier_ns) / 1e9 / 60
+
+
+def _within_tolerance(reference, amounts, tolerance):
+    """Montants égaux à la référence à `tolerance` près (fraction de la référence)."""
+    reference = reference.astype('float64')
+    return np.abs(amounts.astype('float64') - reference) <= tolerance * np.abs(reference)
+
+
+def _step(name, left_clients, left_times, left_days, right, right_times, max_delay, max_candidates):
+    """
+    Étape ordonnée : événements de `right` émis par les clients de gauche après eux.
+
+    Returns:
+        (indices gauche, indices dans right)
+    """
+    checkpoint()
+    left_keys, right_keys = key_codes(
+        left_clients, right['DEBIT_MSISDN'],
+        by=None if max_delay is not None else [left_days, right['DATE']],
+    )
+    left_index, right_index, capped = range_pairs(
+        left_keys, left_times, right_keys, right_times, max_delay=max_delay, max_per_key=max_candidates
+    )
+    count(f'{name}_join', len(left_index))
+    report_capped(name, capped, max_candidates)
+    return left_index, right_index
+
+
+def report_capped(name, capped, max_candidates):
+    """Compte et signale les clients dont les candidats d'une étape ont été plafonnés."""
+    if capped:
+        count(f'{name}_capped_clients', capped)
+        warnings.warn(
+            f"B2W → Send Money → W2B : {capped} client(s) dépassent {max_candidates} candidats "
+            f"({name}), candidats suivants ignorés"
+        )
+
+
+def detect_b2w_send_w2b(b2w_all, send_all, w2b_all, max_delays=None, amount_tolerance=None,
+                        max_candidates=MAX_CANDIDATES_PER_CLIENT):
+    """
+    Détecte les B2W suivis d'un Send Money puis d'un W2B par le destinataire.
+
+    Sans délais maximaux, les trois transactions doivent avoir lieu le même
+    jour ; avec max_delays (B2W → Send, Send → W2B), chaque étape doit suivre
+    la précédente d'au plus le délai correspondant, y compris après minuit.
+
+    Args:
+        b2w_all: DataFrame des B2W
+        send_all: DataFrame des Send Money
+        w2b_all: DataFrame des W2B
+        max_delays: (délai B2W → Send, délai Send → W2B) en minutes, None = même jour
+        amount_tolerance: écart relatif maximal entre le montant d'une étape et
+            celui de la précédente (ex. 0.1 = 10 %), None = montants libres
+        max_candidates: nombre maximal de candidats par client (et par jour sans
+            délais) et par étape, avertissement si atteint ; None = illimité
+
+    Returns:
+        DataFrame des cas détectés (colonnes B2W_SEND_W2B_COLUMNS)
+    """
+    b2w = b2w_all.dropna(subset=_KEYS)
+    send = send_all.dropna(subset=_KEYS)
+    w2b = w2b_all.dropna(subset=_KEYS)
+    b2w_delay, w2b_delay = max_delays if max_delays is not None else (None, None)
+
+    # Étape 1 : B2W → Send Money émis par le client A
+    b2w_times, send_times, w2b_times = _time_ns(b2w), _time_ns(send), _time_ns(w2b)
+    b2w_index, send_index = _step(
+        'step1', b2w['CREDIT_MSISDN'], b2w_times, b2w['DATE'], send, send_times, b2w_delay, max_candidates
+    )
+    if amount_tolerance is not None:
+        keep = _within_tolerance(
+            b2w['ACTUAL_AMOUNT'].to_numpy()[b2w_index], send['ACTUAL_AMOUNT'].to_numpy()[send_index],
+            amount_tolerance,
+        )
+        b2w_index, send_index = b2w_index[keep], send_index[keep]
+    count('step1', len(b2w_index))
+
+    # Étape 2 : Send Money → W2B émis par le client B
+    pair_index, w2b_index = _step(
+        'step2', send['CREDIT_MSISDN'].to_numpy()[send_index], send_times[send_index],
+        b2w['DATE'].to_numpy()[b2w_index], w2b, w2b_times, w2b_delay, max_candidates
+    )
+    b2w_index, send_index = b2w_index[pair_index], send_index[pair_index]
+    if amount_tolerance is not None:
+        keep = _within_tolerance(
+            send['ACTUAL_AMOUNT'].to_numpy()[send_index], w2b['ACTUAL_AMOUNT'].to_numpy()[w2b_index],
+            amount_tolerance,
+        )
+        b2w_index, send_index, w2b_index = b2w_index[keep], send_index[keep], w2b_index[keep]
+    count('step2', len(w2b_index))
+
+    if not len(w2b_index):
+        return pd.DataFrame(columns=B2W_SEND_W2B_COLUMNS)
+
+    def take(frame, column, index):
+        return frame[column].array.take(index)
+
+    return pd.DataFrame({
+        'date': take(b2w, 'DATE', b2w_index),
+        'Source Bank': take(b2w, 'DEBIT_MSISDN', b2w_index),
+        'client_A': take(b2w, 'CREDIT_MSISDN', b2w_index),
+        'b2w_amount': take(b2w, 'ACTUAL_AMOUNT', b2w_index),
+        'b2w_time': take(b2w, 'INITATE_DATE', b2w_index),
+        'client_B': take(send, 'CREDIT_MSISDN', send_index),
+        'send_amount': take(send, 'ACTUAL_AMOUNT', send_index),
+        'sm_time_1': take(send, 'INITATE_DATE', send_index),
+        'w2b_amount': take(w2b, 'ACTUAL_AMOUNT', w2b_index),
+        'w2b_time': take(w2b, 'INITATE_DATE', w2b_index),
+        'Destination Bank': take(w2b, 'CREDIT_MSISDN', w2b_index),
+        'delay_B2W_to_Send_min': _minutes(send_times[send_index], b2w_times[b2w_index]),
+        'delay_Send_to_W2B_min': _minutes(w2b_times[w2b_index], send_times[send_index]),
+        'scenario': SCENARIO,
+    })
+
+
+def b2w_send_w2b_repetitions(scenario_df):
+    """
+    Couples Client A → Client B répétant le scénario.
+
+    Returns:
+        DataFrame agrégé par (client_A, client_B)
+    """
+    return (
+        scenario_df
+        .groupby(['client_A', 'client_B'], as_index=False)
+        .agg(
+            nb_occurrences=('scenario', 'count'),
+            montant_total_b2w=('b2w_amount', 'sum'),
+            montant_total_send=('send_amount', 'sum'),
+            montant_total_w2b=('w2b_amount', 'sum'),
+            premiere_date=('date', 'min'),
+            derniere_date=('date', 'max')
+        )
+        .query('nb_occurrences >= 1')
+    )
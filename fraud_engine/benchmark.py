@@ -0,0 +1,186 @@
+"""
+Banc de performance des détecteurs sur données synthétiques
+
+Pour chaque taille demandée, un fichier synthétique (avec fraudes plantées)
+est généré puis chaque étape est chronométrée et profilée en mémoire :
+chargement, classification et chaque détecteur. Le rapport JSON indique, par
+étape, le temps réel, le temps CPU, le pic d'allocations Python, le pic RSS du
+processus et le nombre de lignes produites, ainsi que les scénarios plantés
+retrouvés ; il peut être comparé d'une version à l'autre.
+
+Exemple :
+    python -m fraud_engine.benchmark --sizes 10k,1M,10M -o benchmark.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from .b2w_chain import detect_b2w_send_w2b
+from .cashin_w2b import detect_cashin_w2b
+from .chains import collect_money_chains
+from .circular import detect_circular
+from .classify import classify_transactions
+from .instrument import RunProfile, row_count
+from .loader import load_transactions
+from .repeats import detect_repeats
+from .rings import detect_rings
+from .synthetic import generate_transactions, recovered, write_transactions
+from .velocity import detect_velocity
+
+DEFAULT_SIZES = '10k,1M,10M'
+
+_SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+
+def parse_size(text):
+    """'10k' → 10000, '1M' → 1000000."""
+    text = text.strip().lower()
+    if text[-1] in _SUFFIXES:
+        return int(float(text[:-1]) * _SUFFIXES[text[-1]])
+    return int(text)
+
+
+def _generated_file(work_dir, rows, days, n_clients, planted_per_scenario, seed):
+    """Génère (ou réutilise) le fichier synthétique d'une taille donnée."""
+    tx_per_day = max(1, rows // days)
+    df, planted = generate_transactions(
+        n_clients=n_clients, days=days, tx_per_day=tx_per_day, n_circular=planted_per_scenario,
+        n_chains=planted_per_scenario, n_b2w=planted_per_scenario, n_rings=planted_per_scenario,
+        n_bursts=planted_per_scenario, seed=seed,
+    )
+    # Le nombre de scénarios plantés distingue les fichiers des versions précédentes du générateur
+    path = os.path.join(
+        work_dir, f"synthetic_{rows}_{days}d_{n_clients}c_{planted_per_scenario}p{len(planted)}s_{seed}.csv"
+    )
+    if not os.path.exists(path):
+        write_transactions(df, path)
+    return path, len(df), planted
+
+
+def run_size(rows, work_dir, days=7, n_clients=None, planted_per_scenario=10, max_depth=10,
+             trace_memory=True, seed=0):
+    """
+    Banc complet pour une taille de fichier.
+
+    Returns:
+        dict (taille, mesures par étape, scénarios retrouvés)
+    """
+    n_clients = n_clients or max(1_000, rows // 50)
+    path, total_rows, planted = _generated_file(work_dir, rows, days, n_clients, planted_per_scenario, seed)
+
+    profile = RunProfile(trace_memory=trace_memory)
+
+    def step(name, function):
+        with profile.stage(name) as record:
+            result = function()
+            record['rows_out'] = row_count(result)
+        return result
+
+    with profile:
+        df = step('load', lambda: load_transactions(path))
+        # Sous-ensembles matérialisés dans l'étape pour en mesurer le coût complet
+        types = step('classify', lambda: dict(classify_transactions(df)))
+        results = step('repeats', lambda: detect_repeats(types))
+        results['circular'] = step('circular', lambda: detect_circular(types['mp'], types['cashin'], types['cashout']))
+        results['cashin_w2b'] = step('cashin_w2b', lambda: detect_cashin_w2b(types['cashin'], types['w2b']))
+        results['chains'] = step('chains', lambda: collect_money_chains(
+            types['cashin'], types['send'], types['w2b'], max_depth=max_depth
+        ))
+        results['b2w_send_w2b'] = step('b2w_send_w2b', lambda: detect_b2w_send_w2b(
+            types['b2w'], types['send'], types['w2b']
+        ))
+        results['rings'] = step('rings', lambda: detect_rings(types['send']))
+        results['velocity'] = step('velocity', lambda: detect_velocity(types))
+    stages = profile.stages
+
+    return {
+        'rows': total_rows,
+        'days': days,
+        'clients': n_clients,
+        'file_mb': round(os.path.getsize(path) / 1024 ** 2, 2),
+        'stages': stages,
+        'total_wall_s': round(sum(stage['wall_s'] for stage in stages), 4),
+        'recovered': recovered(results, planted),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(__file__),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Contexte d'exécution enregistré dans le rapport."""
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='fraud_engine.benchmark',
+        description="Chronomètre et profile chaque étape de détection sur des fichiers synthétiques."
+    )
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Tailles en lignes, ex. 10k,1M,10M")
+    parser.add_argument('--days', type=int, default=7, help="Nombre de jours générés")
+    parser.add_argument('--clients', type=int, default=None, help="Nombre de clients (défaut: lignes / 50)")
+    parser.add_argument('--planted', type=int, default=10, help="Fraudes plantées par scénario")
+    parser.add_argument('--max-depth', type=int, default=10, help="Profondeur maximale des chaînes")
+    parser.add_argument('--seed', type=int, default=0, help="Graine aléatoire")
+    parser.add_argument('--work-dir', default='benchmark_data', help="Dossier des fichiers générés")
+    parser.add_argument('--no-trace-memory', action='store_true',
+                        help="Ne pas suivre les allocations (tracemalloc ralentit les étapes)")
+    parser.add_argument('-o', '--output', default='benchmark.json', help="Rapport JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    report = {'environment': environment(), 'runs': []}
+    for size in args.sizes.split(','):
+        run = run_size(
+            parse_size(size), args.work_dir, days=args.days, n_clients=args.clients,
+            planted_per_scenario=args.planted, max_depth=args.max_depth,
+            trace_memory=not args.no_trace_memory, seed=args.seed,
+        )
+        report['runs'].append(run)
+        print(f"📊 {run['rows']} lignes ({run['file_mb']} Mo) : {run['total_wall_s']:.2f} s")
+        for stage in run['stages']:
+            memory = f", pic {stage['peak_alloc_mb']} Mo" if 'peak_alloc_mb' in stage else ""
+            print(f"   {stage['stage']}: {stage['wall_s']:.2f} s (CPU {stage['cpu_s']:.2f} s{memory})")
+        for name, counts in run['recovered'].items():
+            status = "✅" if counts['retrouves'] == counts['plantes'] else "❌"
+            print(f"   {status} {name}: {counts['retrouves']}/{counts['plantes']} fraudes plantées retrouvées")
+
+    with open(args.output, 'w', encoding='utf-8') as handle:
+        json.dump(report, handle, ensure_ascii=False, indent=2)
+    print(f"✅ Rapport écrit dans {args.output}")
+
+    complete = all(
+        counts['retrouves'] == counts['plantes']
+        for run in report['runs'] for counts in run['recovered'].values()
+    )
+    return 0 if complete else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
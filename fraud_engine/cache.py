@@ -0,0 +1,213 @@
+"""
+Cache des résultats de prétraitement et de détection
+
+Les entrées sont indexées par l'empreinte (hash) du contenu du fichier chargé,
+le nom de l'étape et ses paramètres. Le niveau mémoire est borné en taille
+avec éviction LRU ; un niveau disque optionnel conserve les entrées entre deux
+redémarrages du serveur.
+"""
+import hashlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from .classify import TypedTransactions
+from .entities import EntityIndex
+
+_HASH_BLOCK = 1 << 20
+_SIZE_SAMPLE = 1000
+_MISSING = object()
+
+
+def content_hash(source):
+    """
+    Empreinte SHA-256 du contenu d'un fichier.
+
+    Args:
+        source: bytes, chemin, objet fichier (la position est restaurée) ou
+            source base de données (empreinte de la requête et des données, voir
+            database.DatabaseSource.fingerprint)
+
+    Returns:
+        empreinte hexadécimale
+    """
+    if hasattr(source, 'fingerprint'):
+        return source.fingerprint()
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as handle:
+            for block in iter(lambda: handle.read(_HASH_BLOCK), b''):
+                digest.update(block)
+    else:
+        position = source.tell()
+        source.seek(0)
+        for block in iter(lambda: source.read(_HASH_BLOCK), b''):
+            digest.update(block)
+        source.seek(position)
+    return digest.hexdigest()
+
+
+def cache_key(stage, file_hash, **params):
+    """Clé de cache d'une étape : (étape, empreinte du fichier, paramètres)."""
+    payload = json.dumps([stage, file_hash, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _frame_nbytes(df):
+    """Taille mémoire estimée d'un DataFrame (colonnes objet estimées par échantillon)."""
+    total = int(df.memory_usage(index=True, deep=False).sum())
+    for column in df.columns:
+        series = df[column]
+        if series.dtype == object and len(series):
+            sample = series.iloc[:: max(1, len(series) // _SIZE_SAMPLE)]
+            total += int(sum(sys.getsizeof(value) for value in sample) / len(sample) * len(series))
+    return total
+
+
+def estimate_size(value):
+    """Taille mémoire estimée d'une valeur mise en cache (octets)."""
+    if isinstance(value, pd.DataFrame):
+        return _frame_nbytes(value)
+    if isinstance(value, pd.Series):
+        return _frame_nbytes(value.to_frame())
+    if isinstance(value, TypedTransactions):
+        # DataFrame de base + indices ; les sous-ensembles sont matérialisés à la demande
+        return _frame_nbytes(value.df) + sum(value.indices(tx_type).nbytes for tx_type in value)
+    if isinstance(value, EntityIndex):
+        # Les tableaux de détection indexés sont partagés avec les résultats des détecteurs
+        return _frame_nbytes(value.entities) + value.nbytes
+    if isinstance(value, dict):
+        return sum(estimate_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Cache LRU borné en mémoire, avec niveau disque optionnel."""
+
+    def __init__(self, max_bytes=2 * 1024 ** 3, disk_dir=None, max_disk_bytes=None):
+        """
+        Args:
+            max_bytes: taille maximale du niveau mémoire (octets)
+            disk_dir: dossier du niveau disque, None = désactivé
+            max_disk_bytes: taille maximale du niveau disque, None = illimitée
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()  # clé → (valeur, taille)
+        self._size = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._entries:
+                return True
+            path = self._disk_path(key)
+            return bool(path) and os.path.exists(path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        """Taille occupée par le niveau mémoire (octets)."""
+        return self._size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pkl") if self.disk_dir else None
+
+    def _remember(self, key, value):
+        """Insère en mémoire (en tête LRU) puis évince les entrées les plus anciennes."""
+        size = estimate_size(value)
+        if key in self._entries:
+            self._size -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self._size += size
+        while self._size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+
+    def get(self, key, default=None):
+        """Renvoie la valeur associée à `key` (mémoire puis disque), sinon `default`."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+            path = self._disk_path(key)
+            if path and os.path.exists(path):
+                with open(path, 'rb') as handle:
+                    value = pickle.load(handle)
+                os.utime(path)
+                self._remember(key, value)
+                self.disk_hits += 1
+                return value
+
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Enregistre `value` sous `key` en mémoire et, si activé, sur disque."""
+        with self._lock:
+            self._remember(key, value)
+            path = self._disk_path(key)
+            if path:
+                # Écriture atomique : fichier temporaire puis renommage
+                handle, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+                with os.fdopen(handle, 'wb') as tmp:
+                    pickle.dump(value, tmp, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+                self._trim_disk()
+
+    def get_or_compute(self, key, compute):
+        """Renvoie la valeur en cache ou la calcule avec `compute()` et l'enregistre."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def _trim_disk(self):
+        """Supprime les fichiers les moins récemment utilisés au-delà de max_disk_bytes."""
+        if not self.max_disk_bytes:
+            return
+        files = [
+            os.path.join(self.disk_dir, name)
+            for name in os.listdir(self.disk_dir) if name.endswith('.pkl')
+        ]
+        files.sort(key=os.path.getmtime)
+        total = sum(os.path.getsize(path) for path in files)
+        for path in files:
+            if total <= self.max_disk_bytes:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+
+    def clear(self, disk=False):
+        """Vide le niveau mémoire (et le niveau disque si `disk`)."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            if disk and self.disk_dir:
+                for name in os.listdir(self.disk_dir):
+                    if name.endswith('.pkl'):
+                        os.remove(os.path.join(self.disk_dir, name))
+
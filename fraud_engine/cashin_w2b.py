@@ -0,0 +1,91 @@
+"""
+Scénario chaîné : Cash In suivi de W2B (même client, même jour ou délai maximal)
+"""
+import pandas as pd
+
+from .instrument import count
+from .windows import window_join
+
+SCENARIO = 'Cash In suivi de W2B'
+
+CASHIN_W2B_COLUMNS = [
+    'date', 'Distributeur', 'client', 'cashin_amount', 'cashin_time',
+    'w2b_amount', 'w2b_time', 'Banque', 'delay_minutes', 'scenario',
+]
+
+
+def detect_cashin_w2b(cashin_all, w2b_all, max_delay=None):
+    """
+    Détecte les Cash In suivis d'un W2B émis par le client crédité.
+
+    Sans délai maximal, le W2B doit avoir lieu le même jour ; avec max_delay,
+    il doit suivre le Cash In d'au plus max_delay minutes, y compris après
+    minuit (la date du cas est celle du Cash In).
+
+    Args:
+        cashin_all: DataFrame des Cash In
+        w2b_all: DataFrame des W2B
+        max_delay: Délai maximal (minutes) entre le Cash In et le W2B, None = même jour
+
+    Returns:
+        DataFrame des cas détectés (colonnes CASHIN_W2B_COLUMNS)
+    """
+    cashin_all = cashin_all.sort_values('INITATE_DATE', kind='stable')
+    w2b_all = w2b_all.sort_values('INITATE_DATE', kind='stable')
+
+    if max_delay is None:
+        merged = pd.merge(
+            cashin_all,
+            w2b_all,
+            left_on=['DATE', 'CREDIT_MSISDN'],
+            right_on=['DATE', 'DEBIT_MSISDN'],
+            suffixes=('_ci', '_w2b')
+        )
+
+        count('join', len(merged))
+
+        # Filtrer: W2B après Cash In
+        merged = merged[merged['INITATE_DATE_w2b'] > merged['INITATE_DATE_ci']]
+    else:
+        merged = window_join(
+            cashin_all, w2b_all.drop(columns='DATE'),
+            left_on=['CREDIT_MSISDN'], right_on=['DEBIT_MSISDN'],
+            left_time='INITATE_DATE', right_time='INITATE_DATE',
+            max_delay=max_delay, suffixes=('_ci', '_w2b'), counter='join',
+        )
+    if merged.empty:
+        return pd.DataFrame(columns=CASHIN_W2B_COLUMNS)
+
+    return pd.DataFrame({
+        'date': merged['DATE'],
+        'Distributeur': merged['DEBIT_MSISDN_ci'],
+        'client': merged['CREDIT_MSISDN_ci'],
+        'cashin_amount': merged['ACTUAL_AMOUNT_ci'],
+        'cashin_time': merged['INITATE_DATE_ci'],
+        'w2b_amount': merged['ACTUAL_AMOUNT_w2b'],
+        'w2b_time': merged['INITATE_DATE_w2b'],
+        'Banque': merged['CREDIT_MSISDN_w2b'],
+        'delay_minutes': (merged['INITATE_DATE_w2b'] - merged['INITATE_DATE_ci']).dt.total_seconds() / 60,
+        'scenario': SCENARIO,
+    }).reset_index(drop=True)
+
+
+def cashin_w2b_repetitions(scenario_df):
+    """
+    Couples Distributeur → client répétant le scénario.
+
+    Returns:
+        DataFrame agrégé par (Distributeur, client)
+    """
+    return (
+        scenario_df
+        .groupby(['Distributeur', 'client'], as_index=False)
+        .agg(
+            nb_occurrences=('scenario', 'count'),
+            montant_total_cashin=('cashin_amount', 'sum'),
+            montant_total_w2b=('w2b_amount', 'sum'),
+            premiere_date=('date', 'min'),
+            derniere_date=('date', 'max')
+        )
+        .query('nb_occurrences >= 1')
+    )
@@ -0,0 +1,833 @@
+"""
+Moteur de recherche des chaînes Cash In → Send Money (N) → W2B
+
+Les transferts du jour sont indexés par émetteur : pour chaque émetteur, les
+destinataires, horodatages et montants sont rangés dans des tableaux NumPy
+triés par temps. La recherche des « transferts suivants après t » se fait par
+dichotomie au lieu d'un masque booléen sur tout le DataFrame, et l'exploration
+est itérative (pile explicite) avec un ensemble des clients déjà visités.
+
+Les chemins trouvés sont rangés en colonnes (ChainSteps : une ligne par étape
+avec codes entiers des clients, plus un tableau de bornes par chaîne) au lieu
+de listes de dict par étape ; les métriques sont calculées par réductions
+vectorisées sur ces colonnes. Dans le tableau des chaînes, les parcours
+(clients_chain, full_chain) restent des listes Arrow : les libellés
+'A → B → C' ne sont construits (chain_labels) que pour les lignes affichées
+ou exportées.
+"""
+import warnings
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .instrument import count
+from .scheduler import checkpoint
+from .scoring import score_cases
+
+
+class TransferIndex:
+    """Index d'adjacence par émetteur, trié par temps."""
+
+    def __init__(self, transfers, decode=None):
+        """
+        Args:
+            transfers: DataFrame (DEBIT_MSISDN, CREDIT_MSISDN, ACTUAL_AMOUNT, INITATE_DATE)
+            decode: fonction vectorisée code → MSISDN si les MSISDN sont encodés
+        """
+        transfers = transfers.dropna(subset=['DEBIT_MSISDN', 'CREDIT_MSISDN', 'INITATE_DATE'])
+        senders, uniques = pd.factorize(transfers['DEBIT_MSISDN'])
+        times = transfers['INITATE_DATE'].to_numpy(dtype='datetime64[ns]').view('int64')
+
+        # Tri stable par (émetteur, temps)
+        order = np.lexsort((times, senders))
+        senders = senders[order]
+
+        self.senders = transfers['DEBIT_MSISDN'].to_numpy()[order]
+        self.receivers = transfers['CREDIT_MSISDN'].to_numpy()[order]
+        self.amounts = transfers['ACTUAL_AMOUNT'].to_numpy()[order]
+        self.times = times[order]
+
+        # Libellés affichés dans les étapes (MSISDN décodés si nécessaire)
+        self.sender_labels = decode(self.senders) if decode else self.senders
+        self.receiver_labels = decode(self.receivers) if decode else self.receivers
+
+        bounds = np.flatnonzero(np.diff(senders)) + 1
+        starts = np.concatenate(([0], bounds)) if len(senders) else np.array([], dtype='int64')
+        ends = np.concatenate((bounds, [len(senders)])) if len(senders) else np.array([], dtype='int64')
+        uniques = np.asarray(uniques, dtype=object)
+        self._slices = {
+            uniques[senders[start]]: (int(start), int(end))
+            for start, end in zip(starts, ends)
+        }
+
+    def __len__(self):
+        return len(self.times)
+
+    def after(self, sender, time_ns, max_delay_ns=None):
+        """
+        Positions (lo, hi) des transferts de `sender` strictement après `time_ns`
+        (et au plus `max_delay_ns` après, si fourni).
+        """
+        bounds = self._slices.get(sender)
+        if bounds is None:
+            return 0, 0
+        start, end = bounds
+        times = self.times[start:end]
+        lo = start + int(times.searchsorted(time_ns, side='right'))
+        if max_delay_ns is None:
+            return lo, end
+        hi = start + int(times.searchsorted(time_ns + max_delay_ns, side='right'))
+        return lo, hi
+
+    def step(self, position, step_type):
+        """Construit l'étape de chaîne (dict) correspondant à une position de l'index."""
+        step = {
+            'type': step_type,
+            'from': self.sender_labels[position],
+            'to': self.receiver_labels[position],
+            'amount': self.amounts[position],
+            'time': pd.Timestamp(self.times[position]),
+        }
+        if step_type == 'w2b':
+            step['bank'] = self.receiver_labels[position]
+        return step
+
+
+def _to_ns(minutes):
+    return None if minutes is None else int(minutes * 60 * 1_000_000_000)
+
+
+# Motifs d'élagage des chemins (voir ChainBudget)
+PRUNE_REASONS = {
+    'max_paths': "Cash In tronqué(s) après max_paths chemins",
+    'max_nodes': "Cash In tronqué(s) après max_nodes Send Money explorés",
+    'duplicate': "chemin(s) en double (même suite de clients pour un Cash In)",
+    'top_k': "chaîne(s) hors des top_k meilleurs scores",
+}
+
+
+class ChainBudget:
+    """Limites de la recherche des chaînes (None = illimité)."""
+
+    def __init__(self, top_k=None, max_paths=None, max_nodes=None, dedup=False):
+        """
+        Args:
+            top_k: nombre de chaînes conservées, par score de risque décroissant
+                (les ex aequo dans l'ordre de découverte) ; les chaînes sont
+                évaluées par lots de Cash In et seules les top_k meilleures
+                restent en mémoire
+            max_paths: nombre maximal de chaînes par Cash In
+            max_nodes: nombre maximal de Send Money explorés par Cash In
+            dedup: ne garder, pour un Cash In, que la première chaîne d'une
+                même suite de clients (W2B ou Send Money répétés entre les
+                mêmes clients)
+        """
+        for name, value in (('top_k', top_k), ('max_paths', max_paths), ('max_nodes', max_nodes)):
+            if value is not None and value < 1:
+                raise ValueError(f"ChainBudget : {name} doit être au moins 1 (ou None)")
+        self.top_k = top_k
+        self.max_paths = max_paths
+        self.max_nodes = max_nodes
+        self.dedup = bool(dedup)
+
+    def __bool__(self):
+        return any(value is not None for value in (self.top_k, self.max_paths, self.max_nodes)) or self.dedup
+
+    def __repr__(self):
+        return f"ChainBudget({', '.join(f'{name}={value!r}' for name, value in self.to_dict().items())})"
+
+    def to_dict(self):
+        """Paramètres sérialisables (clé de cache)."""
+        return {'top_k': self.top_k, 'max_paths': self.max_paths, 'max_nodes': self.max_nodes, 'dedup': self.dedup}
+
+    def exploration(self):
+        """Même budget sans top_k (sélection appliquée par l'appelant)."""
+        return ChainBudget(max_paths=self.max_paths, max_nodes=self.max_nodes, dedup=self.dedup)
+
+
+def _prune(pruned, reason, number=1):
+    if pruned is not None:
+        pruned[reason] += number
+
+
+def report_pruned(pruned):
+    """Compte et signale les chemins écartés par le budget de recherche."""
+    for reason, number in pruned.items():
+        count(f'chains_pruned_{reason}', number)
+    if any(pruned.values()):
+        details = ', '.join(f"{pruned[reason]} {label}" for reason, label in PRUNE_REASONS.items() if pruned[reason])
+        warnings.warn(f"Chaînes : recherche bornée, {details}")
+
+
+def find_chain_paths(client, time_ns, send_index, w2b_index, max_depth=10, max_delay_ns=None, budget=None,
+                     pruned=None):
+    """
+    Parcourt les chemins Send Money (N) → W2B partant d'un client après `time_ns`.
+
+    Args:
+        client: client crédité par le Cash In
+        time_ns: horodatage du Cash In (ns)
+        send_index: TransferIndex des Send Money
+        w2b_index: TransferIndex des W2B
+        max_depth: Profondeur maximale de recherche (nombre max de Send Money + 1)
+        max_delay_ns: Délai maximal (ns) entre deux étapes, None = illimité
+        budget: ChainBudget (max_paths, max_nodes, dedup), None = exploration complète
+        pruned: Counter des chemins écartés par motif (PRUNE_REASONS), complété sur place
+
+    Yields:
+        (positions des Send Money dans send_index, position du W2B dans w2b_index)
+    """
+    if max_depth < 1:
+        return
+    max_paths = budget.max_paths if budget is not None else None
+    max_nodes = budget.max_nodes if budget is not None else None
+    seen = set() if budget is not None and budget.dedup else None
+
+    path = []        # positions des Send Money dans send_index
+    visited = set()  # destinataires des Send Money du chemin courant
+    paths = nodes = 0
+
+    def enter(client, time_ns, depth):
+        """Trame d'exploration (W2B puis Send Money du client)."""
+        w2b_lo, w2b_hi = w2b_index.after(client, time_ns, max_delay_ns)
+        # Au-delà de max_depth, les étapes suivantes ne seraient pas explorées
+        lo, hi = send_index.after(client, time_ns, max_delay_ns) if depth < max_depth else (0, 0)
+        return [w2b_lo, w2b_hi, lo, hi, depth]
+
+    stack = [enter(client, time_ns, depth=1)]
+    while stack:
+        frame = stack[-1]
+        if frame[0] < frame[1]:
+            frame[0] += 1
+            if seen is not None:
+                # Même suite de clients qu'un chemin déjà émis pour ce Cash In
+                clients = tuple(send_index.receivers[position] for position in path)
+                if clients in seen:
+                    _prune(pruned, 'duplicate')
+                    continue
+                seen.add(clients)
+            if max_paths is not None and paths >= max_paths:
+                _prune(pruned, 'max_paths')
+                return
+            paths += 1
+            yield tuple(path), frame[0] - 1
+            continue
+        if frame[2] >= frame[3]:
+            stack.pop()
+            if path:
+                visited.discard(send_index.receivers[path.pop()])
+            continue
+
+        position = frame[2]
+        frame[2] += 1
+        next_client = send_index.receivers[position]
+
+        # Éviter les cycles (client déjà destinataire d'un Send Money de la chaîne)
+        if next_client in visited:
+            continue
+        if max_nodes is not None and nodes >= max_nodes:
+            _prune(pruned, 'max_nodes')
+            return
+
+        nodes += 1
+        path.append(position)
+        visited.add(next_client)
+        stack.append(enter(next_client, int(send_index.times[position]), frame[4] + 1))
+
+
+def find_money_chains(ci_row, send_index, w2b_index, max_depth=10, max_hop_delay=None, decode=None):
+    """
+    Trouve toutes les chaînes de Send Money partant d'un Cash In jusqu'à un W2B
+
+    Args:
+        ci_row: La transaction Cash In de départ
+        send_index: TransferIndex des Send Money du jour
+        w2b_index: TransferIndex des W2B du jour
+        max_depth: Profondeur maximale de recherche (nombre max de Send Money + 1)
+        max_hop_delay: Délai maximal (minutes) entre deux étapes, None = illimité
+        decode: fonction vectorisée code → MSISDN si les MSISDN sont encodés
+
+    Returns:
+        List of chains (chaque chain est une liste de transactions)
+    """
+    distributor, client = ci_row['DEBIT_MSISDN'], ci_row['CREDIT_MSISDN']
+    if decode:
+        distributor, client = decode(np.array([distributor, client]))
+    initial_step = {
+        'type': 'cashin',
+        'from': distributor,
+        'to': client,
+        'amount': ci_row['ACTUAL_AMOUNT'],
+        'time': ci_row['INITATE_DATE'],
+        'distributor': distributor,
+    }
+    paths = find_chain_paths(
+        ci_row['CREDIT_MSISDN'], pd.Timestamp(ci_row['INITATE_DATE']).value, send_index, w2b_index,
+        max_depth, _to_ns(max_hop_delay)
+    )
+    return [
+        [initial_step] + [send_index.step(p, 'send') for p in sends] + [w2b_index.step(w2b, 'w2b')]
+        for sends, w2b in paths
+    ]
+
+
+# Types d'étape des chaînes (codes de ChainSteps.step_type)
+STEP_TYPES = ('cashin', 'send', 'w2b')
+CASHIN_STEP, SEND_STEP, W2B_STEP = range(len(STEP_TYPES))
+
+_STEP_LABELS = pa.array([step_type.upper() for step_type in STEP_TYPES], type=pa.string())
+
+# Parcours des chaînes en listes Arrow : clients successifs et montants des étapes
+CHAIN_PATH_DTYPES = {
+    'clients_chain': pd.ArrowDtype(pa.list_(pa.string())),
+    'full_chain': pd.ArrowDtype(pa.list_(pa.float64())),
+}
+CHAIN_SEPARATOR = ' → '
+
+
+def _list_array(values, offsets):
+    """Colonne de listes Arrow (bornes offsets) sur des valeurs Arrow."""
+    return pd.arrays.ArrowExtensionArray(pa.ListArray.from_arrays(pa.array(offsets, type=pa.int32()), values))
+
+
+class ChainSteps:
+    """
+    Chaînes en colonnes : une ligne par étape (Cash In, Send Money..., W2B), les
+    étapes de la chaîne i occupant les lignes offsets[i]:offsets[i + 1].
+
+    Les clients (sender / receiver) sont des codes entiers dans `labels` ;
+    les métriques sont des réductions vectorisées sur les bornes des chaînes
+    et les parcours sortent en listes Arrow, sans chaînes de caractères
+    construites par chaîne.
+    """
+
+    def __init__(self, offsets, step_type, sender, receiver, amount, time, labels, days, time_unit='ns'):
+        self.offsets = offsets
+        self.step_type = step_type
+        self.sender = sender
+        self.receiver = receiver
+        self.amount = amount
+        self.time = time
+        self.labels = labels
+        self.days = days
+        # Unité des horodatages des Cash In sources (cashin_time en sortie)
+        self.time_unit = time_unit
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_parts(cls, parts, decode=None):
+        """
+        Assemble des blocs de chaînes (voir _PathCollector.columns).
+
+        Args:
+            parts: liste de dict de colonnes brutes (clients non encodés)
+            decode: fonction vectorisée code → MSISDN si les MSISDN sont encodés
+        """
+        parts = [part for part in parts if len(part['days'])] or [_PathCollector.empty_columns()]
+        offsets = [np.zeros(1, dtype='int64')]
+        for part in parts:
+            offsets.append(part['offsets'][1:] + offsets[-1][-1])
+
+        def concat(name):
+            return np.concatenate([part[name] for part in parts])
+
+        sender, receiver = concat('sender'), concat('receiver')
+        codes, labels = pd.factorize(np.concatenate([sender, receiver]))
+        labels = np.asarray(labels, dtype=object)
+        return cls(
+            offsets=np.concatenate(offsets),
+            step_type=concat('step_type'),
+            sender=codes[:len(sender)].astype('int32'),
+            receiver=codes[len(sender):].astype('int32'),
+            amount=concat('amount'),
+            time=concat('time'),
+            labels=decode(labels) if decode else labels,
+            days=concat('days'),
+            time_unit=parts[0]['time_unit'],
+        )
+
+    @property
+    def starts(self):
+        """Position du Cash In de chaque chaîne."""
+        return self.offsets[:-1]
+
+    @property
+    def ends(self):
+        """Position du W2B de chaque chaîne."""
+        return self.offsets[1:] - 1
+
+    def clients_chain(self):
+        """Clients successifs (destinataires du Cash In et des Send Money), en listes Arrow."""
+        clients = self.receiver[self.step_type != W2B_STEP]
+        labels = pa.array(self.labels, type=pa.string())
+        return _list_array(labels.take(pa.array(clients)), self.offsets - np.arange(len(self) + 1))
+
+    def full_chain(self):
+        """Montants des étapes (Cash In, Send Money..., W2B), en listes Arrow."""
+        return _list_array(pa.array(self.amount.astype('float64')), self.offsets)
+
+    def metrics(self):
+        """
+        Métriques des chaînes, en réductions vectorisées.
+
+        Returns:
+            DataFrame (colonnes CHAIN_METRICS)
+        """
+        if not len(self):
+            return pd.DataFrame(columns=CHAIN_METRICS)
+        starts, ends = self.starts, self.ends
+        nb_send = np.diff(self.offsets) - 2
+
+        # Délai total (même calcul que Timedelta.total_seconds() / 60)
+        total_delay = (self.time[ends] - self.time[starts]) / 1e9 / 60
+
+        # Commission potentielle : seulement sur le Cash In, diluée entre les intermédiaires
+        cashin_amount = self.amount[starts].astype('float64')
+        cashin_commission = cashin_amount * CASHIN_COMMISSION_RATE
+        commission_per_intermediary = np.where(nb_send > 0, cashin_commission / (nb_send + 1), cashin_commission)
+
+        return pd.DataFrame({
+            'date': self.days,
+            'distributor': self.labels[self.sender[starts]],
+            'nb_send_money': nb_send,
+            'clients_chain': self.clients_chain(),
+            'cashin_amount': cashin_amount,
+            'cashin_time': self.time[starts].astype('datetime64[ns]').astype(f'datetime64[{self.time_unit}]'),
+            'w2b_amount': self.amount[ends],
+            'w2b_time': self.time[ends].astype('datetime64[ns]'),
+            'w2b_bank': self.labels[self.receiver[ends]],
+            'total_delay_minutes': np.round(total_delay, 2),
+            'cashin_commission_djf': np.round(cashin_commission, 2),
+            'commission_per_person': np.round(commission_per_intermediary, 2),
+            'full_chain': self.full_chain(),
+        }, columns=CHAIN_METRICS)
+
+
+class _PathCollector:
+    """Chemins trouvés pour un ensemble de Cash In, rassemblés en colonnes brutes."""
+
+    def __init__(self, cashins, send_index, w2b_index):
+        """
+        Args:
+            cashins: DataFrame des Cash In explorés (sans valeurs manquantes)
+            send_index: TransferIndex des Send Money
+            w2b_index: TransferIndex des W2B
+        """
+        self.cashins = cashins
+        self.send_index = send_index
+        self.w2b_index = w2b_index
+        self.cashin_rows = []
+        self.send_counts = []
+        self.send_positions = []
+        self.w2b_positions = []
+
+    def add(self, row, sends, w2b):
+        self.cashin_rows.append(row)
+        self.send_counts.append(len(sends))
+        self.send_positions.extend(sends)
+        self.w2b_positions.append(w2b)
+
+    @staticmethod
+    def empty_columns():
+        return {
+            'offsets': np.zeros(1, dtype='int64'), 'step_type': np.empty(0, dtype='int8'),
+            'sender': np.empty(0, dtype=object), 'receiver': np.empty(0, dtype=object),
+            'amount': np.empty(0, dtype='float32'), 'time': np.empty(0, dtype='int64'),
+            'days': np.empty(0, dtype=object), 'time_unit': 'ns',
+        }
+
+    def columns(self):
+        """
+        Colonnes brutes des étapes (clients non encodés).
+
+        Returns:
+            dict offsets, step_type, sender, receiver, amount, time, days
+        """
+        if not self.cashin_rows:
+            return self.empty_columns()
+        cashin_rows = np.asarray(self.cashin_rows, dtype='int64')
+        send_positions = np.asarray(self.send_positions, dtype='int64')
+        w2b_positions = np.asarray(self.w2b_positions, dtype='int64')
+        offsets = np.zeros(len(cashin_rows) + 1, dtype='int64')
+        np.cumsum(np.asarray(self.send_counts, dtype='int64') + 2, out=offsets[1:])
+
+        step_type = np.full(offsets[-1], SEND_STEP, dtype='int8')
+        step_type[offsets[:-1]] = CASHIN_STEP
+        step_type[offsets[1:] - 1] = W2B_STEP
+        is_send = step_type == SEND_STEP
+
+        def gather(cashin_values, send_values, w2b_values, dtype):
+            values = np.empty(len(step_type), dtype=dtype)
+            values[offsets[:-1]] = cashin_values[cashin_rows]
+            values[is_send] = send_values[send_positions]
+            values[offsets[1:] - 1] = w2b_values[w2b_positions]
+            return values
+
+        cashins, sends, w2bs = self.cashins, self.send_index, self.w2b_index
+        cashin_times = cashins['INITATE_DATE'].to_numpy(dtype='datetime64[ns]').view('int64')
+        return {
+            'offsets': offsets,
+            'step_type': step_type,
+            'sender': gather(cashins['DEBIT_MSISDN'].to_numpy(dtype=object), sends.senders, w2bs.senders, object),
+            'receiver': gather(
+                cashins['CREDIT_MSISDN'].to_numpy(dtype=object), sends.receivers, w2bs.receivers, object
+            ),
+            'amount': gather(cashins['ACTUAL_AMOUNT'].to_numpy(), sends.amounts, w2bs.amounts, sends.amounts.dtype),
+            'time': gather(cashin_times, sends.times, w2bs.times, 'int64'),
+            'days': cashins['DATE'].to_numpy(dtype=object)[cashin_rows],
+            'time_unit': np.datetime_data(cashins['INITATE_DATE'].dtype)[0],
+        }
+
+
+def iter_chain_paths(cashins, send_index, w2b_index, max_depth=10, max_hop_delay=None, budget=None, pruned=None,
+                     batch_size=None):
+    """
+    Explore les Cash In et rassemble leurs chaînes en colonnes brutes, par lots de Cash In.
+
+    Args:
+        cashins: DataFrame des Cash In
+        send_index, w2b_index: TransferIndex des Send Money et des W2B
+        max_depth, max_hop_delay: voir collect_money_chains
+        budget: ChainBudget (limites par Cash In), None = exploration complète
+        pruned: Counter des chemins écartés par motif, complété sur place
+        batch_size: nombre de Cash In par lot, None = un seul lot
+
+    Yields:
+        dict de colonnes (voir ChainSteps.from_parts)
+    """
+    columns = ['DEBIT_MSISDN', 'CREDIT_MSISDN', 'ACTUAL_AMOUNT', 'INITATE_DATE', 'DATE']
+    cashins = cashins.dropna(subset=columns[:4])[columns]
+    max_delay_ns = _to_ns(max_hop_delay)
+    batch_size = batch_size or max(len(cashins), 1)
+    for start in range(0, len(cashins), batch_size):
+        batch = cashins.iloc[start:start + batch_size]
+        collector = _PathCollector(batch, send_index, w2b_index)
+        times = batch['INITATE_DATE'].to_numpy(dtype='datetime64[ns]').view('int64')
+        for row, (client, time_ns) in enumerate(zip(batch['CREDIT_MSISDN'].to_numpy(), times)):
+            checkpoint()
+            for sends, w2b in find_chain_paths(client, int(time_ns), send_index, w2b_index, max_depth,
+                                               max_delay_ns, budget, pruned):
+                collector.add(row, sends, w2b)
+        yield collector.columns()
+
+
+# Commission D-Money: 2.56% sur Cash In, 0% sur Send Money
+CASHIN_COMMISSION_RATE = 0.0256
+
+CHAIN_COLUMNS = [
+    'date', 'distributor', 'nb_send_money', 'clients_chain', 'cashin_amount',
+    'cashin_time', 'w2b_amount', 'w2b_time', 'w2b_bank', 'total_delay_minutes',
+    'cashin_commission_djf', 'commission_per_person', 'risk_score', 'flags',
+    'full_chain',
+]
+
+
+# Métriques d'une chaîne avant calcul du score (voir score_chains)
+CHAIN_METRICS = [column for column in CHAIN_COLUMNS if column not in ('risk_score', 'flags')]
+
+
+def chain_record(day, chain):
+    """
+    Calcule les métriques d'une chaîne au format liste d'étapes (détection en
+    temps réel ; les détecteurs par lots utilisent ChainSteps.metrics).
+
+    Args:
+        day: date de la chaîne
+        chain: liste d'étapes (voir find_money_chains)
+
+    Returns:
+        dict (colonnes CHAIN_METRICS)
+    """
+    # Calculer les métriques de la chaîne
+    nb_send = sum(1 for step in chain if step['type'] == 'send')
+
+    # Extraire les clients impliqués
+    clients = [step['to'] for step in chain if step['type'] in ['cashin', 'send']]
+
+    # Calculer le délai total
+    first_time = chain[0]['time']
+    last_time = chain[-1]['time']
+    total_delay = (last_time - first_time).total_seconds() / 60
+
+    # Calculer les montants
+    cashin_amount = chain[0]['amount']
+    w2b_amount = chain[-1]['amount']
+
+    # Commission potentielle : seulement sur le Cash In
+    cashin_commission = cashin_amount * CASHIN_COMMISSION_RATE
+
+    # Commission par intermédiaire (si la chaîne est longue, la commission est diluée)
+    commission_per_intermediary = cashin_commission / (nb_send + 1) if nb_send > 0 else cashin_commission
+
+    return {
+        'date': day,
+        'distributor': chain[0]['from'],
+        'nb_send_money': nb_send,
+        'clients_chain': clients,
+        'cashin_amount': cashin_amount,
+        'cashin_time': first_time,
+        'w2b_amount': w2b_amount,
+        'w2b_time': last_time,
+        'w2b_bank': chain[-1]['bank'],
+        'total_delay_minutes': round(total_delay, 2),
+        'cashin_commission_djf': round(cashin_commission, 2),
+        'commission_per_person': round(commission_per_intermediary, 2),
+        'full_chain': [float(step['amount']) for step in chain]
+    }
+
+
+def score_chains(chains_df, risk_rules=None):
+    """
+    Ajoute risk_score et flags aux chaînes (règles « chains »), en une passe vectorisée.
+
+    Args:
+        chains_df: DataFrame des chaînes (colonnes CHAIN_METRICS)
+        risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+
+    Returns:
+        DataFrame (colonnes CHAIN_COLUMNS)
+    """
+    return score_cases(chains_df, 'chains', risk_rules)[CHAIN_COLUMNS].astype(CHAIN_PATH_DTYPES)
+
+
+def chain_labels(table):
+    """
+    Libellés des parcours en listes : clients_chain 'A → B → C' et full_chain
+    'CASHIN(20000) → SEND(500) → W2B(500)'. À appliquer aux seules lignes
+    affichées ou exportées ; un tableau sans parcours en listes est renvoyé tel quel.
+
+    Returns:
+        DataFrame (parcours en chaînes de caractères)
+    """
+    columns = [
+        column for column in CHAIN_PATH_DTYPES
+        if column in table.columns and isinstance(table[column].dtype, pd.ArrowDtype)
+    ]
+    if not columns:
+        return table
+    table = table.copy(deep=False)
+    for column in columns:
+        lists = pa.array(table[column])
+        if isinstance(lists, pa.ChunkedArray):
+            lists = lists.combine_chunks()
+        if column == 'full_chain':
+            # Type d'étape selon la position : Cash In en tête, W2B en fin
+            lengths = pc.fill_null(pc.list_value_length(lists), 0).to_numpy()
+            steps = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            last = np.repeat(lengths - 1, lengths)
+            step_type = np.where(steps == 0, CASHIN_STEP, np.where(steps == last, W2B_STEP, SEND_STEP))
+            # Montants arrondis comme '%.0f' (demi vers le pair)
+            amounts = pc.round(pc.list_flatten(lists), round_mode='half_to_even').cast(pa.int64()).cast(pa.string())
+            tokens = pc.binary_join_element_wise(_STEP_LABELS.take(pa.array(step_type)), '(', amounts, ')', '')
+            offsets = np.concatenate(([0], np.cumsum(lengths)))
+            lists = pa.ListArray.from_arrays(pa.array(offsets, type=pa.int32()), tokens, mask=lists.is_null())
+        table[column] = pc.binary_join(lists, CHAIN_SEPARATOR).to_numpy(zero_copy_only=False)
+    return table
+
+
+# Énumération paresseuse : Cash In explorés par lot, chaînes évaluées ensemble
+CASHIN_BATCH_SIZE = 1_000
+CHAIN_BATCH_SIZE = 20_000
+
+
+def _day_parts(cashin_all, send_all, w2b_all, max_depth, max_hop_delay, by_day, budget, pruned, batch_size):
+    """Colonnes brutes des chaînes, par lot de Cash In, jour après jour."""
+    explored = 0
+    if not by_day:
+        # Transferts de toute la période ; chaînes datées du jour de leur Cash In
+        if not (cashin_all.empty or send_all.empty or w2b_all.empty):
+            send_index = TransferIndex(send_all)
+            w2b_index = TransferIndex(w2b_all)
+            for day in cashin_all['DATE'].unique():
+                yield from iter_chain_paths(
+                    cashin_all[cashin_all['DATE'] == day], send_index, w2b_index, max_depth, max_hop_delay,
+                    budget, pruned, batch_size
+                )
+            explored = len(cashin_all)
+        count('cashins_explored', explored)
+        return
+
+    for day in cashin_all['DATE'].unique():
+        ci_day = cashin_all[cashin_all['DATE'] == day]
+        send_day = send_all[send_all['DATE'] == day]
+        w2b_day = w2b_all[w2b_all['DATE'] == day]
+
+        if ci_day.empty or send_day.empty or w2b_day.empty:
+            continue
+        explored += len(ci_day)
+
+        yield from iter_chain_paths(
+            ci_day, TransferIndex(send_day), TransferIndex(w2b_day), max_depth, max_hop_delay, budget, pruned,
+            batch_size
+        )
+
+    count('cashins_explored', explored)
+
+
+def iter_money_chains(cashin_all, send_all, w2b_all, max_depth=10, max_hop_delay=None, decode=None, by_day=True,
+                      risk_rules=None, budget=None, pruned=None, batch_size=CHAIN_BATCH_SIZE):
+    """
+    Énumère paresseusement les chaînes Cash In → Send Money (N) → W2B, dans
+    l'ordre de découverte : les Cash In sont explorés par lots et les chaînes
+    évaluées dès qu'un lot en compte batch_size, sans attendre la fin de la
+    recherche.
+
+    Args:
+        cashin_all, send_all, w2b_all, max_depth, max_hop_delay, decode, by_day,
+            risk_rules: voir collect_money_chains
+        budget: ChainBudget (max_paths, max_nodes, dedup ; top_k est ignoré ici)
+        pruned: Counter des chemins écartés par motif, complété sur place
+        batch_size: nombre minimal de chaînes par lot (sauf le dernier)
+
+    Yields:
+        DataFrame des chaînes d'un lot (colonnes CHAIN_COLUMNS)
+    """
+    pending, chains = [], 0
+    for part in _day_parts(cashin_all, send_all, w2b_all, max_depth, max_hop_delay, by_day, budget, pruned,
+                           CASHIN_BATCH_SIZE):
+        if len(part['offsets']) == 1:
+            continue
+        pending.append(part)
+        chains += len(part['offsets']) - 1
+        if chains >= batch_size:
+            yield score_chains(ChainSteps.from_parts(pending, decode).metrics(), risk_rules)
+            pending, chains = [], 0
+    if pending:
+        yield score_chains(ChainSteps.from_parts(pending, decode).metrics(), risk_rules)
+
+
+def top_chains(chains_df, top_k, pruned=None):
+    """
+    Garde les top_k chaînes de plus haut score, dans leur ordre d'origine (les
+    ex aequo au score limite sont départagés par cet ordre, comme nlargest).
+
+    Args:
+        chains_df: DataFrame des chaînes (colonnes CHAIN_COLUMNS)
+        top_k: nombre de chaînes conservées, None = toutes
+        pruned: Counter des chemins écartés, complété du motif 'top_k'
+
+    Returns:
+        DataFrame des chaînes conservées (index réinitialisé)
+    """
+    if top_k is None or len(chains_df) <= top_k:
+        return chains_df
+    order = np.argsort(-chains_df['risk_score'].to_numpy(dtype='float64'), kind='stable')
+    _prune(pruned, 'top_k', len(chains_df) - top_k)
+    return chains_df.iloc[np.sort(order[:top_k])].reset_index(drop=True)
+
+
+def collect_money_chains(cashin_all, send_all, w2b_all, max_depth=10, max_hop_delay=None, decode=None,
+                         by_day=True, risk_rules=None, budget=None):
+    """
+    Collecte les chaînes Cash In → Send Money (N) → W2B, jour par jour, dans
+    l'ordre de découverte.
+
+    Args:
+        cashin_all: DataFrame des Cash In
+        send_all: DataFrame des Send Money
+        w2b_all: DataFrame des W2B
+        max_depth: Profondeur maximale de recherche
+        max_hop_delay: Délai maximal (minutes) entre deux étapes, None = illimité
+        decode: fonction vectorisée code → MSISDN si les MSISDN sont encodés
+        by_day: limiter chaque chaîne au jour de son Cash In ; sinon les
+            transferts de toute la période sont indexés et seul max_hop_delay
+            borne la chaîne (fenêtre glissante, y compris après minuit)
+        risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+        budget: ChainBudget ; avec top_k, les chaînes sont évaluées par lots
+            et seules les top_k meilleures sont gardées en mémoire. Les
+            chemins écartés sont comptés (chains_pruned_<motif>) et signalés.
+
+    Returns:
+        DataFrame des chaînes (colonnes CHAIN_COLUMNS), non trié
+    """
+    pruned = Counter()
+    if budget is None or budget.top_k is None:
+        parts = list(_day_parts(cashin_all, send_all, w2b_all, max_depth, max_hop_delay, by_day, budget, pruned,
+                                batch_size=None))
+        chains = _scored_chains(parts, decode, risk_rules)
+    else:
+        chains, steps = None, 0
+        for batch in iter_money_chains(cashin_all, send_all, w2b_all, max_depth, max_hop_delay, decode, by_day,
+                                       risk_rules, budget, pruned):
+            steps += int(batch['nb_send_money'].sum()) + 2 * len(batch)
+            chains = batch if chains is None else top_chains(
+                pd.concat([chains, batch], ignore_index=True), budget.top_k, pruned
+            )
+        chains = top_chains(chains, budget.top_k, pruned) if chains is not None else _scored_chains([], decode,
+                                                                                                     risk_rules)
+        count('chain_steps', steps)
+    report_pruned(pruned)
+    return chains
+
+
+def _scored_chains(parts, decode, risk_rules):
+    steps = ChainSteps.from_parts(parts, decode)
+    count('chain_steps', len(steps.step_type))
+    return score_chains(steps.metrics(), risk_rules)
+
+
+def sort_chains(chains_df):
+    """Trie par nombre de Send Money (les plus longs d'abord) puis par score."""
+    return chains_df.sort_values(['nb_send_money', 'risk_score'], ascending=[False, False])
+
+
+def detect_money_chains(cashin_all, send_all, w2b_all, max_depth=10, max_hop_delay=None, by_day=True,
+                        risk_rules=None, budget=None):
+    """
+    Détecte les chaînes Cash In → Send Money (N) → W2B.
+
+    Returns:
+        DataFrame des chaînes (colonnes CHAIN_COLUMNS), les plus longues d'abord
+    """
+    return sort_chains(collect_money_chains(
+        cashin_all, send_all, w2b_all, max_depth, max_hop_delay, by_day=by_day, risk_rules=risk_rules,
+        budget=budget
+    ))
+
+
+def chains_by_distributor(chains_df):
+    """
+    Analyse des chaînes par distributeur.
+
+    Returns:
+        DataFrame agrégé par distributeur, trié par commission décroissante
+    """
+    return (
+        chains_df.groupby('distributor')
+        .agg(
+            nb_chaines=('nb_send_money', 'count'),
+            longueur_moyenne=('nb_send_money', 'mean'),
+            commission_cashin_totale=('cashin_commission_djf', 'sum'),
+            montant_total_cashin=('cashin_amount', 'sum'),
+            score_moyen=('risk_score', 'mean')
+        )
+        .reset_index()
+        .sort_values('commission_cashin_totale', ascending=False)
+    )
+
+
+def recurrent_clients(chains_df):
+    """
+    Clients apparaissant plus d'une fois dans les chaînes.
+
+    Les clients des parcours (listes Arrow, sans libellés joints) sont codés
+    dans l'ordre de première apparition et comptés par bincount ; les ex
+    aequo gardent cet ordre (comme value_counts).
+
+    Returns:
+        DataFrame (Client, Nb_Apparitions)
+    """
+    clients = pc.list_flatten(pa.array(chains_df['clients_chain'].astype(CHAIN_PATH_DTYPES['clients_chain'])))
+    codes, uniques = pd.factorize(pd.Series(pd.arrays.ArrowExtensionArray(clients)))
+    frequency = np.bincount(codes, minlength=len(uniques))
+    order = np.argsort(-frequency, kind='stable')
+    client_frequency = pd.DataFrame({
+        'Client': np.asarray(uniques, dtype=object)[order],
+        'Nb_Apparitions': frequency[order],
+    })
+    return client_frequency[client_frequency['Nb_Apparitions'] > 1]
@@ -0,0 +1,181 @@
+"""
+Détection circulaire vectorisée : Cash In → Merchant Payment → Cash Out
+
+Le moteur remplace la boucle jour par jour / iterrows() par deux jointures
+ensemblistes :
+    1. une jointure as-of arrière (même jour, même client) pour retrouver le
+       dernier Cash In reçu par le client avant son paiement marchand ;
+    2. une jointure sur (jour, marchand, montant) pour retrouver les Cash Out
+       du marchand de même montant, filtrés sur le temps (après le paiement).
+
+Les montants sont comparés sous forme d'entiers (unités mineures) plutôt que
+par égalité de float32.
+
+Avec des délais maximaux (max_delays), le jour calendaire n'est plus une clé :
+le Cash In doit précéder le paiement d'au plus le premier délai (tolérance de
+la jointure as-of) et le Cash Out suivre le paiement d'au plus le second
+(jointure par fenêtre glissante), y compris après minuit.
+"""
+import numpy as np
+import pandas as pd
+
+from .instrument import count
+from .scheduler import checkpoint
+from .scoring import score_cases
+from .windows import window_join
+
+# Colonnes de sortie (identiques aux enregistrements `suspicious` historiques)
+CIRCULAR_COLUMNS = [
+    'date', 'cashin_from', 'ci_time', 'client', 'merchant', 'mp_time',
+    'mp_reason', 'bco_time', 'bco_reason', 'amount', 'cashout_to',
+    'delay_minutes', 'risk_score', 'flags',
+]
+
+def amount_to_int(amounts):
+    """Convertit des montants (float) en entiers exprimés en unités mineures (x100)."""
+    values = np.asarray(amounts, dtype='float64')
+    return np.rint(values * 100).astype('int64')
+
+
+def detect_circular(mp_all, cashin_all, cashout_all, max_delays=None, risk_rules=None):
+    """
+    Détecte les scénarios circulaires Cash In → Merchant Payment → Cash Out.
+
+    Args:
+        mp_all: DataFrame des paiements marchands
+        cashin_all: DataFrame des Cash In
+        cashout_all: DataFrame des Cash Out
+        max_delays: (délai Cash In → paiement, délai paiement → Cash Out) en
+            minutes, None = même jour ; avec délais, la date du cas est celle du Cash In
+        risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+
+    Returns:
+        DataFrame des cas suspects (colonnes CIRCULAR_COLUMNS)
+    """
+    keys = ['INITATE_DATE', 'DEBIT_MSISDN', 'CREDIT_MSISDN']
+
+    mp = mp_all.dropna(subset=keys)
+    ci = cashin_all.dropna(subset=keys)
+    co = cashout_all.dropna(subset=keys)
+    if mp.empty or ci.empty or co.empty:
+        return pd.DataFrame(columns=CIRCULAR_COLUMNS)
+
+    mp = pd.DataFrame({
+        'date': mp['DATE'].to_numpy(),
+        'day': mp['INITATE_DATE'].dt.normalize().to_numpy(),
+        'client': mp['DEBIT_MSISDN'].to_numpy(),
+        'merchant': mp['CREDIT_MSISDN'].to_numpy(),
+        'mp_time': mp['INITATE_DATE'].to_numpy(),
+        'mp_reason': mp['REASON_NAME'].to_numpy(),
+        'amount': mp['ACTUAL_AMOUNT'].to_numpy(),
+        'amount_key': amount_to_int(mp['ACTUAL_AMOUNT']),
+    }).sort_values('mp_time', kind='stable')
+    mp['mp_order'] = np.arange(len(mp))
+
+    ci = pd.DataFrame({
+        'day': ci['INITATE_DATE'].dt.normalize().to_numpy(),
+        'client': ci['CREDIT_MSISDN'].to_numpy(),
+        'cashin_from': ci['DEBIT_MSISDN'].to_numpy(),
+        'ci_time': ci['INITATE_DATE'].to_numpy(),
+        'ci_date': ci['DATE'].to_numpy(),
+    }).sort_values('ci_time', kind='stable')
+
+    if max_delays is not None:
+        return _windowed_circular(mp, ci, co, max_delays, risk_rules)
+
+    # 1. Dernier Cash In du client strictement avant le paiement (même jour)
+    mp_ci = pd.merge_asof(
+        mp, ci.drop(columns='ci_date'),
+        left_on='mp_time', right_on='ci_time',
+        by=['day', 'client'],
+        direction='backward',
+        allow_exact_matches=False,
+    ).dropna(subset=['ci_time'])
+    count('mp_with_cashin', len(mp_ci))
+    if mp_ci.empty:
+        return pd.DataFrame(columns=CIRCULAR_COLUMNS)
+
+    checkpoint()
+    co = _cashouts(co)
+
+    # 2. Cash Out du marchand, même montant, après le paiement
+    matches = mp_ci.merge(co, on=['day', 'merchant', 'amount_key'], how='inner')
+    count('cashout_join', len(matches))
+    matches = matches[matches['bco_time'] > matches['mp_time']]
+    if matches.empty:
+        return pd.DataFrame(columns=CIRCULAR_COLUMNS)
+    matches = matches.sort_values(['mp_order', 'bco_time'], kind='stable').reset_index(drop=True)
+
+    matches['delay_minutes'] = (matches['bco_time'] - matches['mp_time']).dt.total_seconds() / 60
+    return score_circular(matches, risk_rules)
+
+
+def _cashouts(co):
+    return pd.DataFrame({
+        'day': co['INITATE_DATE'].dt.normalize().to_numpy(),
+        'merchant': co['DEBIT_MSISDN'].to_numpy(),
+        'amount_key': amount_to_int(co['ACTUAL_AMOUNT']),
+        'bco_time': co['INITATE_DATE'].to_numpy(),
+        'bco_reason': co['REASON_NAME'].to_numpy(),
+        'cashout_to': co['CREDIT_MSISDN'].to_numpy(),
+    }).sort_values('bco_time', kind='stable')
+
+
+def _windowed_circular(mp, ci, co, max_delays, risk_rules):
+    """Variante par fenêtres glissantes de detect_circular (clés sans jour)."""
+    cashin_delay, cashout_delay = max_delays
+
+    # 1. Dernier Cash In du client strictement avant le paiement, au plus cashin_delay avant
+    mp_ci = pd.merge_asof(
+        mp.drop(columns='day'), ci.drop(columns='day'),
+        left_on='mp_time', right_on='ci_time',
+        by='client',
+        direction='backward',
+        allow_exact_matches=False,
+        tolerance=pd.Timedelta(minutes=cashin_delay),
+    ).dropna(subset=['ci_time'])
+    count('mp_with_cashin', len(mp_ci))
+    if mp_ci.empty:
+        return pd.DataFrame(columns=CIRCULAR_COLUMNS)
+    mp_ci['date'] = mp_ci['ci_date']
+
+    # 2. Cash Out du marchand, même montant, au plus cashout_delay après le paiement
+    matches = window_join(
+        mp_ci, _cashouts(co).drop(columns='day'),
+        left_on=['merchant', 'amount_key'], right_on=['merchant', 'amount_key'],
+        left_time='mp_time', right_time='bco_time',
+        max_delay=cashout_delay, counter='cashout_join',
+    )
+    if matches.empty:
+        return pd.DataFrame(columns=CIRCULAR_COLUMNS)
+
+    matches['delay_minutes'] = (matches['bco_time'] - matches['mp_time']).dt.total_seconds() / 60
+    return score_circular(matches, risk_rules)
+
+
+def score_circular(matches, risk_rules=None):
+    """
+    Ajoute risk_score et flags aux cas circulaires (règles « circular »).
+
+    Args:
+        matches: DataFrame des cas (colonnes CIRCULAR_COLUMNS sauf risk_score / flags)
+        risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+
+    Returns:
+        DataFrame (colonnes CIRCULAR_COLUMNS)
+    """
+    return score_cases(matches, 'circular', risk_rules)[CIRCULAR_COLUMNS]
+
+
+def summarize_circular(result_df):
+    """
+    Résumé groupé des cas circulaires par (date, marchand).
+
+    Returns:
+        DataFrame (date, merchant, nb_cas, montant_total, score_moyen)
+    """
+    return result_df.groupby(['date', 'merchant']).agg(
+        nb_cas=('amount', 'count'),
+        montant_total=('amount', 'sum'),
+        score_moyen=('risk_score', 'mean')
+    ).reset_index()
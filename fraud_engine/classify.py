@@ -0,0 +1,205 @@
+"""
+Classification des transactions par type (REASON_NAME)
+
+Le nombre de REASON_NAME distincts est minuscule devant le nombre de lignes :
+les motifs sont évalués une seule fois par REASON_NAME distinct, puis le
+résultat est propagé à toutes les lignes en une étape vectorisée. Chaque type
+est représenté par un tableau d'indices dans le DataFrame de base ; le
+sous-ensemble n'est matérialisé qu'au premier accès.
+
+Les règles (motif → type, priorité, exclusivité) sont lues depuis un fichier
+JSON (config/transaction_types.json par défaut, ou FRAUD_TRANSACTION_TYPES).
+"""
+import hashlib
+import json
+import os
+import re
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), 'config', 'transaction_types.json')
+
+# Code de type des transactions non reconnues
+UNCLASSIFIED = -1
+
+
+class ClassificationRule:
+    """Règle motif → type de transaction."""
+
+    def __init__(self, tx_type, pattern, regex=False, exclusive=False):
+        self.tx_type = tx_type
+        self.pattern = pattern
+        self.regex = regex
+        self.exclusive = exclusive
+        self._compiled = re.compile(pattern) if regex else None
+
+    def matches(self, reason):
+        if not isinstance(reason, str):
+            return False
+        if self._compiled is not None:
+            return self._compiled.search(reason) is not None
+        return self.pattern in reason
+
+
+class TransactionClassifier:
+    """Classificateur REASON_NAME → types de transaction, piloté par des règles."""
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules: liste de ClassificationRule, par ordre de priorité décroissante
+        """
+        self.rules = list(rules)
+        self.types = list(dict.fromkeys(rule.tx_type for rule in self.rules))
+        if len(self.types) > 63:
+            raise ValueError("63 types de transaction au plus")
+
+    @classmethod
+    def from_config(cls, config):
+        """Construit le classificateur depuis un dict {"rules": [...]}."""
+        return cls([
+            ClassificationRule(
+                rule['type'], rule['pattern'],
+                regex=rule.get('regex', False), exclusive=rule.get('exclusive', False)
+            )
+            for rule in config['rules']
+        ])
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as handle:
+            return cls.from_config(json.load(handle))
+
+    def metadata(self):
+        """Description sérialisable des règles (métadonnées des stockages et historiques)."""
+        return [
+            {'type': rule.tx_type, 'pattern': rule.pattern, 'regex': rule.regex, 'exclusive': rule.exclusive}
+            for rule in self.rules
+        ]
+
+    def fingerprint(self):
+        """Empreinte des règles (clé de cache des types et des détections)."""
+        payload = json.dumps(self.metadata(), sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def reason_masks(self, reasons):
+        """
+        Masque de types (un bit par type) et type principal de chaque REASON_NAME distinct.
+
+        Args:
+            reasons: valeurs distinctes de REASON_NAME
+
+        Returns:
+            (masques int64, codes de type principal int8)
+        """
+        masks = np.zeros(len(reasons), dtype='int64')
+        primary = np.full(len(reasons), UNCLASSIFIED, dtype='int8')
+        for position, reason in enumerate(reasons):
+            for rule in self.rules:
+                if not rule.matches(reason):
+                    continue
+                code = self.types.index(rule.tx_type)
+                masks[position] |= 1 << code
+                if primary[position] == UNCLASSIFIED:
+                    primary[position] = code
+                if rule.exclusive:
+                    break
+        return masks, primary
+
+    def classify(self, df):
+        """
+        Classe chaque transaction en une seule passe vectorisée.
+
+        Args:
+            df: DataFrame prétraité (voir loader.preprocess)
+
+        Returns:
+            TypedTransactions
+        """
+        reasons = df['REASON_NAME']
+        if isinstance(reasons.dtype, pd.CategoricalDtype):
+            codes, uniques = reasons.cat.codes.to_numpy(), reasons.cat.categories
+        else:
+            codes, uniques = pd.factorize(reasons)
+
+        masks, primary = self.reason_masks(uniques)
+        # Code -1 (REASON_NAME manquant) → dernière case : aucun type
+        row_masks = np.append(masks, 0)[codes]
+        type_codes = np.append(primary, UNCLASSIFIED)[codes]
+        return TypedTransactions(df, self.types, row_masks, type_codes)
+
+
+class TypedTransactions(Mapping):
+    """
+    Sous-ensembles typés d'un DataFrame, sous forme d'indices.
+
+    Se comporte comme un dict type → DataFrame ; chaque sous-ensemble est
+    matérialisé (une seule prise d'indices) au premier accès.
+    """
+
+    def __init__(self, df, types, row_masks, type_codes):
+        self.df = df
+        self.types = list(types)
+        self.row_masks = row_masks
+        self.type_codes = type_codes
+        self._indices = {
+            tx_type: np.flatnonzero(row_masks & (1 << code))
+            for code, tx_type in enumerate(self.types)
+        }
+        self._frames = {}
+
+    def indices(self, tx_type):
+        """Positions des transactions d'un type dans le DataFrame de base."""
+        return self._indices[tx_type]
+
+    def __getitem__(self, tx_type):
+        if tx_type not in self._frames:
+            self._frames[tx_type] = self.df.take(self._indices[tx_type])
+        return self._frames[tx_type]
+
+    def __iter__(self):
+        return iter(self.types)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getstate__(self):
+        # Les sous-ensembles matérialisés se recalculent à partir des indices
+        state = self.__dict__.copy()
+        state['_frames'] = {}
+        return state
+
+
+def load_classifier(path=None):
+    """
+    Charge le classificateur depuis un fichier de règles.
+
+    Args:
+        path: fichier JSON ; défaut FRAUD_TRANSACTION_TYPES ou config/transaction_types.json
+    """
+    return TransactionClassifier.from_file(path or os.environ.get('FRAUD_TRANSACTION_TYPES') or DEFAULT_RULES_PATH)
+
+
+DEFAULT_CLASSIFIER = load_classifier()
+
+# Type de transaction → motif recherché dans REASON_NAME (en minuscules)
+TRANSACTION_TYPES = {rule.tx_type: rule.pattern for rule in DEFAULT_CLASSIFIER.rules}
+
+
+def classify_transactions(df, classifier=None):
+    """
+    Découpe les transactions prétraitées en sous-ensembles par type.
+
+    Une transaction peut appartenir à plusieurs types si son REASON_NAME
+    est reconnu par plusieurs règles non exclusives.
+
+    Args:
+        df: DataFrame prétraité (voir loader.preprocess)
+        classifier: TransactionClassifier, défaut DEFAULT_CLASSIFIER
+
+    Returns:
+        TypedTransactions (dict type → DataFrame, clés des règles)
+    """
+    return (classifier or DEFAULT_CLASSIFIER).classify(df)
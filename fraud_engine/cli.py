@@ -0,0 +1,223 @@
+"""
+Point d'entrée en ligne de commande : détection par lots sur fichiers CSV
+ou sur une table de la base configurée par les variables FRAUD_DB_*
+
+Exemples :
+    python -m fraud_engine transactions_2024-01-*.csv -o resultats/ --format parquet
+    python -m fraud_engine --database --start 2024-01-01 --end 2024-01-31 -o resultats/
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+from .archive import RunArchive, run_params, source_hash
+from .b2w_chain import MAX_CANDIDATES_PER_CLIENT
+from .chains import ChainBudget
+from .classify import load_classifier
+from .database import ConnectionPool, DatabaseSource, connect_from_env, default_table, default_version_column
+from .export import OUTPUT_FORMATS, write_results
+from .ingest import DEFAULT_CHUNKSIZE
+from .instrument import RunProfile
+from .pipeline import BACKENDS, run_detection
+from .rings import RING_HOP_DELAY, RING_MAX_LENGTH
+from .scoring import load_risk_rules
+from .velocity import VELOCITY_BURST_RATIO, VELOCITY_WINDOWS, parse_velocity_window
+from .windows import SCENARIO_HOPS, parse_window
+
+# Mesures par étape écrites avec les résultats
+PERFORMANCE_FILE = 'performance.json'
+
+
+def _window_argument(text):
+    try:
+        return parse_window(text)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc)) from None
+
+
+def _velocity_window_argument(text):
+    try:
+        return parse_velocity_window(text)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc)) from None
+
+
+def _date_argument(text):
+    try:
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"date invalide (AAAA-MM-JJ attendu) : {text}") from None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='fraud_engine',
+        description="Détection des scénarios de fraude sur des fichiers CSV de transactions."
+    )
+    parser.add_argument('inputs', nargs='*', help="Fichiers CSV de transactions")
+    parser.add_argument('--database', action='store_true',
+                        help="Lire les transactions dans la base configurée par FRAUD_DB_SQLITE ou "
+                             "FRAUD_DB_HOST/PORT/USER/PASSWORD/NAME (filtres de dates et de types "
+                             "appliqués côté serveur)")
+    parser.add_argument('--db-table', default=None,
+                        help="Table des transactions (défaut: FRAUD_DB_TABLE ou transactions)")
+    parser.add_argument('--start', type=_date_argument, default=None, help="Base de données : premier jour lu")
+    parser.add_argument('--end', type=_date_argument, default=None, help="Base de données : dernier jour lu (inclus)")
+    parser.add_argument('-o', '--output-dir', default='resultats', help="Dossier de sortie")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='parquet', help="Format des tableaux écrits")
+    parser.add_argument('--backend', choices=BACKENDS, default='pandas',
+                        help="Moteur d'exécution : pandas (en mémoire) ou duckdb (SQL hors mémoire, "
+                             "multi-thread selon --workers, base dans --store-dir si fourni)")
+    parser.add_argument('--memory-limit', default=None,
+                        help="Backend duckdb : mémoire maximale avant débordement sur disque (ex. 4GB)")
+    parser.add_argument('--per-file', action='store_true',
+                        help="Traiter chaque fichier séparément (un sous-dossier par fichier)")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Lecture par blocs et détection jour par jour (mémoire bornée)")
+    parser.add_argument('--store-dir', default=None,
+                        help="Dossier du stockage colonnaire en mode streaming, réutilisé tant que les "
+                             "fichiers sources sont inchangés (défaut: <sortie>/_store)")
+    parser.add_argument('--archive', default=None,
+                        help="Archive SQLite des exécutions (défaut: FRAUD_ARCHIVE_DB) : chaque exécution y est "
+                             "ajoutée, une source déjà analysée avec les mêmes paramètres y est relue")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help="Nombre de lignes lues par bloc en mode streaming")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Nombre de processus pour les détecteurs journaliers (0 = nombre de cœurs)")
+    parser.add_argument('--types-config', default=None,
+                        help="Fichier JSON des règles de classification REASON_NAME → type "
+                             "(défaut: FRAUD_TRANSACTION_TYPES ou fraud_engine/config/transaction_types.json)")
+    parser.add_argument('--risk-rules', default=None,
+                        help="Fichier JSON des règles de score de risque "
+                             "(défaut: FRAUD_RISK_RULES ou fraud_engine/config/risk_rules.json)")
+    parser.add_argument('--profile-stage', action='append', default=[], metavar='ETAPE',
+                        help="Passer une étape au profileur cProfile (ex. chains), répétable")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Mesurer le pic d'allocations Python de chaque étape (plus lent)")
+    parser.add_argument('--max-depth', type=int, default=10, help="Profondeur maximale des chaînes")
+    parser.add_argument('--max-hop-delay', type=float, default=None,
+                        help="Délai maximal (minutes) entre deux étapes d'une chaîne")
+    parser.add_argument('--window', action='append', type=_window_argument, default=[],
+                        metavar='SCENARIO=MIN[,MIN]',
+                        help="Fenêtre glissante d'un scénario : délai maximal par étape, y compris "
+                             "après minuit (ex. cashin_w2b=120, b2w_send_w2b=60,60), répétable. "
+                             f"Scénarios : {', '.join(SCENARIO_HOPS)}")
+    parser.add_argument('--amount-tolerance', type=float, default=None,
+                        help="B2W → Send Money → W2B : écart relatif maximal entre le montant d'une étape et "
+                             "celui de la précédente (ex. 0.1 = 10 %%)")
+    parser.add_argument('--max-candidates', type=int, default=MAX_CANDIDATES_PER_CLIENT,
+                        help="B2W → Send Money → W2B : nombre maximal de candidats par client et par étape "
+                             "(avertissement si atteint, 0 = illimité)")
+    parser.add_argument('--ring-max-length', type=int, default=RING_MAX_LENGTH,
+                        help="Anneaux de transferts : nombre maximal de portefeuilles")
+    parser.add_argument('--ring-hop-delay', type=float, default=RING_HOP_DELAY,
+                        help="Anneaux de transferts : délai maximal (minutes) entre deux transferts "
+                             "(remplacé par --window rings=MIN)")
+    parser.add_argument('--ring-payments', action='store_true',
+                        help="Anneaux de transferts : ajouter les paiements marchands au graphe")
+    parser.add_argument('--velocity-window', action='append', type=_velocity_window_argument, default=[],
+                        metavar='MIN=NOMBRE',
+                        help="Vélocité : durée d'une fenêtre glissante (minutes) et nombre de transactions "
+                             "d'un flux de portefeuille à partir duquel elle est une rafale, répétable (défaut : "
+                             + ', '.join(f"{minutes}={threshold}" for minutes, threshold in VELOCITY_WINDOWS.items())
+                             + ")")
+    parser.add_argument('--velocity-ratio', type=float, default=VELOCITY_BURST_RATIO,
+                        help="Vélocité : rapport du pic du jour à l'habitude du portefeuille à partir duquel "
+                             "il est une rafale (0 = seuils seulement)")
+    parser.add_argument('--chain-top-k', type=int, default=0,
+                        help="Chaînes : ne garder que les N meilleurs scores, évalués par lots (0 = toutes)")
+    parser.add_argument('--chain-max-paths', type=int, default=0,
+                        help="Chaînes : nombre maximal de chaînes par Cash In (0 = illimité)")
+    parser.add_argument('--chain-max-nodes', type=int, default=0,
+                        help="Chaînes : nombre maximal de Send Money explorés par Cash In (0 = illimité)")
+    parser.add_argument('--chain-dedup', action='store_true',
+                        help="Chaînes : une seule chaîne par Cash In et suite de clients")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.database == bool(args.inputs):
+        parser.error("indiquer des fichiers CSV ou --database (mais pas les deux)")
+    params = {
+        'max_depth': args.max_depth,
+        'max_hop_delay': args.max_hop_delay,
+        'windows': dict(args.window),
+        'amount_tolerance': args.amount_tolerance,
+        'max_candidates': args.max_candidates or None,
+        'chain_budget': ChainBudget(
+            top_k=args.chain_top_k or None, max_paths=args.chain_max_paths or None,
+            max_nodes=args.chain_max_nodes or None, dedup=args.chain_dedup
+        ),
+        'ring_length': args.ring_max_length,
+        'ring_hop_delay': args.ring_hop_delay,
+        'ring_payments': args.ring_payments,
+        'velocity_windows': dict(args.velocity_window) or VELOCITY_WINDOWS,
+        'velocity_ratio': args.velocity_ratio or None,
+        'classifier': load_classifier(args.types_config),
+        'risk_rules': load_risk_rules(args.risk_rules),
+        'workers': args.workers,
+    }
+
+    if args.database:
+        connect = connect_from_env()
+        if connect is None:
+            parser.error("--database : aucune base configurée (FRAUD_DB_SQLITE ou FRAUD_DB_HOST)")
+        source = DatabaseSource(
+            ConnectionPool(connect, size=1), args.db_table or default_table(), start=args.start, end=args.end,
+            classifier=params['classifier'], version_column=default_version_column(),
+        )
+        batches = [([source], args.output_dir)]
+    elif args.per_file:
+        batches = [
+            ([path], os.path.join(args.output_dir, os.path.splitext(os.path.basename(path))[0]))
+            for path in args.inputs
+        ]
+    else:
+        batches = [(args.inputs, args.output_dir)]
+
+    archive_path = args.archive or os.environ.get('FRAUD_ARCHIVE_DB')
+    archive = RunArchive(archive_path) if archive_path else None
+
+    for inputs, output_dir in batches:
+        start = time.perf_counter()
+        file_hash = source_hash(*inputs) if archive else None
+        run_id = archive.find(file_hash, run_params(**params)) if archive else None
+        with RunProfile(profile_stages=args.profile_stage, trace_memory=args.trace_memory) as profile:
+            if run_id is not None:
+                with profile.stage('archive') as record:
+                    results = archive.load(run_id)
+                    record['rows_out'] = sum(len(table) for table in results.values())
+            elif args.backend == 'duckdb':
+                results = run_detection(
+                    *inputs, backend='duckdb', store_dir=args.store_dir, memory_limit=args.memory_limit, **params
+                )
+            elif args.streaming or args.workers != 1:
+                store_dir = args.store_dir or os.path.join(output_dir, '_store')
+                results = run_detection(
+                    *inputs, streaming=True, store_dir=store_dir, chunksize=args.chunksize, **params
+                )
+            else:
+                results = run_detection(*inputs, **params)
+        write_results(results, output_dir, args.format)
+        profile.to_json(os.path.join(output_dir, PERFORMANCE_FILE))
+        elapsed = time.perf_counter() - start
+        print(f"✅ {', '.join(map(str, inputs))} → {output_dir} ({elapsed:.1f} s)")
+        if run_id is not None:
+            print(f"   ♻️ déjà analysé : résultats de l'exécution {run_id} relus dans l'archive")
+        elif archive:
+            run_id = archive.record(results, file_hash, run_params(**params), source=', '.join(map(str, inputs)))
+            print(f"   🗂️ archivé : exécution {run_id}")
+        for name, table in results.items():
+            print(f"   {name}: {len(table)} lignes")
+        for stage in profile.summary().itertuples(index=False):
+            print(f"   ⏱️ {stage.stage}: {stage.wall_s:.2f} s")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
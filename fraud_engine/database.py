@@ -0,0 +1,358 @@
+"""
+Source de transactions lue dans une base de données (DB-API)
+
+Les transactions sont lues avec un curseur en flux (curseur non bufferisé de
+mysql.connector, curseur natif de sqlite3, ou tout curseur côté serveur
+fourni par `cursor_factory`) et récupérées par lots avec fetchmany. Chaque lot
+est converti en colonnes typées comme une lecture CSV (loader.CSV_DTYPES) et
+suit ensuite le même prétraitement que le chargeur CSV : loader.read_transactions
+pour le chargement en mémoire, ingest.iter_chunks pour le stockage colonnaire
+et le backend DuckDB.
+
+La plage de dates et les motifs REASON_NAME des types de transactions utiles
+aux détecteurs sont poussés dans la clause WHERE : seules ces transactions
+transitent par le réseau. Les connexions sont réutilisées via un pool
+(ConnectionPool), partagé entre les sessions Streamlit.
+
+Configuration par variables d'environnement (voir connect_from_env) :
+    FRAUD_DB_SQLITE   fichier SQLite (base locale de test)
+    FRAUD_DB_HOST, FRAUD_DB_PORT, FRAUD_DB_USER, FRAUD_DB_PASSWORD, FRAUD_DB_NAME   MySQL
+    FRAUD_DB_TABLE    table des transactions (défaut: transactions)
+    FRAUD_DB_VERSION_COLUMN   colonne de date de mise à jour des lignes (optionnelle, voir fingerprint)
+"""
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from .classify import DEFAULT_CLASSIFIER
+from .loader import CSV_DTYPES, TRANSACTION_COLUMNS
+
+DEFAULT_TABLE = 'transactions'
+
+# Lignes récupérées par appel à fetchmany
+DEFAULT_BATCH_SIZE = 50_000
+
+# Connexions ouvertes simultanément au plus
+DEFAULT_POOL_SIZE = 4
+
+# Durée de validité (secondes) de l'empreinte d'une source, partagée par les
+# sources d'un même pool (reruns et sessions Streamlit)
+DEFAULT_FINGERPRINT_TTL = 300
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_$]*(\.[A-Za-z_][A-Za-z0-9_$]*)?$')
+
+# Caractère d'échappement des motifs LIKE (accepté par MySQL, SQLite et PostgreSQL)
+_LIKE_ESCAPE = '!'
+
+# pool → {(requête, paramètres) → (échéance, empreinte)}
+_fingerprints = weakref.WeakKeyDictionary()
+_fingerprints_lock = threading.Lock()
+
+
+def _identifier(name):
+    """Nom de table ou de colonne validé (jamais passé en paramètre DB-API)."""
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Identifiant SQL invalide : {name!r}")
+    return name
+
+
+def _paramstyle(connection):
+    """paramstyle DB-API du pilote d'une connexion (module de la classe, puis ses parents)."""
+    module = type(connection).__module__
+    while module:
+        paramstyle = getattr(sys.modules.get(module), 'paramstyle', None)
+        if paramstyle:
+            return paramstyle
+        module = module.rpartition('.')[0]
+    raise ValueError(f"paramstyle inconnu pour {type(connection).__name__}")
+
+
+def _placeholders(paramstyle, count):
+    """Marqueurs de paramètres positionnels pour un paramstyle DB-API."""
+    if paramstyle == 'qmark':
+        return ['?'] * count
+    if paramstyle in ('format', 'pyformat'):
+        return ['%s'] * count
+    if paramstyle == 'numeric':
+        return [f':{position}' for position in range(1, count + 1)]
+    raise ValueError(f"paramstyle non pris en charge : {paramstyle}")
+
+
+def _like_pattern(pattern):
+    """Motif LIKE « contient » équivalent à `pattern in reason`."""
+    escaped = re.sub(f'([{_LIKE_ESCAPE}%_])', rf'{_LIKE_ESCAPE}\1', pattern)
+    return f'%{escaped}%'
+
+
+def _empty_batch():
+    return pd.DataFrame({
+        'INITATE_DATE': pd.Series(dtype='datetime64[us]'),
+        **{column: pd.Series(dtype=dtype) for column, dtype in CSV_DTYPES.items()},
+    })[TRANSACTION_COLUMNS]
+
+
+def _typed_batch(rows):
+    """Lot de lignes DB-API (dans l'ordre TRANSACTION_COLUMNS) → DataFrame typé comme read_csv."""
+    values = np.array(rows, dtype=object)
+    columns = dict(zip(TRANSACTION_COLUMNS, values.T))
+    return pd.DataFrame({
+        'INITATE_DATE': pd.to_datetime(columns['INITATE_DATE'], format='mixed'),
+        'DEBIT_MSISDN': pd.Series(columns['DEBIT_MSISDN']).astype(CSV_DTYPES['DEBIT_MSISDN']),
+        'CREDIT_MSISDN': pd.Series(columns['CREDIT_MSISDN']).astype(CSV_DTYPES['CREDIT_MSISDN']),
+        'REASON_NAME': pd.Series(columns['REASON_NAME']).astype(CSV_DTYPES['REASON_NAME']),
+        'ACTUAL_AMOUNT': pd.to_numeric(pd.Series(columns['ACTUAL_AMOUNT'])).astype(CSV_DTYPES['ACTUAL_AMOUNT']),
+    })
+
+
+def _close_quietly(connection):
+    with contextlib.suppress(Exception):
+        connection.close()
+
+
+class ConnectionPool:
+    """
+    Pool de connexions DB-API, sûr entre threads (sessions Streamlit).
+
+    Une connexion rendue au pool est remise à zéro (rollback, qui termine la
+    transaction de lecture) ; une connexion dont l'utilisation a échoué est
+    fermée plutôt que réutilisée.
+    """
+
+    def __init__(self, connect, size=DEFAULT_POOL_SIZE):
+        """
+        Args:
+            connect: fonction sans argument ouvrant une connexion DB-API
+            size: nombre maximal de connexions ouvertes simultanément
+        """
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _acquire(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            # mysql.connector : connexion coupée par le serveur (wait_timeout)
+            if getattr(connection, 'is_connected', lambda: True)():
+                return connection
+            _close_quietly(connection)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Connexion empruntée au pool le temps du bloc `with`."""
+        with self._slots:
+            connection = self._acquire()
+            try:
+                yield connection
+                connection.rollback()
+            except BaseException:
+                _close_quietly(connection)
+                raise
+            self._idle.put(connection)
+
+    def close(self):
+        """Ferme les connexions inactives."""
+        while True:
+            try:
+                _close_quietly(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+class DatabaseSource:
+    """
+    Transactions d'une table SQL, filtrées côté serveur.
+
+    S'utilise partout où un fichier CSV est accepté (load_transactions,
+    run_detection, build_store, content_hash).
+    """
+
+    def __init__(self, pool, table=DEFAULT_TABLE, start=None, end=None, tx_types=None, classifier=None,
+                 columns=None, batch_size=DEFAULT_BATCH_SIZE, cursor_factory=None, version_column=None,
+                 fingerprint_ttl=DEFAULT_FINGERPRINT_TTL):
+        """
+        Args:
+            pool: ConnectionPool
+            table: table (ou vue) des transactions
+            start: premier jour lu (date), None = sans borne
+            end: dernier jour lu inclus (date), None = sans borne
+            tx_types: types de transactions lus, None = tous les types du classificateur
+            classifier: TransactionClassifier dont les motifs sont poussés dans le WHERE
+            columns: dict colonne attendue (TRANSACTION_COLUMNS) → colonne de la table
+            batch_size: lignes récupérées par fetchmany
+            cursor_factory: fonction connexion → curseur côté serveur, None = connection.cursor()
+            version_column: colonne de date de mise à jour des lignes, incluse dans
+                l'empreinte (None = aucune)
+            fingerprint_ttl: durée de validité de l'empreinte (secondes, 0 = recalculée à chaque appel)
+        """
+        self.pool = pool
+        self.table = _identifier(table)
+        self.start = start
+        self.end = end
+        self.classifier = classifier or DEFAULT_CLASSIFIER
+        self.tx_types = list(tx_types) if tx_types is not None else list(self.classifier.types)
+        self.columns = {column: _identifier((columns or {}).get(column, column)) for column in TRANSACTION_COLUMNS}
+        self.batch_size = batch_size
+        self.cursor_factory = cursor_factory
+        self.version_column = _identifier(version_column) if version_column else None
+        self.fingerprint_ttl = fingerprint_ttl
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.table}, {self.start} → {self.end}, types={self.tx_types})"
+
+    def reason_patterns(self):
+        """
+        Motifs REASON_NAME poussés dans le WHERE, None si le filtre ne peut pas
+        être exprimé en LIKE (règle regex ou motif non ASCII, la casse n'étant
+        alors pas repliée de la même façon par toutes les bases).
+        """
+        rules = [rule for rule in self.classifier.rules if rule.tx_type in self.tx_types]
+        if any(rule.regex or not rule.pattern.isascii() for rule in rules):
+            return None
+        return list(dict.fromkeys(rule.pattern for rule in rules))
+
+    def where(self, paramstyle):
+        """
+        Clause WHERE de la plage de dates et des types de transactions.
+
+        Returns:
+            (clause SQL, éventuellement vide, paramètres positionnels)
+        """
+        conditions, params = [], []
+        date_column = self.columns['INITATE_DATE']
+        if self.start is not None:
+            conditions.append(f"{date_column} >= {{}}")
+            params.append(f"{self.start:%Y-%m-%d} 00:00:00")
+        if self.end is not None:
+            conditions.append(f"{date_column} < {{}}")
+            params.append(f"{self.end + datetime.timedelta(days=1):%Y-%m-%d} 00:00:00")
+        patterns = self.reason_patterns()
+        if patterns is not None:
+            reason = f"LOWER({self.columns['REASON_NAME']}) LIKE {{}} ESCAPE '{_LIKE_ESCAPE}'"
+            conditions.append('(' + ' OR '.join([reason] * len(patterns)) + ')' if patterns else '1 = 0')
+            params.extend(_like_pattern(pattern) for pattern in patterns)
+        if not conditions:
+            return '', params
+        return ' WHERE ' + ' AND '.join(conditions).format(*_placeholders(paramstyle, len(params))), params
+
+    def query(self, paramstyle):
+        """Requête SELECT des colonnes TRANSACTION_COLUMNS et ses paramètres."""
+        where, params = self.where(paramstyle)
+        selected = ', '.join(f"{source} AS {column}" for column, source in self.columns.items())
+        return f"SELECT {selected} FROM {self.table}{where}", params
+
+    def iter_batches(self, batch_size=None):
+        """
+        Lit les transactions en flux, par lots de `batch_size` lignes.
+
+        Yields:
+            DataFrame brut typé comme loader.read_transactions
+        """
+        with self.pool.connection() as connection:
+            sql, params = self.query(_paramstyle(connection))
+            cursor = self.cursor_factory(connection) if self.cursor_factory else connection.cursor()
+            try:
+                cursor.execute(sql, params)
+                while rows := cursor.fetchmany(batch_size or self.batch_size):
+                    yield _typed_batch(rows)
+            finally:
+                cursor.close()
+
+    def read_frame(self):
+        """Toutes les transactions filtrées, en un DataFrame brut."""
+        frames = list(self.iter_batches())
+        if not frames:
+            return _empty_batch()
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    def fingerprint(self):
+        """
+        Empreinte de la requête et du contenu des données filtrées : par
+        REASON_NAME, nombre de lignes, somme des montants, dates minimale et
+        maximale, et date de mise à jour maximale si `version_column` est
+        configurée. Des transactions ajoutées ou corrigées (montant, date, type)
+        changent l'empreinte ; une correction qui ne touche que les MSISDN
+        n'est détectée que par `version_column`.
+
+        L'empreinte est conservée `fingerprint_ttl` secondes pour une même
+        requête sur le même pool : les reruns Streamlit ne relancent pas
+        l'agrégation sur toute la plage.
+        """
+        with self.pool.connection() as connection:
+            paramstyle = _paramstyle(connection)
+            sql, params = self.query(paramstyle)
+            key = (sql, tuple(params), self.version_column)
+            with _fingerprints_lock:
+                cached = _fingerprints.setdefault(self.pool, {}).get(key)
+            if self.fingerprint_ttl and cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+
+            where, _ = self.where(paramstyle)
+            reason, amount, date = (self.columns[column] for column in ('REASON_NAME', 'ACTUAL_AMOUNT', 'INITATE_DATE'))
+            aggregates = ["COUNT(*)", f"SUM({amount})", f"MIN({date})", f"MAX({date})"]
+            if self.version_column:
+                aggregates.append(f"MAX({self.version_column})")
+            cursor = connection.cursor()
+            try:
+                cursor.execute(
+                    f"SELECT {reason}, {', '.join(aggregates)} FROM {self.table}{where} GROUP BY {reason}", params
+                )
+                state = sorted([str(value) for value in row] for row in cursor.fetchall())
+            finally:
+                cursor.close()
+        payload = json.dumps([sql, params, self.version_column, state])
+        fingerprint = hashlib.sha256(payload.encode()).hexdigest()
+        if self.fingerprint_ttl:
+            with _fingerprints_lock:
+                _fingerprints.setdefault(self.pool, {})[key] = (time.monotonic() + self.fingerprint_ttl, fingerprint)
+        return fingerprint
+
+
+def connect_from_env(environ=None):
+    """
+    Fonction de connexion décrite par les variables d'environnement FRAUD_DB_*.
+
+    Returns:
+        fonction sans argument ouvrant une connexion, None si aucune base n'est configurée
+    """
+    environ = os.environ if environ is None else environ
+    if environ.get('FRAUD_DB_SQLITE'):
+        import sqlite3
+
+        path = environ['FRAUD_DB_SQLITE']
+        return lambda: sqlite3.connect(path, check_same_thread=False)
+    if environ.get('FRAUD_DB_HOST'):
+        import mysql.connector
+
+        settings = {
+            'host': environ['FRAUD_DB_HOST'],
+            'port': int(environ.get('FRAUD_DB_PORT', 3306)),
+            'user': environ.get('FRAUD_DB_USER'),
+            'password': environ.get('FRAUD_DB_PASSWORD'),
+            'database': environ.get('FRAUD_DB_NAME'),
+        }
+        return lambda: mysql.connector.connect(**settings)
+    return None
+
+
+def default_table(environ=None):
+    """Table des transactions (FRAUD_DB_TABLE ou DEFAULT_TABLE)."""
+    return (os.environ if environ is None else environ).get('FRAUD_DB_TABLE') or DEFAULT_TABLE
+
+
+def default_version_column(environ=None):
+    """Colonne de date de mise à jour des lignes (FRAUD_DB_VERSION_COLUMN), None si non configurée."""
+    return (os.environ if environ is None else environ).get('FRAUD_DB_VERSION_COLUMN') or None
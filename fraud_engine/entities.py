@@ -0,0 +1,253 @@
+"""
+Index des entités : toutes les détections d'un MSISDN, tous détecteurs confondus
+
+Chaque tableau de détection (répétitions, circulaire, Cash In → W2B, chaînes,
+B2W → Send Money → W2B, anneaux, rafales de vélocité) est déplié une fois en appartenances
+(MSISDN, tableau, ligne, rôle, score de la détection). Les appartenances sont
+triées par entité, comme les lignes d'une matrice CSR : les détections d'un
+MSISDN forment la plage [offsets[code], offsets[code + 1]), trouvée en O(1)
+par table de hachage (pd.Index) puis découpage.
+
+Le score consolidé de chaque entité est calculé sur des agrégats vectorisés
+(reduceat sur les plages, scénarios et rôles en masques de bits) notés par
+les règles « entities » de config/risk_rules.json.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .scoring import score_cases
+
+# Rôles d'une entité dans une détection (indice = bit du masque des rôles)
+ENTITY_ROLES = ['distributor', 'client', 'merchant', 'bank', 'intermediary']
+
+# Séparateur des MSISDN dans les colonnes de parcours jointes (wallets) ;
+# clients_chain est une colonne de listes Arrow (voir chains.CHAIN_PATH_DTYPES)
+PATH_SEPARATOR = ' → '
+
+# Tableau → (colonne, rôle) ; un rôle (premier, suivants) désigne une colonne de
+# parcours dont le premier MSISDN et les suivants ont des rôles différents
+ENTITY_SOURCES = {
+    'repeat_mp': [('DEBIT_MSISDN', 'client'), ('CREDIT_MSISDN', 'merchant')],
+    'redeem': [('CREDIT_MSISDN', 'client')],
+    'repeat_cashin': [('DEBIT_MSISDN', 'distributor'), ('CREDIT_MSISDN', 'client')],
+    'repeat_w2b': [('DEBIT_MSISDN', 'client'), ('CREDIT_MSISDN', 'bank')],
+    'circular': [('cashin_from', 'distributor'), ('client', 'client'), ('merchant', 'merchant'),
+                 ('cashout_to', 'distributor')],
+    'cashin_w2b': [('Distributeur', 'distributor'), ('client', 'client'), ('Banque', 'bank')],
+    'chains': [('distributor', 'distributor'), ('clients_chain', ('client', 'intermediary')), ('w2b_bank', 'bank')],
+    'b2w_send_w2b': [('Source Bank', 'bank'), ('client_A', 'client'), ('client_B', 'intermediary'),
+                     ('Destination Bank', 'bank')],
+    # Le premier portefeuille, répété en fin d'anneau, n'est compté qu'une fois
+    'rings': [('wallets', ('intermediary', 'intermediary'))],
+    'velocity': [('msisdn', 'client')],
+}
+
+ENTITY_SCENARIOS = list(ENTITY_SOURCES)
+
+ENTITY_COLUMNS = [
+    'msisdn', 'nb_detections', 'nb_scenarios', 'scenarios', 'nb_roles', 'roles',
+    'max_score', 'total_score', 'risk_score', 'flags',
+]
+
+MEMBERSHIP_COLUMNS = ['scenario', 'row', 'role', 'score']
+
+
+def _column_members(table, column, role):
+    """(MSISDN, ligne, code du rôle) d'une colonne d'un tableau de détection."""
+    values = table[column]
+    rows = np.arange(len(table))
+    if isinstance(role, str):
+        present = values.notna().to_numpy()
+        msisdns = values[present].astype(str).to_numpy(dtype=object)
+        return msisdns, rows[present], np.full(len(msisdns), ENTITY_ROLES.index(role), dtype='int8')
+
+    # Colonne de parcours : un MSISDN par étape ; les listes sont aplaties et les
+    # parcours joints par le séparateur découpés en une seule fois (une chaîne
+    # vide donne un MSISDN vide)
+    first_role, other_role = role
+    if isinstance(values.dtype, pd.ArrowDtype):
+        lists = pa.array(values)
+        lengths = pc.fill_null(pc.list_value_length(lists), 0).to_numpy().astype('int64')
+        msisdns = pc.list_flatten(lists).to_numpy(zero_copy_only=False).astype(object)
+    else:
+        paths = values.fillna('').astype(str).to_numpy(dtype=object).tolist()
+        if not paths:
+            return np.array([], dtype=object), rows, np.array([], dtype='int8')
+        lengths = np.fromiter((path.count(PATH_SEPARATOR) + 1 for path in paths), dtype='int64', count=len(paths))
+        msisdns = np.array(PATH_SEPARATOR.join(paths).split(PATH_SEPARATOR), dtype=object)
+    steps = np.arange(len(msisdns)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    roles = np.where(steps == 0, ENTITY_ROLES.index(first_role), ENTITY_ROLES.index(other_role)).astype('int8')
+    present = msisdns != ''
+    return msisdns[present], np.repeat(rows, lengths)[present], roles[present]
+
+
+def _mask_labels(masks, labels):
+    """Libellés joints (« a, b ») des bits de chaque masque, construits une fois par masque distinct."""
+    uniques, inverse = np.unique(masks, return_inverse=True)
+    texts = np.array([
+        ', '.join(label for bit, label in enumerate(labels) if mask >> bit & 1) for mask in uniques
+    ], dtype=object)
+    return texts[inverse.reshape(len(masks))]
+
+
+def _bit_counts(masks, labels):
+    """Nombre de bits de chaque masque (table des 2^len(labels) masques possibles)."""
+    return np.array([bin(mask).count('1') for mask in range(1 << len(labels))], dtype='int64')[masks]
+
+
+class EntityIndex:
+    """Index MSISDN → détections de tous les détecteurs, avec score consolidé par entité."""
+
+    def __init__(self, tables, index, offsets, scenarios, rows, roles, scores, entities, positions):
+        """
+        Args:
+            tables: dict tableau → DataFrame indexé
+            index: pd.Index des MSISDN (position = code de l'entité)
+            offsets: bornes des appartenances de chaque entité (longueur len(index) + 1)
+            scenarios, rows, roles, scores: appartenances triées par entité
+                (code du tableau dans ENTITY_SCENARIOS, ligne, code du rôle, score)
+            entities: DataFrame des entités (colonnes ENTITY_COLUMNS), par score décroissant
+            positions: ligne de chaque entité (par code) dans entities
+        """
+        self.tables = tables
+        self._index = index
+        self._offsets = offsets
+        self._scenarios = scenarios
+        self._rows = rows
+        self._roles = roles
+        self._scores = scores
+        self.entities = entities
+        self._positions = positions
+
+    @classmethod
+    def from_results(cls, results, risk_rules=None):
+        """
+        Construit l'index à partir des tableaux de détection d'une exécution.
+
+        Args:
+            results: dict nom de résultat → DataFrame (tableaux de ENTITY_SOURCES
+                présents, les autres sont ignorés)
+            risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+
+        Returns:
+            EntityIndex
+        """
+        tables = {name: results[name] for name in ENTITY_SCENARIOS if name in results}
+        parts = []
+        for name, table in tables.items():
+            scores = (
+                table['risk_score'].to_numpy(dtype='int64') if 'risk_score' in table
+                else np.zeros(len(table), dtype='int64')
+            )
+            for column, role in ENTITY_SOURCES[name]:
+                msisdns, rows, roles = _column_members(table, column, role)
+                parts.append((msisdns, np.full(len(rows), ENTITY_SCENARIOS.index(name), dtype='int8'),
+                              rows, roles, scores[rows]))
+        if not parts:
+            parts = [(np.array([], dtype=object), np.array([], dtype='int8'), np.array([], dtype='int64'),
+                      np.array([], dtype='int8'), np.array([], dtype='int64'))]
+        msisdns, scenarios, rows, roles, scores = (np.concatenate(column) for column in zip(*parts))
+
+        # Appartenances triées par (entité, tableau, ligne, rôle), doublons retirés
+        codes, uniques = pd.factorize(msisdns, sort=True)
+        order = np.lexsort((roles, rows, scenarios, codes))
+        codes, scenarios, rows, roles, scores = codes[order], scenarios[order], rows[order], roles[order], scores[order]
+        same_detection = np.zeros(len(codes), dtype=bool)
+        same_detection[1:] = (codes[1:] == codes[:-1]) & (scenarios[1:] == scenarios[:-1]) & (rows[1:] == rows[:-1])
+        keep = ~(same_detection & np.r_[False, roles[1:] == roles[:-1]])
+        codes, scenarios, rows, roles, scores = codes[keep], scenarios[keep], rows[keep], roles[keep], scores[keep]
+        first = ~same_detection[keep]
+        offsets = np.zeros(len(uniques) + 1, dtype='int64')
+        offsets[1:] = np.cumsum(np.bincount(codes, minlength=len(uniques)))
+
+        entities = cls._aggregate(uniques, offsets, codes, scenarios, roles, scores, first, risk_rules)
+        # Entités par score décroissant ; positions[code] = ligne de l'entité
+        order = np.lexsort((np.arange(len(entities)), -entities['risk_score'].to_numpy(dtype='int64')))
+        positions = np.empty(len(order), dtype='int64')
+        positions[order] = np.arange(len(order))
+        return cls(tables, pd.Index(uniques), offsets, scenarios, rows, roles, scores,
+                   entities.iloc[order].reset_index(drop=True), positions)
+
+    @staticmethod
+    def _aggregate(uniques, offsets, codes, scenarios, roles, scores, first, risk_rules):
+        """Agrégats par entité (une détection comptée une fois quel que soit le nombre de rôles)."""
+        if not len(uniques):
+            return pd.DataFrame(columns=ENTITY_COLUMNS)
+        starts = offsets[:-1]
+        detection_scores = np.where(first, scores, 0)
+        scenario_masks = np.bitwise_or.reduceat((1 << scenarios.astype('int64')).astype('uint16'), starts)
+        role_masks = np.bitwise_or.reduceat((1 << roles.astype('int64')).astype('uint16'), starts)
+        entities = pd.DataFrame({
+            'msisdn': np.asarray(uniques, dtype=object),
+            'nb_detections': np.bincount(codes, weights=first, minlength=len(uniques)).astype('int64'),
+            'nb_scenarios': _bit_counts(scenario_masks, ENTITY_SCENARIOS),
+            'scenarios': _mask_labels(scenario_masks, ENTITY_SCENARIOS),
+            'nb_roles': _bit_counts(role_masks, ENTITY_ROLES),
+            'roles': _mask_labels(role_masks, ENTITY_ROLES),
+            'max_score': np.maximum.reduceat(scores, starts),
+            'total_score': np.add.reduceat(detection_scores, starts),
+        })
+        return score_cases(entities, 'entities', risk_rules)[ENTITY_COLUMNS]
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def nbytes(self):
+        """Taille des tableaux de l'index (octets), hors tableaux de détection et DataFrame des entités."""
+        arrays = (self._offsets, self._scenarios, self._rows, self._roles, self._scores, self._positions)
+        return sum(array.nbytes for array in arrays) + int(self._index.memory_usage(deep=True))
+
+    def __contains__(self, msisdn):
+        return str(msisdn) in self._index
+
+    def _code(self, msisdn):
+        """Code de l'entité (table de hachage), None si absente."""
+        try:
+            return self._index.get_loc(str(msisdn))
+        except KeyError:
+            return None
+
+    def _range(self, msisdn):
+        code = self._code(msisdn)
+        if code is None:
+            return slice(0, 0)
+        return slice(self._offsets[code], self._offsets[code + 1])
+
+    def lookup(self, msisdn):
+        """
+        Appartenances d'un MSISDN (vide s'il n'apparaît dans aucune détection).
+
+        Returns:
+            DataFrame (scenario, row, role, score), une ligne par rôle dans une détection
+        """
+        span = self._range(msisdn)
+        return pd.DataFrame({
+            'scenario': np.asarray(ENTITY_SCENARIOS, dtype=object)[self._scenarios[span]],
+            'row': self._rows[span],
+            'role': np.asarray(ENTITY_ROLES, dtype=object)[self._roles[span]],
+            'score': self._scores[span],
+        }, columns=MEMBERSHIP_COLUMNS)
+
+    def detections(self, msisdn):
+        """
+        Toutes les détections impliquant un MSISDN.
+
+        Returns:
+            dict tableau → lignes du tableau (colonne « role » en tête, rôles
+            multiples joints), tableaux sans détection omis
+        """
+        members = self.lookup(msisdn)
+        found = {}
+        for name, rows in members.groupby('scenario', sort=False):
+            roles = rows.groupby('row', sort=False)['role'].agg(', '.join)
+            table = self.tables[name].iloc[roles.index.to_numpy()]
+            found[name] = table.reset_index(drop=True).assign(role=roles.to_numpy())[['role'] + list(table.columns)]
+        return found
+
+    def entity(self, msisdn):
+        """Ligne consolidée d'un MSISDN (colonnes ENTITY_COLUMNS), None s'il est absent de l'index."""
+        code = self._code(msisdn)
+        return None if code is None else self.entities.iloc[self._positions[code]]
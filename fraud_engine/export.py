@@ -0,0 +1,154 @@
+"""
+Export des résultats : classeur Excel multi-feuilles et CSV, par blocs
+
+Le classeur est écrit avec openpyxl en mode write-only (lignes envoyées au
+fichier au fur et à mesure, une feuille par tableau de résultats) et le CSV
+par blocs de lignes : la mémoire reste stable quelle que soit la taille des
+tableaux, seul le fichier produit est conservé. Les parcours des chaînes
+(listes) sont convertis en libellés bloc par bloc, au moment de l'écriture.
+
+write_results écrit un dossier de résultats (un fichier par tableau, ou un
+classeur), pour la ligne de commande et l'historique des répétitions.
+"""
+import io
+import os
+
+import numpy as np
+from openpyxl import Workbook
+
+from .chains import chain_labels
+
+# Lignes écrites par bloc
+DEFAULT_EXPORT_CHUNKSIZE = 50_000
+
+# Formats de write_results
+OUTPUT_FORMATS = ('parquet', 'csv', 'xlsx')
+
+# Classeur unique (une feuille par tableau) pour le format xlsx
+EXCEL_FILE = 'resultats.xlsx'
+
+# Limites d'une feuille Excel
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_SHEET_NAME_MAX = 31
+
+
+def _sheet_name(name, used):
+    """Nom de feuille unique d'au plus 31 caractères."""
+    base = name[:EXCEL_SHEET_NAME_MAX]
+    candidate, index = base, 2
+    while candidate in used:
+        suffix = f" ({index})"
+        candidate = base[:EXCEL_SHEET_NAME_MAX - len(suffix)] + suffix
+        index += 1
+    used.add(candidate)
+    return candidate
+
+
+def _cell_values(column):
+    """Valeurs Python d'une colonne, valeurs manquantes remplacées par None."""
+    values = column.tolist()
+    missing = column.isna().to_numpy()
+    if missing.any():
+        for position in np.flatnonzero(missing):
+            values[position] = None
+    return values
+
+
+def iter_rows(table, chunksize=DEFAULT_EXPORT_CHUNKSIZE):
+    """
+    Lignes d'un tableau (listes de valeurs Python), bloc par bloc.
+
+    Yields:
+        liste de valeurs par ligne
+    """
+    for start in range(0, len(table), chunksize):
+        chunk = chain_labels(table.iloc[start:start + chunksize])
+        yield from zip(*(_cell_values(chunk[column]) for column in chunk.columns))
+
+
+def write_excel(results, target, chunksize=DEFAULT_EXPORT_CHUNKSIZE):
+    """
+    Écrit un classeur Excel, une feuille par tableau (mode write-only).
+
+    Un tableau dépassant la capacité d'une feuille continue sur les feuilles
+    suivantes (« nom (2) », ...).
+
+    Args:
+        results: dict nom → DataFrame
+        target: chemin ou fichier binaire
+        chunksize: lignes converties par bloc
+    """
+    workbook = Workbook(write_only=True)
+    used = set()
+    for name, table in results.items():
+        header = [str(column) for column in table.columns]
+        sheet = workbook.create_sheet(_sheet_name(name, used))
+        sheet.append(header)
+        written = 1
+        for row in iter_rows(table, chunksize):
+            if written == EXCEL_MAX_ROWS:
+                sheet = workbook.create_sheet(_sheet_name(name, used))
+                sheet.append(header)
+                written = 1
+            sheet.append(row)
+            written += 1
+    workbook.save(target)
+
+
+def write_csv(table, target, chunksize=DEFAULT_EXPORT_CHUNKSIZE):
+    """
+    Écrit un tableau en CSV (UTF-8), bloc par bloc.
+
+    Args:
+        table: DataFrame
+        target: chemin ou fichier texte
+        chunksize: lignes écrites par bloc
+    """
+    if isinstance(target, str):
+        with open(target, 'w', encoding='utf-8', newline='') as handle:
+            write_csv(table, handle, chunksize)
+        return
+    table.iloc[:0].to_csv(target, index=False)
+    for start in range(0, len(table), chunksize):
+        chain_labels(table.iloc[start:start + chunksize]).to_csv(target, index=False, header=False)
+
+
+def write_results(results, output_dir, fmt='parquet'):
+    """
+    Écrit chaque tableau de résultats dans `output_dir/<nom>.<format>`, ou
+    tous dans un classeur `output_dir/resultats.xlsx` pour le format xlsx.
+
+    Returns:
+        liste des chemins écrits
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if fmt == 'xlsx':
+        path = os.path.join(output_dir, EXCEL_FILE)
+        write_excel(results, path)
+        return [path]
+    paths = []
+    for name, table in results.items():
+        path = os.path.join(output_dir, f"{name}.{fmt}")
+        if fmt == 'parquet':
+            chain_labels(table).to_parquet(path, index=False)
+        else:
+            write_csv(table, path)
+        paths.append(path)
+    return paths
+
+
+def excel_bytes(results, chunksize=DEFAULT_EXPORT_CHUNKSIZE):
+    """Contenu d'un classeur Excel (pour téléchargement)."""
+    buffer = io.BytesIO()
+    write_excel(results, buffer, chunksize)
+    return buffer.getvalue()
+
+
+def csv_bytes(table, chunksize=DEFAULT_EXPORT_CHUNKSIZE):
+    """Contenu CSV encodé en UTF-8 (pour téléchargement)."""
+    buffer = io.BytesIO()
+    text = io.TextIOWrapper(buffer, encoding='utf-8', newline='')
+    write_csv(table, text, chunksize)
+    text.flush()
+    text.detach()
+    return buffer.getvalue()
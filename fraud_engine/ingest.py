@@ -0,0 +1,45 @@
+"""
+Ingestion par blocs des gros fichiers CSV de transactions
+
+Le fichier est lu par blocs de `chunksize` lignes, réduit aux colonnes
+utilisées par les détecteurs, et chaque bloc est normalisé comme par
+loader.preprocess. Les blocs alimentent le stockage colonnaire partitionné
+par jour et par type (voir store.build_store) : les détecteurs relisent
+ensuite une journée à la fois, la mémoire maximale dépend donc de la journée
+la plus chargée et non de la taille du fichier.
+"""
+import pandas as pd
+
+from .loader import CSV_DTYPES, TRANSACTION_COLUMNS
+
+DEFAULT_CHUNKSIZE = 1_000_000
+
+
+def iter_chunks(source, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Lit un CSV de transactions par blocs et normalise chaque bloc.
+
+    Args:
+        source: chemin, objet fichier CSV ou source base de données (database.DatabaseSource,
+            lue par lots de `chunksize` lignes)
+        chunksize: nombre de lignes par bloc
+
+    Yields:
+        DataFrame normalisé (REASON_NAME en minuscules, MSISDN sans espaces, DATE)
+    """
+    if hasattr(source, 'iter_batches'):
+        reader = source.iter_batches(chunksize)
+    else:
+        reader = pd.read_csv(
+            source,
+            usecols=TRANSACTION_COLUMNS,
+            dtype=CSV_DTYPES,
+            parse_dates=['INITATE_DATE'],
+            chunksize=chunksize,
+        )
+    for chunk in reader:
+        chunk['REASON_NAME'] = chunk['REASON_NAME'].str.strip().str.lower()
+        chunk['DEBIT_MSISDN'] = chunk['DEBIT_MSISDN'].str.strip()
+        chunk['CREDIT_MSISDN'] = chunk['CREDIT_MSISDN'].str.strip()
+        chunk['DATE'] = chunk['INITATE_DATE'].dt.date
+        yield chunk
@@ -0,0 +1,263 @@
+"""
+Instrumentation des étapes de détection
+
+Un RunProfile actif (contexte `with` ou start/stop) enregistre, pour chaque
+étape ouverte avec stage(), le temps réel, le temps CPU, les lignes en entrée
+et en sortie, la mémoire (RSS courant et pic du processus, pic d'allocations
+Python si trace_memory) et les compteurs intermédiaires signalés par les
+détecteurs avec count() (par exemple la taille des jointures). Sans profil
+actif, stage() et count() ne font rien.
+
+Une étape peut en plus être passée au profileur cProfile (profile_stages).
+"""
+import contextvars
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Nombre de fonctions retenues dans le résumé cProfile d'une étape
+PROFILE_TOP = 25
+
+_active = contextvars.ContextVar('fraud_engine_profile', default=None)
+
+
+def peak_rss_mb():
+    """Pic RSS du processus depuis son démarrage (Mo), None si indisponible."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets ailleurs
+    return round(peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def current_rss_mb():
+    """RSS courant du processus (Mo), None si indisponible (hors Linux)."""
+    try:
+        with open('/proc/self/statm', encoding='ascii') as handle:
+            pages = int(handle.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round(pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2, 1)
+
+
+def row_count(value):
+    """Nombre de lignes d'un résultat (DataFrame ou dict de DataFrames)."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(item) for item in value.values() if isinstance(item, (pd.DataFrame, pd.Series)))
+    return None
+
+
+class RunProfile:
+    """Mesures des étapes d'une exécution."""
+
+    def __init__(self, profile_stages=(), trace_memory=False):
+        """
+        Args:
+            profile_stages: noms des étapes à passer au profileur cProfile
+            trace_memory: suivre le pic d'allocations Python (tracemalloc, plus lent)
+        """
+        self.profile_stages = set(profile_stages)
+        self.trace_memory = trace_memory
+        self.stages = []
+        self.profiles = {}  # étape → résumé texte cProfile
+        self.started = None
+        self.wall_s = None
+        self._local = threading.local()
+        self._token = None
+        self._start_time = None
+
+    @property
+    def _stack(self):
+        """Étapes ouvertes du thread courant (étapes concurrentes, voir scheduler)."""
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    # ------------------------------------------------------------------
+    # Activation
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Active le profil pour le contexte courant."""
+        self.started = datetime.datetime.now().isoformat(timespec='seconds')
+        self._start_time = time.perf_counter()
+        self._token = _active.set(self)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return self
+
+    def stop(self):
+        """Désactive le profil."""
+        self.wall_s = round(time.perf_counter() - self._start_time, 4)
+        if self._token is not None:
+            _active.reset(self._token)
+            self._token = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    # ------------------------------------------------------------------
+    # Étapes
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Mesure une étape ; le dict renvoyé peut être complété (rows_out, cache...).
+
+        Yields:
+            dict de l'étape (stage, wall_s, cpu_s, rows_in, rows_out, counters...)
+        """
+        record = {
+            'stage': name,
+            'parent': self._stack[-1]['stage'] if self._stack else None,
+            'rows_in': rows_in,
+            'rows_out': None,
+            'counters': {},
+        }
+        # Étapes listées dans l'ordre de démarrage (parents avant leurs sous-étapes)
+        self.stages.append(record)
+        self._stack.append(record)
+        traced = self.trace_memory and tracemalloc.is_tracing()
+        if traced:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        profiler = cProfile.Profile() if name in self.profile_stages else None
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record['wall_s'] = round(time.perf_counter() - wall, 4)
+            record['cpu_s'] = round(time.process_time() - cpu, 4)
+            record['rss_mb'] = current_rss_mb()
+            record['peak_rss_mb'] = peak_rss_mb()
+            if traced:
+                # Pic absolu (y compris celui des sous-étapes, qui réinitialisent le pic)
+                peak = max(tracemalloc.get_traced_memory()[1], record.pop('_child_peak', 0))
+                record['peak_alloc_mb'] = round((peak - base) / 1024 ** 2, 2)
+            self._stack.pop()
+            if traced and self._stack:
+                parent = self._stack[-1]
+                parent['_child_peak'] = max(parent.get('_child_peak', 0), peak)
+            if profiler is not None:
+                self.profiles[name] = _profile_summary(profiler)
+
+    def count(self, name, value):
+        """Enregistre un compteur (ex. taille d'une jointure) dans l'étape en cours."""
+        if self._stack:
+            self._stack[-1]['counters'][name] = int(value)
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    def to_dict(self):
+        return {
+            'started': self.started,
+            'wall_s': self.wall_s,
+            'stages': self.stages,
+            'profiles': self.profiles,
+        }
+
+    def to_json(self, path=None):
+        """Profil au format JSON (écrit dans `path` si fourni)."""
+        text = json.dumps(self.to_dict(), ensure_ascii=False, indent=2, default=str)
+        if path is not None:
+            with open(path, 'w', encoding='utf-8') as handle:
+                handle.write(text)
+        return text
+
+    def to_frame(self):
+        """Une ligne par étape, compteurs intermédiaires aplatis en texte."""
+        columns = ['stage', 'parent', 'wall_s', 'cpu_s', 'rows_in', 'rows_out', 'rss_mb', 'peak_rss_mb']
+        if self.trace_memory:
+            columns.append('peak_alloc_mb')
+        # Champs ajoutés par l'appelant (ex. cache)
+        extra = [key for key in dict.fromkeys(k for record in self.stages for k in record)
+                 if key not in columns and key != 'counters']
+        table = pd.DataFrame(self.stages, columns=columns + extra + ['counters'])
+        table['counters'] = [
+            ", ".join(f"{name}={value}" for name, value in counters.items())
+            for counters in table['counters']
+        ]
+        return table
+
+    def summary(self):
+        """Totaux par nom d'étape (utile en mode jour par jour)."""
+        table = self.to_frame()
+        return (
+            table.groupby('stage', sort=False)
+            .agg(nb=('wall_s', 'count'), wall_s=('wall_s', 'sum'), cpu_s=('cpu_s', 'sum'),
+                 rows_out=('rows_out', 'sum'), peak_rss_mb=('peak_rss_mb', 'max'))
+            .reset_index()
+        )
+
+
+def _profile_summary(profiler):
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_TOP)
+    return output.getvalue()
+
+
+def active_profile():
+    """RunProfile actif dans le contexte courant, None sinon."""
+    return _active.get()
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """Étape mesurée dans le profil actif (sans effet sans profil actif)."""
+    profile = _active.get()
+    if profile is None:
+        yield {}
+        return
+    with profile.stage(name, rows_in=rows_in) as record:
+        yield record
+
+
+def measured(name, function, *inputs, **params):
+    """
+    Exécute function(*inputs, **params) dans une étape mesurée.
+
+    Les lignes en entrée sont la somme des tailles des DataFrames `inputs`.
+    """
+    with stage(name, rows_in=sum(len(frame) for frame in inputs)) as record:
+        result = function(*inputs, **params)
+        record['rows_out'] = row_count(result)
+    return result
+
+
+def count(name, value):
+    """Compteur intermédiaire de l'étape en cours (sans effet sans profil actif)."""
+    profile = _active.get()
+    if profile is not None:
+        profile.count(name, value)
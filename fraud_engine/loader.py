@@ -0,0 +1,75 @@
+"""
+Chargement et prétraitement des fichiers de transactions
+"""
+import pandas as pd
+
+# Colonnes attendues dans les extractions D-Money
+TRANSACTION_COLUMNS = ['INITATE_DATE', 'DEBIT_MSISDN', 'CREDIT_MSISDN', 'REASON_NAME', 'ACTUAL_AMOUNT']
+
+CSV_DTYPES = {
+    'DEBIT_MSISDN': 'str',
+    'CREDIT_MSISDN': 'str',
+    'REASON_NAME': 'str',
+    'ACTUAL_AMOUNT': 'float32'
+}
+
+
+def empty_transactions():
+    """DataFrame prétraité vide, avec les types de colonnes attendus."""
+    return pd.DataFrame({
+        'INITATE_DATE': pd.Series(dtype='datetime64[ns]'),
+        'DEBIT_MSISDN': pd.Series(dtype=object),
+        'CREDIT_MSISDN': pd.Series(dtype=object),
+        'REASON_NAME': pd.Series(dtype=object),
+        'ACTUAL_AMOUNT': pd.Series(dtype='float32'),
+        'DATE': pd.Series(dtype=object),
+    })
+
+
+def read_transactions(source):
+    """
+    Lit un fichier CSV de transactions brut.
+
+    Args:
+        source: chemin, objet fichier (ex. st.file_uploader) ou source base de
+            données (database.DatabaseSource)
+
+    Returns:
+        DataFrame brut
+    """
+    if hasattr(source, 'read_frame'):
+        return source.read_frame()
+    return pd.read_csv(source, dtype=CSV_DTYPES, parse_dates=['INITATE_DATE'])
+
+
+def preprocess(df):
+    """
+    Normalise REASON_NAME / MSISDN, ajoute la colonne DATE et trie par date.
+
+    Args:
+        df: DataFrame brut (colonnes TRANSACTION_COLUMNS)
+
+    Returns:
+        DataFrame prétraité, trié par INITATE_DATE
+    """
+    df['REASON_NAME'] = df['REASON_NAME'].str.strip().str.lower()
+    df['DEBIT_MSISDN'] = df['DEBIT_MSISDN'].str.strip()
+    df['CREDIT_MSISDN'] = df['CREDIT_MSISDN'].str.strip()
+    df['DATE'] = df['INITATE_DATE'].dt.date
+
+    return df.sort_values('INITATE_DATE').reset_index(drop=True)
+
+
+def load_transactions(*sources):
+    """
+    Charge et prétraite un ou plusieurs fichiers de transactions.
+
+    Args:
+        sources: chemins, objets fichiers CSV ou sources base de données (concaténés dans l'ordre)
+
+    Returns:
+        DataFrame prétraité, trié par INITATE_DATE
+    """
+    frames = [read_transactions(source) for source in sources]
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return preprocess(df)
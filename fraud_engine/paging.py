@@ -0,0 +1,85 @@
+"""
+Pagination, tri et filtre côté serveur des tableaux de résultats
+
+Le filtre et le tri sont calculés sur des positions de lignes ; seule la page
+demandée est extraite du tableau et envoyée à l'interface.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+DEFAULT_PAGE_SIZE = 100
+
+
+def filter_positions(table, query=None, columns=None):
+    """
+    Positions des lignes contenant `query` (sans casse) dans l'une des colonnes.
+
+    Args:
+        table: DataFrame
+        query: texte recherché, None ou vide = toutes les lignes
+        columns: colonnes recherchées, None = toutes
+
+    Returns:
+        tableau NumPy de positions
+    """
+    if not query:
+        return np.arange(len(table))
+    mask = np.zeros(len(table), dtype=bool)
+    for column in columns or table.columns:
+        values = table[column]
+        # Les colonnes catégorielles ne sont converties qu'une fois par valeur distincte
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            matches = values.cat.categories.astype(str).str.contains(query, case=False, regex=False)
+            mask |= np.asarray(matches)[values.cat.codes.to_numpy()] & (values.cat.codes.to_numpy() >= 0)
+        else:
+            mask |= values.astype(str).str.contains(query, case=False, regex=False).to_numpy(dtype=bool)
+    return np.flatnonzero(mask)
+
+
+def sort_positions(table, positions, sort_by=None, ascending=True):
+    """
+    Trie des positions de lignes selon une colonne (tri stable, valeurs manquantes en dernier).
+
+    Returns:
+        tableau NumPy de positions
+    """
+    if sort_by is None:
+        return positions
+    values = table[sort_by]
+    # Colonnes de listes (parcours des chaînes) : tri sur leur texte
+    if isinstance(values.dtype, pd.ArrowDtype) and pa.types.is_list(values.dtype.pyarrow_dtype):
+        key = values.take(positions).astype(str).set_axis(positions)
+    else:
+        key = pd.Series(values.to_numpy()[positions], index=positions)
+    return key.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+
+
+def page_count(total, page_size=DEFAULT_PAGE_SIZE):
+    """Nombre de pages (au moins une)."""
+    return max(1, -(-total // page_size))
+
+
+def page_of(table, page=1, page_size=DEFAULT_PAGE_SIZE, sort_by=None, ascending=True, query=None,
+            columns=None):
+    """
+    Page d'un tableau filtré et trié.
+
+    Args:
+        table: DataFrame
+        page: numéro de page (à partir de 1)
+        page_size: lignes par page
+        sort_by: colonne de tri, None = ordre d'origine
+        ascending: tri croissant
+        query: texte recherché dans les lignes (voir filter_positions)
+        columns: colonnes affichées et recherchées, None = toutes
+
+    Returns:
+        (DataFrame de la page, nombre de lignes filtrées) ; une page au-delà
+        de la dernière renvoie la dernière
+    """
+    positions = sort_positions(table, filter_positions(table, query, columns), sort_by, ascending)
+    page = min(max(1, page), page_count(len(positions), page_size))
+    start = (page - 1) * page_size
+    rows = table.take(positions[start:start + page_size])
+    return (rows if columns is None else rows[columns]), len(positions)
@@ -0,0 +1,113 @@
+"""
+Parité des backends pandas et DuckDB sur données synthétiques
+
+Pour chaque taille demandée, un fichier synthétique (avec fraudes plantées)
+est généré, tous les détecteurs sont exécutés avec chaque backend et chaque
+tableau de résultats est comparé sans tenir compte de l'ordre des lignes
+(montants et délais arrondis à 6 décimales). Code de sortie 1 si un tableau
+diffère.
+
+Exemple :
+    python -m fraud_engine.parity --sizes 10k,100k --window chains=60
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from .benchmark import parse_size
+from .pipeline import run_detection
+from .synthetic import generate_transactions, write_transactions
+from .windows import SCENARIO_HOPS, parse_window
+
+DEFAULT_SIZES = '10k,100k'
+
+# Décimales conservées pour comparer les colonnes flottantes
+FLOAT_DECIMALS = 6
+
+
+def normalized(table):
+    """Tableau comparable indépendamment de l'ordre des lignes et des types de colonnes."""
+    table = table.reset_index(drop=True).copy()
+    for column in table.columns:
+        if table[column].dtype.kind == 'f':
+            table[column] = table[column].astype('float64').round(FLOAT_DECIMALS)
+        else:
+            table[column] = table[column].astype(str)
+    return table.sort_values(list(table.columns)).reset_index(drop=True)
+
+
+def compare_results(expected, actual):
+    """
+    Compare deux dict de résultats (nom → DataFrame).
+
+    Returns:
+        dict nom → (identique, lignes attendues, lignes obtenues)
+    """
+    report = {}
+    for name, table in expected.items():
+        other = actual.get(name)
+        if other is None:
+            report[name] = (False, len(table), None)
+            continue
+        same = (table.empty and other.empty) or (
+            list(table.columns) == list(other.columns) and normalized(table).equals(normalized(other))
+        )
+        report[name] = (same, len(table), len(other))
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='fraud_engine.parity',
+        description="Vérifie que le backend DuckDB donne les mêmes résultats que pandas."
+    )
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Tailles en lignes, ex. 10k,100k")
+    parser.add_argument('--days', type=int, default=7, help="Nombre de jours générés")
+    parser.add_argument('--planted', type=int, default=10, help="Fraudes plantées par scénario")
+    parser.add_argument('--max-depth', type=int, default=10, help="Profondeur maximale des chaînes")
+    parser.add_argument('--window', action='append', type=parse_window, default=[],
+                        metavar='SCENARIO=MIN[,MIN]',
+                        help=f"Fenêtre glissante d'un scénario, répétable. Scénarios : {', '.join(SCENARIO_HOPS)}")
+    parser.add_argument('--memory-limit', default=None, help="Limite mémoire de DuckDB (ex. 256MB)")
+    parser.add_argument('--seed', type=int, default=0, help="Graine aléatoire")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    params = {'max_depth': args.max_depth, 'windows': dict(args.window)}
+
+    identical = True
+    with tempfile.TemporaryDirectory(prefix='fraud_parity_') as work_dir:
+        for size in args.sizes.split(','):
+            rows = parse_size(size)
+            df, _ = generate_transactions(
+                n_clients=max(1_000, rows // 50), days=args.days, tx_per_day=max(1, rows // args.days),
+                n_circular=args.planted, n_chains=args.planted, n_b2w=args.planted, n_rings=args.planted,
+                n_bursts=args.planted, seed=args.seed,
+            )
+            path = os.path.join(work_dir, f"synthetic_{rows}.csv")
+            write_transactions(df, path)
+
+            timings = {}
+            results = {}
+            for backend in ('pandas', 'duckdb'):
+                start = time.perf_counter()
+                results[backend] = run_detection(
+                    path, backend=backend, memory_limit=args.memory_limit if backend == 'duckdb' else None,
+                    **params
+                )
+                timings[backend] = time.perf_counter() - start
+
+            print(f"📊 {len(df)} lignes : pandas {timings['pandas']:.2f} s, duckdb {timings['duckdb']:.2f} s")
+            for name, (same, expected, actual) in compare_results(results['pandas'], results['duckdb']).items():
+                identical &= same
+                print(f"   {'✅' if same else '❌'} {name}: {expected} / {actual} lignes")
+
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
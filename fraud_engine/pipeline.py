@@ -0,0 +1,450 @@
+"""
+Enchaînement complet : classification, détecteurs et tableaux de résultats
+"""
+import datetime
+import os
+import tempfile
+import warnings
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+
+import pandas as pd
+
+from .b2w_chain import MAX_CANDIDATES_PER_CLIENT, b2w_send_w2b_repetitions, detect_b2w_send_w2b
+from .cashin_w2b import cashin_w2b_repetitions, detect_cashin_w2b
+from .chains import (
+    chains_by_distributor, collect_money_chains, recurrent_clients, report_pruned, sort_chains, top_chains
+)
+from .circular import detect_circular, summarize_circular
+from .classify import classify_transactions
+from .entities import EntityIndex
+from .ingest import DEFAULT_CHUNKSIZE
+from .instrument import measured, row_count, stage
+from .loader import load_transactions
+from .repeats import PAIR_REPEATS, RECEIVER_VOLUMES, combine_repeats, detect_repeats, partial_repeats
+from .rings import RING_HOP_DELAY, RING_MAX_LENGTH, detect_rings, ring_wallets
+from .store import TransactionStore, build_store
+from .velocity import (
+    VELOCITY_BURST_RATIO, VELOCITY_TYPES, VELOCITY_WINDOWS, daily_peaks, detect_velocity, sort_velocity,
+    velocity_bursts
+)
+from .windows import span_days, validate_windows, window_span
+
+# Détecteurs par scénario (partitionnés par jour)
+SCENARIO_RESULTS = ['circular', 'cashin_w2b', 'chains', 'b2w_send_w2b', 'rings']
+
+# Moteurs d'exécution des détecteurs (duckdb : voir sql_backend)
+BACKENDS = ('pandas', 'duckdb')
+
+# Nombre de tâches par processus (équilibrage des journées de tailles inégales)
+TASKS_PER_WORKER = 4
+
+# Colonnes MSISDN des résultats bruts (décodées pour l'affichage)
+MSISDN_COLUMNS = {
+    'repeat_mp': ['DEBIT_MSISDN', 'CREDIT_MSISDN'],
+    'redeem': ['CREDIT_MSISDN'],
+    'repeat_cashin': ['DEBIT_MSISDN', 'CREDIT_MSISDN'],
+    'repeat_w2b': ['DEBIT_MSISDN', 'CREDIT_MSISDN'],
+    'cashin_volume': ['CREDIT_MSISDN'],
+    'circular': ['cashin_from', 'client', 'merchant', 'cashout_to'],
+    'cashin_w2b': ['Distributeur', 'client', 'Banque'],
+    'chains': [],
+    'b2w_send_w2b': ['Source Bank', 'client_A', 'client_B', 'Destination Bank'],
+    'rings': [],
+    'velocity': ['msisdn'],
+}
+
+
+def run_scenarios(types, max_depth=10, max_hop_delay=None, decode=None, windows=None, risk_rules=None,
+                  amount_tolerance=None, max_candidates=MAX_CANDIDATES_PER_CLIENT, chain_budget=None,
+                  ring_length=RING_MAX_LENGTH, ring_hop_delay=RING_HOP_DELAY, ring_payments=False):
+    """
+    Exécute les détecteurs de scénarios (bruts, chaînes non triées).
+
+    Args:
+        types: dict type → DataFrame (voir classify.classify_transactions)
+        max_depth: Profondeur maximale de recherche des chaînes
+        max_hop_delay: Délai maximal (minutes) entre deux étapes d'une chaîne
+        decode: fonction vectorisée code → MSISDN si les MSISDN sont encodés
+        windows: dict scénario → délais maximaux par étape (minutes) ; les
+            scénarios listés sont joints par fenêtre glissante plutôt que par
+            jour calendaire (voir windows.SCENARIO_HOPS)
+        risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+        amount_tolerance: écart relatif maximal des montants entre les étapes
+            B2W → Send Money → W2B, None = montants libres
+        max_candidates: nombre maximal de candidats par client et par étape
+            B2W → Send Money → W2B, None = illimité
+        chain_budget: ChainBudget de la recherche des chaînes (top_k,
+            max_paths, max_nodes, dedup), None = recherche complète
+        ring_length: nombre maximal de portefeuilles d'un anneau de transferts
+        ring_hop_delay: délai maximal (minutes) entre deux transferts d'un
+            anneau limité au jour (la fenêtre « rings » le remplace)
+        ring_payments: ajouter les paiements marchands au graphe des anneaux
+
+    Returns:
+        dict nom de scénario → DataFrame (clés SCENARIO_RESULTS)
+    """
+    windows = validate_windows(windows)
+    chain_window = windows.get('chains')
+    ring_window = windows.get('rings')
+    return {
+        'circular': measured(
+            'circular', detect_circular, types['mp'], types['cashin'], types['cashout'],
+            max_delays=windows.get('circular'), risk_rules=risk_rules
+        ),
+        'cashin_w2b': measured(
+            'cashin_w2b', detect_cashin_w2b, types['cashin'], types['w2b'],
+            max_delay=windows['cashin_w2b'][0] if 'cashin_w2b' in windows else None
+        ),
+        'chains': measured(
+            'chains', collect_money_chains, types['cashin'], types['send'], types['w2b'],
+            max_depth=max_depth, max_hop_delay=chain_window[0] if chain_window else max_hop_delay,
+            decode=decode, by_day=chain_window is None, risk_rules=risk_rules, budget=chain_budget
+        ),
+        'b2w_send_w2b': measured(
+            'b2w_send_w2b', detect_b2w_send_w2b, types['b2w'], types['send'], types['w2b'],
+            max_delays=windows.get('b2w_send_w2b'), amount_tolerance=amount_tolerance,
+            max_candidates=max_candidates
+        ),
+        'rings': measured(
+            'rings', detect_rings, types['send'], *([types['mp']] if ring_payments else []),
+            max_length=ring_length, max_hop_delay=ring_window[0] if ring_window else ring_hop_delay,
+            by_day=ring_window is None, decode=decode, risk_rules=risk_rules
+        ),
+    }
+
+
+def decode_results(results, decode):
+    """
+    Décode les colonnes MSISDN (codes entiers) des résultats bruts.
+
+    Les détections simples sont retriées selon les MSISDN décodés, comme le
+    ferait un groupby sur les chaînes d'origine.
+
+    Args:
+        results: dict des détections simples et des scénarios bruts
+        decode: fonction vectorisée code → MSISDN
+
+    Returns:
+        dict nom de résultat → DataFrame
+    """
+    decoded = {}
+    for name, table in results.items():
+        table = table.copy()
+        for column in MSISDN_COLUMNS.get(name, []):
+            table[column] = decode(table[column].to_numpy())
+        if name in PAIR_REPEATS:
+            table = table.sort_values(['DEBIT_MSISDN', 'CREDIT_MSISDN']).reset_index(drop=True)
+        elif name in RECEIVER_VOLUMES:
+            table = table.sort_values('CREDIT_MSISDN').reset_index(drop=True)
+        decoded[name] = table
+    return decoded
+
+
+def finalize_results(results, risk_rules=None):
+    """
+    Trie les chaînes et ajoute les tableaux dérivés (résumés, répétitions,
+    score consolidé par entité).
+
+    Args:
+        results: dict des détections simples et des scénarios bruts
+        risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+
+    Returns:
+        dict nom de résultat → DataFrame
+    """
+    results['circular_summary'] = summarize_circular(results['circular'])
+    results['cashin_w2b_repetitions'] = cashin_w2b_repetitions(results['cashin_w2b'])
+    results['chains'] = sort_chains(results['chains'])
+    results['chains_by_distributor'] = chains_by_distributor(results['chains'])
+    results['chain_clients'] = recurrent_clients(results['chains'])
+    results['b2w_send_w2b_repetitions'] = b2w_send_w2b_repetitions(results['b2w_send_w2b'])
+    results['ring_wallets'] = ring_wallets(results['rings'])
+    results['velocity'] = sort_velocity(results['velocity'])
+    results['entities'] = EntityIndex.from_results(results, risk_rules).entities
+
+    order = [
+        'repeat_mp', 'redeem', 'repeat_cashin', 'repeat_w2b', 'cashin_volume',
+        'circular', 'circular_summary', 'cashin_w2b', 'cashin_w2b_repetitions',
+        'chains', 'chains_by_distributor', 'chain_clients',
+        'b2w_send_w2b', 'b2w_send_w2b_repetitions', 'rings', 'ring_wallets', 'velocity', 'entities',
+    ]
+    return {name: results[name] for name in order}
+
+
+def run_detectors(types, max_depth=10, max_hop_delay=None, windows=None, risk_rules=None,
+                  velocity_windows=VELOCITY_WINDOWS, velocity_ratio=VELOCITY_BURST_RATIO, **options):
+    """
+    Exécute tous les détecteurs sur les transactions classifiées.
+
+    Args:
+        types: dict type → DataFrame (voir classify.classify_transactions)
+        max_depth: Profondeur maximale de recherche des chaînes
+        max_hop_delay: Délai maximal (minutes) entre deux étapes d'une chaîne
+        windows: fenêtres glissantes par scénario (voir run_scenarios)
+        risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+        velocity_windows: durées des fenêtres de vélocité (minutes) → seuil
+            du nombre de transactions (voir velocity)
+        velocity_ratio: rapport d'un pic à l'habitude du portefeuille à partir
+            duquel il est une rafale, None = seuils seulement
+        options: options B2W → Send Money → W2B, des chaînes et des anneaux
+            (amount_tolerance, max_candidates, chain_budget, ring_*, voir run_scenarios)
+
+    Returns:
+        dict nom de résultat → DataFrame
+    """
+    with stage('repeats') as record:
+        results = detect_repeats(types)
+        record['rows_out'] = row_count(results)
+    results.update(run_scenarios(
+        types, max_depth=max_depth, max_hop_delay=max_hop_delay, windows=windows, risk_rules=risk_rules, **options
+    ))
+    with stage('velocity', rows_in=sum(len(types[tx_type]) for tx_type in VELOCITY_TYPES)) as record:
+        results['velocity'] = detect_velocity(types, velocity_windows, velocity_ratio, risk_rules)
+        record['rows_out'] = len(results['velocity'])
+    with stage('finalize'):
+        return finalize_results(results, risk_rules)
+
+
+def resolve_workers(workers):
+    """Nombre de processus effectif (None ou 0 = nombre de cœurs)."""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def _load_window(store, day, types, span):
+    """
+    Ajoute aux transactions du jour celles des jours suivants qu'un scénario
+    commencé ce jour peut encore atteindre (au plus `span` minutes après minuit).
+    """
+    cutoff = pd.Timestamp(day) + pd.Timedelta(days=1, minutes=span)
+    following = [store.load_day(day + datetime.timedelta(days=offset)) for offset in range(1, span_days(span) + 1)]
+    return {
+        tx_type: pd.concat(
+            [frame] + [later[tx_type][later[tx_type]['INITATE_DATE'] <= cutoff] for later in following],
+            ignore_index=True,
+        )
+        for tx_type, frame in types.items()
+    }
+
+
+def _run_day(store, day, max_depth, max_hop_delay, windows=None, risk_rules=None, chain_budget=None,
+             velocity_windows=VELOCITY_WINDOWS, **options):
+    """
+    Agrégats partiels, pics de vélocité et scénarios bruts d'une journée.
+
+    Avec des fenêtres glissantes, les scénarios voient aussi le début des
+    jours suivants ; seuls les cas commencés ce jour sont conservés (les
+    autres le sont avec leur propre jour), et les top_k chaînes du jour sont
+    choisies après ce filtre. Les fenêtres de vélocité commencées ce jour
+    sont toujours complétées par le début du jour suivant.
+    """
+    with stage('load_day') as record:
+        types = store.load_day(day)
+        record['rows_out'] = row_count(types)
+    partials = partial_repeats(types)
+    with stage('velocity_peaks') as record:
+        velocity_types = {tx_type: types[tx_type] for tx_type in VELOCITY_TYPES}
+        if day is not None:
+            velocity_types = _load_window(store, day, velocity_types, max(velocity_windows, default=0))
+        peaks = daily_peaks(velocity_types, velocity_windows, day=day)
+        record['rows_out'] = len(peaks)
+    if windows and day is not None:
+        with stage('load_window') as record:
+            types = _load_window(
+                store, day, types, window_span(windows, max_depth, options.get('ring_length', RING_MAX_LENGTH))
+            )
+            record['rows_out'] = row_count(types)
+    windowed = bool(windows) and day is not None
+    scenarios = run_scenarios(
+        types, max_depth=max_depth, max_hop_delay=max_hop_delay, decode=store.msisdns.decode, windows=windows,
+        risk_rules=risk_rules,
+        chain_budget=chain_budget.exploration() if windowed and chain_budget else chain_budget, **options
+    )
+    if windowed:
+        scenarios = {
+            name: table[table['date'] == day].reset_index(drop=True)
+            for name, table in scenarios.items()
+        }
+        if chain_budget:
+            pruned = Counter()
+            scenarios['chains'] = top_chains(scenarios['chains'], chain_budget.top_k, pruned)
+            report_pruned(pruned)
+    return partials, peaks, scenarios
+
+
+# Stockage ouvert une fois par processus de travail (voir _init_worker)
+_worker_store = None
+
+
+def _init_worker(store_dir):
+    global _worker_store
+    _worker_store = TransactionStore(store_dir)
+
+
+def _run_days(days, params):
+    return [_run_day(_worker_store, day, **params) for day in days]
+
+
+def _day_groups(days, workers):
+    """Découpe les jours en groupes contigus, quelques tâches par processus."""
+    count = min(len(days), workers * TASKS_PER_WORKER)
+    size, extra = divmod(len(days), count)
+    groups, start = [], 0
+    for index in range(count):
+        stop = start + size + (index < extra)
+        groups.append(days[start:stop])
+        start = stop
+    return groups
+
+
+def _run_days_parallel(store, days, workers, params):
+    """
+    Exécute les journées dans un pool de processus.
+
+    Chaque processus ouvre le stockage par memory-map et ne reçoit que la
+    liste de ses jours ; les résultats sont renvoyés dans l'ordre des jours.
+    """
+    groups = _day_groups(days, workers)
+    with ProcessPoolExecutor(max_workers=min(workers, len(groups)), initializer=_init_worker,
+                             initargs=(store.store_dir,)) as executor:
+        return [
+            day_result
+            for group_results in executor.map(_run_days, groups, repeat(params))
+            for day_result in group_results
+        ]
+
+
+def run_partitioned(store, max_depth=10, max_hop_delay=None, workers=1, windows=None, risk_rules=None,
+                    velocity_windows=VELOCITY_WINDOWS, velocity_ratio=VELOCITY_BURST_RATIO, **options):
+    """
+    Exécute tous les détecteurs jour par jour sur un TransactionStore.
+
+    Seule une journée est chargée en mémoire à la fois (par processus), avec
+    les MSISDN sous forme de codes entiers ; les détections simples sont
+    combinées à partir d'agrégats partiels journaliers et les MSISDN ne sont
+    décodés qu'à la fin. Les résultats sont fusionnés dans l'ordre des jours,
+    quel que soit le nombre de processus.
+
+    Args:
+        store: TransactionStore (voir store.build_store)
+        workers: nombre de processus (1 = exécution séquentielle, None ou 0 = nombre de cœurs)
+        windows: fenêtres glissantes par scénario (voir run_scenarios) ; les
+            jours suivants couverts par les fenêtres sont chargés avec chaque jour
+        risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+        velocity_windows, velocity_ratio: rafales de vélocité (voir run_detectors) ;
+            pics calculés jour par jour, habitudes des portefeuilles sur toute la période
+        options: options B2W → Send Money → W2B, des chaînes et des anneaux
+            (amount_tolerance, max_candidates, chain_budget, ring_*, voir run_scenarios) ;
+            les top_k chaînes de chaque jour sont fusionnées puis les top_k de la
+            période retenues
+
+    Returns:
+        dict nom de résultat → DataFrame
+    """
+    params = {
+        'max_depth': max_depth, 'max_hop_delay': max_hop_delay, 'windows': validate_windows(windows),
+        'risk_rules': risk_rules, 'velocity_windows': velocity_windows, **options,
+    }
+    # Aucun jour : une passe sur des sous-ensembles vides (tableaux vides typés)
+    days = store.days() or [None]
+    workers = resolve_workers(workers)
+
+    day_results = None
+    if workers > 1 and len(days) > 1:
+        # Les étapes exécutées dans les processus de travail ne sont pas détaillées
+        with stage('days_parallel', rows_in=len(days)):
+            try:
+                day_results = _run_days_parallel(store, days, workers, params)
+            except (OSError, BrokenProcessPool, NotImplementedError) as exc:
+                warnings.warn(f"Exécution parallèle impossible ({exc}), repli sur l'exécution séquentielle")
+    if day_results is None:
+        day_results = []
+        for day in days:
+            with stage('day') as record:
+                record['day'] = str(day)
+                day_results.append(_run_day(store, day, **params))
+
+    partials = [partial for partial, _, _ in day_results]
+    peaks = [day_peaks for _, day_peaks, _ in day_results]
+    scenarios = {
+        name: [scenario_results[name] for _, _, scenario_results in day_results]
+        for name in SCENARIO_RESULTS
+    }
+    with stage('finalize'):
+        results = combine_repeats(partials)
+        results['velocity'] = velocity_bursts(
+            pd.concat([table for table in peaks if not table.empty] or peaks[:1], ignore_index=True),
+            velocity_windows, velocity_ratio, risk_rules
+        )
+        for name, tables in scenarios.items():
+            # Les journées sans cas ne doivent pas imposer leurs types (object) aux autres
+            results[name] = pd.concat([table for table in tables if not table.empty] or tables[:1],
+                                      ignore_index=True)
+        chain_budget = options.get('chain_budget')
+        if chain_budget:
+            pruned = Counter()
+            results['chains'] = top_chains(results['chains'], chain_budget.top_k, pruned)
+            report_pruned(pruned)
+        decode = store.msisdns.decode
+        return finalize_results(decode_results(results, decode), risk_rules)
+
+
+def run_detection(*sources, streaming=False, store_dir=None, chunksize=DEFAULT_CHUNKSIZE, classifier=None,
+                  workers=1, backend='pandas', memory_limit=None, **params):
+    """
+    Charge un ou plusieurs fichiers CSV et exécute tous les détecteurs.
+
+    Args:
+        sources: chemins ou objets fichiers CSV
+        streaming: lecture par blocs et détection jour par jour (mémoire bornée)
+        store_dir: dossier du stockage colonnaire en mode streaming ou parallèle
+            (réutilisé si les fichiers sources n'ont pas changé ; dossier
+            temporaire si absent)
+        chunksize: nombre de lignes par bloc en mode streaming
+        classifier: TransactionClassifier, défaut règles de config/transaction_types.json
+        workers: nombre de processus pour les détecteurs journaliers
+            (1 = séquentiel, None ou 0 = nombre de cœurs) ; threads DuckDB
+            avec le backend duckdb
+        backend: 'pandas' (en mémoire) ou 'duckdb' (SQL hors mémoire, voir
+            sql_backend ; base dans store_dir si fourni)
+        memory_limit: limite mémoire de DuckDB (ex. '4GB'), backend duckdb seulement
+        params: paramètres transmis aux détecteurs
+
+    Returns:
+        dict nom de résultat → DataFrame
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend inconnu : {backend} ({', '.join(BACKENDS)})")
+    if backend == 'duckdb':
+        # Dépendance optionnelle, importée seulement si le backend est choisi
+        from .sql_backend import DATABASE_FILE, run_sql_detection
+
+        if store_dir is not None:
+            os.makedirs(store_dir, exist_ok=True)
+        return run_sql_detection(
+            *sources, classifier=classifier, memory_limit=memory_limit, threads=resolve_workers(workers),
+            database=os.path.join(store_dir, DATABASE_FILE) if store_dir else None, **params
+        )
+
+    # Le mode parallèle partage les journées entre processus via le stockage colonnaire
+    if streaming or resolve_workers(workers) > 1:
+        if store_dir is None:
+            with tempfile.TemporaryDirectory(prefix='fraud_store_') as temporary_dir:
+                with stage('store'):
+                    store = build_store(sources, temporary_dir, chunksize=chunksize, classifier=classifier)
+                return run_partitioned(store, workers=workers, **params)
+        with stage('store'):
+            store = build_store(sources, store_dir, chunksize=chunksize, classifier=classifier)
+        return run_partitioned(store, workers=workers, **params)
+
+    with stage('load') as record:
+        df = load_transactions(*sources)
+        record['rows_out'] = len(df)
+    with stage('classify', rows_in=len(df)) as record:
+        types = classify_transactions(df, classifier)
+        record['rows_out'] = sum(len(types.indices(tx_type)) for tx_type in types)
+    return run_detectors(types, **params)
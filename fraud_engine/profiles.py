@@ -0,0 +1,323 @@
+"""
+Historique persistant des agrégats par couple et par bénéficiaire
+
+Chaque fichier ajouté est lu par blocs (ingest.iter_chunks), classé, puis
+réduit à des agrégats journaliers par type de transaction, écrits une fois
+pour toutes :
+
+    <profile_dir>/pairs/DATE=2024-01-31/TYPE=mp/<empreinte>.parquet       par (DEBIT_MSISDN, CREDIT_MSISDN)
+    <profile_dir>/receivers/DATE=2024-01-31/TYPE=redeem/<empreinte>.parquet   par CREDIT_MSISDN
+    <profile_dir>/profiles.json   métadonnées (fichiers ajoutés, règles de classification)
+
+Agrégats : nombre de transactions, nombre et somme des montants, première et
+dernière occurrence. Ajouter une journée coûte un temps proportionnel à sa
+taille ; les tableaux répétitifs (repeats.REPEAT_RESULTS) d'une période
+quelconque sont obtenus en combinant les seuls agrégats des jours demandés,
+sans relire les transactions. Les transactions sans date ne sont pas
+historisées.
+
+Chaque jour appartient à un seul fichier (liste `days` de sa source dans
+profiles.json) : un fichier qui couvre un jour déjà présent (réexport,
+export corrigé) est refusé, ou remplace les agrégats de ce jour avec
+replace=True (--replace).
+
+Exemple :
+    python -m fraud_engine.profiles historique/ ingest transactions_2024-01-*.csv
+    python -m fraud_engine.profiles historique/ ingest --replace transactions_2024-01-31_corrige.csv
+    python -m fraud_engine.profiles historique/ repeats --start 2024-01-01 --end 2024-01-31 -o resultats/
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .cache import content_hash
+from .classify import DEFAULT_CLASSIFIER, classify_transactions, load_classifier
+from .export import OUTPUT_FORMATS, write_results
+from .ingest import DEFAULT_CHUNKSIZE, iter_chunks
+from .repeats import PAIR_REPEATS, RECEIVER_VOLUMES, combine_repeats
+
+PROFILE_VERSION = 1
+METADATA_FILE = 'profiles.json'
+
+# Agrégat → clés de regroupement
+PROFILE_KEYS = {
+    'pairs': ['DEBIT_MSISDN', 'CREDIT_MSISDN'],
+    'receivers': ['CREDIT_MSISDN'],
+}
+
+PROFILE_COLUMNS = ['count', 'amount_count', 'amount_sum', 'first_seen', 'last_seen']
+
+# Combinaison de deux agrégats de mêmes clés
+_COMBINE = {'count': 'sum', 'amount_count': 'sum', 'amount_sum': 'sum', 'first_seen': 'min', 'last_seen': 'max'}
+
+
+def _aggregate(transactions, keys):
+    """Agrégats journaliers d'un type de transaction (colonnes DATE, clés, PROFILE_COLUMNS)."""
+    return (
+        transactions
+        .assign(amount=transactions['ACTUAL_AMOUNT'].astype('float64'))
+        .groupby(['DATE'] + keys, as_index=False, sort=False)
+        .agg(
+            count=('amount', 'size'),
+            amount_count=('amount', 'count'),
+            amount_sum=('amount', 'sum'),
+            first_seen=('INITATE_DATE', 'min'),
+            last_seen=('INITATE_DATE', 'max'),
+        )
+    )
+
+
+def _combine(frames, keys):
+    """Agrégats combinés par clés, triés comme un groupby pandas."""
+    return pd.concat(frames, ignore_index=True).groupby(keys, as_index=False).agg(_COMBINE)
+
+
+def _partition_dir(profile_dir, kind, day, tx_type):
+    return os.path.join(profile_dir, kind, f"DATE={day.isoformat()}", f"TYPE={tx_type}")
+
+
+class ProfileStore:
+    """Historique des agrégats, alimenté fichier par fichier et interrogé par période."""
+
+    def __init__(self, profile_dir, classifier=None):
+        """
+        Args:
+            profile_dir: dossier de l'historique (créé si besoin)
+            classifier: TransactionClassifier, défaut DEFAULT_CLASSIFIER ; doit
+                rester le même d'un ajout à l'autre
+        """
+        self.profile_dir = profile_dir
+        self._lock = threading.Lock()
+        self.classifier = classifier or DEFAULT_CLASSIFIER
+        path = os.path.join(profile_dir, METADATA_FILE)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as handle:
+                self.metadata = json.load(handle)
+        else:
+            self.metadata = {'version': PROFILE_VERSION, 'rules': self.classifier.metadata(), 'sources': {}}
+
+    def _save(self):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, METADATA_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+            json.dump(self.metadata, handle, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def days(self):
+        """Jours présents dans l'historique, triés chronologiquement."""
+        return sorted(self.day_sources())
+
+    def day_sources(self):
+        """
+        Fichier propriétaire de chaque jour de l'historique.
+
+        Returns:
+            dict jour (datetime.date) → empreinte du fichier
+        """
+        return {
+            datetime.date.fromisoformat(day): fingerprint
+            for fingerprint, source in self.metadata['sources'].items() for day in source['days']
+        }
+
+    def ingest(self, source, chunksize=DEFAULT_CHUNKSIZE, name=None, replace=False):
+        """
+        Ajoute un fichier de transactions à l'historique (sans effet s'il y est déjà).
+        Les ajouts concurrents (sessions Streamlit) sont sérialisés.
+
+        Args:
+            source: chemin, objet fichier CSV ou source base de données
+            chunksize: nombre de lignes lues par bloc
+            name: libellé enregistré dans les métadonnées, défaut str(source)
+            replace: remplacer les jours déjà présents (agrégats d'un autre
+                fichier) au lieu de refuser le fichier (ValueError)
+
+        Returns:
+            liste des jours ajoutés (vide si le fichier était déjà présent)
+        """
+        if self.metadata.get('version') != PROFILE_VERSION:
+            raise ValueError(
+                f"Historique {self.profile_dir} : version {self.metadata.get('version')} non prise en charge"
+            )
+        if self.metadata['rules'] != self.classifier.metadata():
+            raise ValueError(
+                f"Historique {self.profile_dir} : règles de classification différentes de celles de l'historique"
+            )
+        with self._lock:
+            fingerprint = content_hash(source)
+            if fingerprint in self.metadata['sources']:
+                return []
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            return self._ingest(source, fingerprint, chunksize, name, replace)
+
+    def _ingest(self, source, fingerprint, chunksize, name, replace):
+        partials = {(kind, tx_type): [] for kind in PROFILE_KEYS for tx_type in self.classifier.types}
+        rows = 0
+        for chunk in iter_chunks(source, chunksize):
+            rows += len(chunk)
+            for tx_type, subset in classify_transactions(chunk, self.classifier).items():
+                if subset.empty:
+                    continue
+                for kind, keys in PROFILE_KEYS.items():
+                    partials[kind, tx_type].append(_aggregate(subset, keys))
+
+        profiles = {}
+        for (kind, tx_type), frames in partials.items():
+            if frames:
+                keys = ['DATE'] + PROFILE_KEYS[kind]
+                profiles[kind, tx_type] = frames[0] if len(frames) == 1 else _combine(frames, keys)
+        days = {day for profile in profiles.values() for day in profile['DATE'].unique()}
+
+        # Un jour déjà couvert par un autre fichier serait compté deux fois
+        label = str(name if name is not None else getattr(source, 'name', source))
+        owners = self.day_sources()
+        overlap = sorted(day for day in days if day in owners)
+        if overlap and not replace:
+            raise ValueError(
+                f"Historique {self.profile_dir} : {label} couvre {len(overlap)} jour(s) déjà présent(s) "
+                f"({overlap[0]} → {overlap[-1]}), utiliser replace=True (--replace) pour les remplacer"
+            )
+        for day in overlap:
+            self._drop_day(day, owners[day])
+
+        for (kind, tx_type), profile in profiles.items():
+            for day, day_rows in profile.groupby('DATE', sort=False):
+                directory = _partition_dir(self.profile_dir, kind, day, tx_type)
+                os.makedirs(directory, exist_ok=True)
+                pq.write_table(
+                    pa.Table.from_pandas(day_rows.drop(columns='DATE'), preserve_index=False),
+                    os.path.join(directory, f"{fingerprint}.parquet")
+                )
+
+        self.metadata['sources'][fingerprint] = {
+            'name': label,
+            'rows': rows,
+            'days': sorted(day.isoformat() for day in days),
+        }
+        self._save()
+        return sorted(days)
+
+    def _drop_day(self, day, fingerprint):
+        """Retire d'un fichier les agrégats d'un jour (la source reste connue, même sans jour)."""
+        for kind in PROFILE_KEYS:
+            for tx_type in self.classifier.types:
+                path = os.path.join(_partition_dir(self.profile_dir, kind, day, tx_type), f"{fingerprint}.parquet")
+                if os.path.exists(path):
+                    os.remove(path)
+        source = self.metadata['sources'][fingerprint]
+        source['days'] = [other for other in source['days'] if other != day.isoformat()]
+
+    def profiles(self, kind, tx_type, start=None, end=None):
+        """
+        Agrégats d'un type de transaction sur une période.
+
+        Args:
+            kind: 'pairs' (par couple DEBIT_MSISDN, CREDIT_MSISDN) ou 'receivers' (par CREDIT_MSISDN)
+            tx_type: type de transaction
+            start: premier jour (date), None = depuis le début de l'historique
+            end: dernier jour inclus (date), None = jusqu'à la fin de l'historique
+
+        Returns:
+            DataFrame (clés, count, amount_count, amount_sum, first_seen, last_seen) trié par clés
+        """
+        keys = PROFILE_KEYS[kind]
+        frames = []
+        for day in self.days():
+            if (start is not None and day < start) or (end is not None and day > end):
+                continue
+            directory = _partition_dir(self.profile_dir, kind, day, tx_type)
+            if os.path.isdir(directory):
+                frames.extend(
+                    pq.read_table(os.path.join(directory, name), memory_map=True).to_pandas()
+                    for name in sorted(os.listdir(directory))
+                )
+        if not frames:
+            empty = {key: pd.Series(dtype='str') for key in keys}
+            empty.update({
+                'count': pd.Series(dtype='int64'), 'amount_count': pd.Series(dtype='int64'),
+                'amount_sum': pd.Series(dtype='float64'),
+                'first_seen': pd.Series(dtype='datetime64[us]'), 'last_seen': pd.Series(dtype='datetime64[us]'),
+            })
+            return pd.DataFrame(empty)
+        return _combine(frames, keys)
+
+    def repeats(self, start=None, end=None):
+        """
+        Tableaux répétitifs d'une période, identiques à repeats.detect_repeats sur
+        les transactions de ces jours.
+
+        Returns:
+            dict nom de résultat (repeats.REPEAT_RESULTS) → DataFrame
+        """
+        partial = {}
+        for name, (tx_type, count_column, _) in PAIR_REPEATS.items():
+            pairs = self.profiles('pairs', tx_type, start, end)
+            partial[name] = pairs[PROFILE_KEYS['pairs'] + ['count']].rename(columns={'count': count_column})
+        for name, tx_type in RECEIVER_VOLUMES.items():
+            receivers = self.profiles('receivers', tx_type, start, end)
+            partial[name] = receivers[['CREDIT_MSISDN', 'amount_count', 'amount_sum']].rename(
+                columns={'amount_count': 'volume', 'amount_sum': 'valeur'}
+            )
+        return combine_repeats([partial])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='fraud_engine.profiles',
+        description="Historique persistant des agrégats par couple et par bénéficiaire."
+    )
+    parser.add_argument('profile_dir', help="Dossier de l'historique")
+    parser.add_argument('--types-config', default=None,
+                        help="Fichier JSON des règles de classification (identique d'un ajout à l'autre)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help="Ajouter des fichiers CSV à l'historique")
+    ingest.add_argument('inputs', nargs='+', help="Fichiers CSV de transactions")
+    ingest.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="Nombre de lignes lues par bloc")
+    ingest.add_argument('--replace', action='store_true',
+                        help="Remplacer les jours déjà présents dans l'historique (export corrigé)")
+
+    repeats = commands.add_parser('repeats', help="Écrire les tableaux répétitifs d'une période")
+    repeats.add_argument('--start', type=datetime.date.fromisoformat, default=None, help="Premier jour (AAAA-MM-JJ)")
+    repeats.add_argument('--end', type=datetime.date.fromisoformat, default=None,
+                         help="Dernier jour inclus (AAAA-MM-JJ)")
+    repeats.add_argument('-o', '--output-dir', default='resultats', help="Dossier de sortie")
+    repeats.add_argument('--format', choices=OUTPUT_FORMATS, default='parquet',
+                         help="Format des tableaux écrits")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    store = ProfileStore(args.profile_dir, load_classifier(args.types_config))
+    if args.command == 'ingest':
+        for path in args.inputs:
+            owners = store.day_sources()
+            try:
+                days = store.ingest(path, chunksize=args.chunksize, replace=args.replace)
+            except ValueError as exc:
+                print(f"❌ {exc}")
+                return 1
+            replaced = [day for day in days if day in owners]
+            if days:
+                print(f"✅ {path} : {len(days)} jour(s) ajouté(s) ({days[0]} → {days[-1]})"
+                      + (f", dont {len(replaced)} remplacé(s)" if replaced else ""))
+            else:
+                print(f"↩️ {path} : déjà dans l'historique")
+    else:
+        results = store.repeats(args.start, args.end)
+        write_results(results, args.output_dir, args.format)
+        for name, table in results.items():
+            print(f"   {name}: {len(table)} lignes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
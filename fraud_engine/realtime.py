@@ -0,0 +1,394 @@
+"""
+Détection en temps réel : transactions reçues une à une ou par micro-lots
+
+Le moteur reçoit les transactions dans l'ordre chronologique et conserve, par
+MSISDN, un état borné dans le temps :
+    - les Cash In reçus par chaque client (scénarios circulaire et Cash In → W2B) ;
+    - les paiements marchands en attente d'un Cash Out de même montant ;
+    - les B2W reçus et les couples B2W → Send Money en attente d'un W2B ;
+    - les chaînes Cash In → Send Money (N) ouvertes, indexées par leur dernier client.
+
+Une alerte est émise dès l'arrivée de la transaction qui clôt le scénario, avec
+les mêmes colonnes, risk_score et flags que la détection par lots. Comme pour
+celle-ci, les scénarios sont limités à une journée : l'état est vidé au
+changement de jour, et une fenêtre (window_minutes) peut le borner davantage.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from operator import itemgetter
+
+import pandas as pd
+
+from .b2w_chain import B2W_SEND_W2B_COLUMNS
+from .b2w_chain import SCENARIO as B2W_SCENARIO
+from .cashin_w2b import CASHIN_W2B_COLUMNS
+from .cashin_w2b import SCENARIO as CASHIN_W2B_SCENARIO
+from .chains import CHAIN_METRICS, chain_record, score_chains
+from .circular import CIRCULAR_COLUMNS, score_circular
+from .classify import DEFAULT_CLASSIFIER
+from .loader import CSV_DTYPES
+
+# Scénarios détectés en temps réel (mêmes noms que les résultats par lots)
+STREAM_RESULTS = ['circular', 'cashin_w2b', 'chains', 'b2w_send_w2b']
+
+# Nombre de transactions entre deux purges complètes de l'état expiré
+SWEEP_EVERY = 10_000
+
+_NS_PER_MINUTE = 60 * 1_000_000_000
+
+_time = itemgetter(0)
+
+
+def _timestamp(time_ns):
+    return pd.Timestamp(time_ns)
+
+
+def _amount_key(amount):
+    """Montant en unités mineures (même arrondi que circular.amount_to_int)."""
+    return int(round(amount * 100))
+
+
+def _minutes(delta_ns):
+    return delta_ns / _NS_PER_MINUTE
+
+
+def _prune(entries, cutoff):
+    """Retire en tête de liste (triée par temps) les entrées antérieures à `cutoff`."""
+    expired = bisect_left(entries, cutoff, key=_time)
+    if expired:
+        del entries[:expired]
+
+
+class StreamingDetector:
+    """Moteur de détection incrémental à état par MSISDN."""
+
+    def __init__(self, window_minutes=None, max_depth=10, max_hop_delay=None, classifier=None, risk_rules=None):
+        """
+        Args:
+            window_minutes: durée de conservation de l'état (minutes), None = la journée
+            max_depth: Profondeur maximale des chaînes (nombre max de Send Money + 1)
+            max_hop_delay: Délai maximal (minutes) entre deux étapes d'une chaîne
+            classifier: TransactionClassifier, défaut DEFAULT_CLASSIFIER
+            risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+        """
+        self.window_ns = None if window_minutes is None else int(window_minutes * _NS_PER_MINUTE)
+        self.max_depth = max_depth
+        self.hop_ns = None if max_hop_delay is None else int(max_hop_delay * _NS_PER_MINUTE)
+        self.classifier = classifier or DEFAULT_CLASSIFIER
+        self.risk_rules = risk_rules
+        self.events = 0
+        self.last_time = None
+        self._alerts = {name: [] for name in STREAM_RESULTS}
+        self._reset_day(None)
+
+        self._handlers = {
+            'cashin': self._on_cashin,
+            'mp': self._on_merchant_payment,
+            'cashout': self._on_cashout,
+            'b2w': self._on_b2w,
+            'send': self._on_send,
+            'w2b': self._on_w2b,
+        }
+
+    def _reset_day(self, day):
+        self.day = day
+        # client → [(temps, distributeur, montant)]
+        self.cashins = defaultdict(list)
+        # (marchand, montant en unités mineures) → [(temps, paiement...)]
+        self.pending_payments = defaultdict(list)
+        # client A → [(temps, banque, montant)]
+        self.b2w_received = defaultdict(list)
+        # client B → [(temps du Send Money, B2W, client A, montant)]
+        self.pending_sends = defaultdict(list)
+        # dernier client → [(temps de la dernière étape, étapes, clients visités)]
+        self.open_chains = defaultdict(list)
+
+    def state_size(self):
+        """Nombre d'entrées conservées dans l'état, par catégorie."""
+        return {
+            'cashins': sum(map(len, self.cashins.values())),
+            'pending_payments': sum(map(len, self.pending_payments.values())),
+            'b2w_received': sum(map(len, self.b2w_received.values())),
+            'pending_sends': sum(map(len, self.pending_sends.values())),
+            'open_chains': sum(map(len, self.open_chains.values())),
+        }
+
+    def _cutoff(self, time_ns, hop=False):
+        """Temps en deçà duquel une entrée ne peut plus être appariée (None = aucun)."""
+        limits = [self.window_ns]
+        if hop:
+            limits.append(self.hop_ns)
+        limits = [limit for limit in limits if limit is not None]
+        return time_ns - min(limits) if limits else None
+
+    def _sweep(self, time_ns):
+        """Purge l'état expiré de tous les MSISDN."""
+        for state, hop in ((self.cashins, False), (self.pending_payments, False), (self.b2w_received, False),
+                           (self.pending_sends, False), (self.open_chains, True)):
+            cutoff = self._cutoff(time_ns, hop)
+            if cutoff is None:
+                continue
+            for key in list(state):
+                _prune(state[key], cutoff)
+                if not state[key]:
+                    del state[key]
+
+    def _live(self, state, key, time_ns, hop=False):
+        """Entrées encore valides d'un MSISDN (purgées à la volée)."""
+        entries = state.get(key)
+        if not entries:
+            return ()
+        cutoff = self._cutoff(time_ns, hop)
+        if cutoff is not None:
+            _prune(entries, cutoff)
+        return entries
+
+    # ------------------------------------------------------------------
+    # Transactions par type
+    # ------------------------------------------------------------------
+
+    def _on_cashin(self, time_ns, debit, credit, amount, reason):
+        self.cashins[credit].append((time_ns, debit, amount))
+        if self.max_depth >= 1:
+            step = ('cashin', debit, credit, amount, time_ns)
+            self.open_chains[credit].append((time_ns, (step,), frozenset()))
+
+    def _on_merchant_payment(self, time_ns, debit, credit, amount, reason):
+        # Dernier Cash In du client strictement avant le paiement
+        cashin = None
+        for entry in reversed(self._live(self.cashins, debit, time_ns)):
+            if entry[0] < time_ns:
+                cashin = entry
+                break
+        if cashin is None:
+            return
+        key = (credit, _amount_key(amount))
+        self.pending_payments[key].append((time_ns, debit, amount, reason, cashin[0], cashin[1]))
+
+    def _on_cashout(self, time_ns, debit, credit, amount, reason):
+        key = (debit, _amount_key(amount))
+        for mp_time, client, mp_amount, mp_reason, ci_time, cashin_from in self._live(
+                self.pending_payments, key, time_ns):
+            if mp_time >= time_ns:
+                continue
+            self._alerts['circular'].append({
+                'date': self.day,
+                'cashin_from': cashin_from,
+                'ci_time': _timestamp(ci_time),
+                'client': client,
+                'merchant': debit,
+                'mp_time': _timestamp(mp_time),
+                'mp_reason': mp_reason,
+                'bco_time': _timestamp(time_ns),
+                'bco_reason': reason,
+                'amount': mp_amount,
+                'cashout_to': credit,
+                'delay_minutes': _minutes(time_ns - mp_time),
+            })
+
+    def _on_b2w(self, time_ns, debit, credit, amount, reason):
+        self.b2w_received[credit].append((time_ns, debit, amount))
+
+    def _on_send(self, time_ns, debit, credit, amount, reason):
+        for b2w in self._live(self.b2w_received, debit, time_ns):
+            if b2w[0] < time_ns:
+                self.pending_sends[credit].append((time_ns, b2w, debit, amount))
+
+        # Prolonger les chaînes ouvertes au niveau de l'émetteur
+        step = ('send', debit, credit, amount, time_ns)
+        for last_time, steps, visited in list(self._live(self.open_chains, debit, time_ns, hop=True)):
+            # Au-delà de max_depth, les Send Money suivants ne seraient pas explorés
+            if last_time >= time_ns or credit in visited or len(steps) >= self.max_depth:
+                continue
+            self.open_chains[credit].append((time_ns, steps + (step,), visited | {credit}))
+
+    def _on_w2b(self, time_ns, debit, credit, amount, reason):
+        w2b_time = _timestamp(time_ns)
+
+        for ci_time, distributor, cashin_amount in self._live(self.cashins, debit, time_ns):
+            if ci_time >= time_ns:
+                continue
+            self._alerts['cashin_w2b'].append({
+                'date': self.day,
+                'Distributeur': distributor,
+                'client': debit,
+                'cashin_amount': cashin_amount,
+                'cashin_time': _timestamp(ci_time),
+                'w2b_amount': amount,
+                'w2b_time': w2b_time,
+                'Banque': credit,
+                'delay_minutes': _minutes(time_ns - ci_time),
+                'scenario': CASHIN_W2B_SCENARIO,
+            })
+
+        for send_time, (b2w_time, bank, b2w_amount), client_a, send_amount in self._live(
+                self.pending_sends, debit, time_ns):
+            if send_time >= time_ns:
+                continue
+            self._alerts['b2w_send_w2b'].append({
+                'date': self.day,
+                'Source Bank': bank,
+                'client_A': client_a,
+                'b2w_amount': b2w_amount,
+                'b2w_time': _timestamp(b2w_time),
+                'client_B': debit,
+                'send_amount': send_amount,
+                'sm_time_1': _timestamp(send_time),
+                'w2b_amount': amount,
+                'w2b_time': w2b_time,
+                'Destination Bank': credit,
+                'delay_B2W_to_Send_min': _minutes(send_time - b2w_time),
+                'delay_Send_to_W2B_min': _minutes(time_ns - send_time),
+                'scenario': B2W_SCENARIO,
+            })
+
+        w2b_step = ('w2b', debit, credit, amount, time_ns)
+        for last_time, steps, _ in self._live(self.open_chains, debit, time_ns, hop=True):
+            if last_time >= time_ns:
+                continue
+            chain = [_chain_step(step) for step in steps + (w2b_step,)]
+            self._alerts['chains'].append(chain_record(self.day, chain))
+
+    # ------------------------------------------------------------------
+    # Entrées
+    # ------------------------------------------------------------------
+
+    def process_batch(self, transactions, as_records=False):
+        """
+        Traite un micro-lot de transactions prétraitées.
+
+        Args:
+            transactions: DataFrame au format du loader (INITATE_DATE, DEBIT_MSISDN,
+                CREDIT_MSISDN, REASON_NAME en minuscules, ACTUAL_AMOUNT), postérieur
+                aux transactions déjà traitées
+            as_records: renvoyer les alertes brutes (listes de dict, sans risk_score
+                ni flags pour les scénarios notés) à convertir plus tard avec
+                alerts_to_frames, sans construire de DataFrame par micro-lot
+
+        Returns:
+            dict nom de scénario → DataFrame des alertes émises par ce lot
+            (colonnes identiques à la détection par lots)
+        """
+        df = transactions
+        if df['INITATE_DATE'].isna().any():
+            df = df[df['INITATE_DATE'].notna()]
+        if not df['INITATE_DATE'].is_monotonic_increasing:
+            df = df.sort_values('INITATE_DATE', kind='stable')
+        times = df['INITATE_DATE'].to_numpy(dtype='datetime64[ns]').view('int64')
+        if len(times) and self.last_time is not None and times[0] < self.last_time:
+            raise ValueError("Transactions reçues dans le désordre : l'horodatage doit être croissant")
+
+        days = df['DATE'] if 'DATE' in df.columns else df['INITATE_DATE'].dt.date
+        typed = self.classifier.classify(df)
+        handlers = [
+            (1 << code, self._handlers[tx_type])
+            for code, tx_type in enumerate(typed.types) if tx_type in self._handlers
+        ]
+
+        rows = zip(
+            times.tolist(), days.tolist(), typed.row_masks.tolist(),
+            df['DEBIT_MSISDN'].tolist(), df['CREDIT_MSISDN'].tolist(),
+            df['ACTUAL_AMOUNT'].tolist(), df['REASON_NAME'].tolist(),
+        )
+        for time_ns, day, mask, debit, credit, amount, reason in rows:
+            if day != self.day:
+                self._reset_day(day)
+            self.events += 1
+            if self.events % SWEEP_EVERY == 0:
+                self._sweep(time_ns)
+            if not mask or not isinstance(debit, str) or not isinstance(credit, str):
+                continue
+            for bit, handler in handlers:
+                if mask & bit:
+                    handler(time_ns, debit, credit, amount, reason)
+        if len(times):
+            self.last_time = times[-1]
+
+        alerts, self._alerts = self._alerts, {name: [] for name in STREAM_RESULTS}
+        return alerts if as_records else alerts_to_frames(alerts, self.risk_rules)
+
+    def process(self, transaction):
+        """
+        Traite une transaction isolée.
+
+        Args:
+            transaction: dict (colonnes du loader)
+
+        Returns:
+            dict nom de scénario → DataFrame des alertes émises
+        """
+        return self.process_batch(pd.DataFrame([transaction]))
+
+
+def _chain_step(step):
+    """Étape de chaîne au format de find_money_chains."""
+    step_type, sender, receiver, amount, time_ns = step
+    record = {'type': step_type, 'from': sender, 'to': receiver, 'amount': amount, 'time': _timestamp(time_ns)}
+    if step_type == 'cashin':
+        record['distributor'] = sender
+    elif step_type == 'w2b':
+        record['bank'] = receiver
+    return record
+
+
+# Colonnes de montant (float32 comme dans les fichiers chargés)
+_AMOUNT_COLUMNS = {
+    'circular': ['amount'],
+    'cashin_w2b': ['cashin_amount', 'w2b_amount'],
+    'b2w_send_w2b': ['b2w_amount', 'send_amount', 'w2b_amount'],
+    'chains': [],
+}
+
+_COLUMNS = {
+    'circular': [column for column in CIRCULAR_COLUMNS if column not in ('risk_score', 'flags')],
+    'cashin_w2b': CASHIN_W2B_COLUMNS,
+    'b2w_send_w2b': B2W_SEND_W2B_COLUMNS,
+    'chains': CHAIN_METRICS,
+}
+
+
+def _frame(name, records, risk_rules=None):
+    table = pd.DataFrame(records, columns=_COLUMNS[name])
+    for column in _AMOUNT_COLUMNS[name]:
+        table[column] = table[column].astype(CSV_DTYPES['ACTUAL_AMOUNT'])
+    if name == 'circular':
+        table = score_circular(table, risk_rules) if len(table) else pd.DataFrame(columns=CIRCULAR_COLUMNS)
+    elif name == 'chains':
+        table = score_chains(table, risk_rules)
+    return table
+
+
+# Tables vides (la plupart des micro-lots n'émettent aucune alerte)
+_EMPTY = {name: _frame(name, []) for name in STREAM_RESULTS}
+
+
+def alerts_to_frames(alerts, risk_rules=None):
+    """
+    Convertit les alertes (listes de dict) en DataFrames au format des lots.
+
+    Args:
+        alerts: dict nom de scénario → liste d'alertes (voir process_batch)
+        risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+
+    Returns:
+        dict nom de scénario → DataFrame
+    """
+    return {
+        name: _frame(name, alerts[name], risk_rules) if alerts[name] else _EMPTY[name].copy()
+        for name in STREAM_RESULTS
+    }
+
+
+def concat_alerts(batches):
+    """Concatène les alertes de plusieurs micro-lots."""
+    concatenated = {}
+    for name in STREAM_RESULTS:
+        tables = [batch[name] for batch in batches if len(batch[name])]
+        concatenated[name] = pd.concat(tables, ignore_index=True) if tables else _EMPTY[name].copy()
+    return concatenated
+
+
+def iter_batches(df, batch_size):
+    """Découpe un DataFrame prétraité en micro-lots consécutifs."""
+    for start in range(0, len(df), batch_size):
+        yield df.iloc[start:start + batch_size]
@@ -0,0 +1,129 @@
+"""
+Détections simples par agrégation : couples répétitifs et volumes par bénéficiaire
+"""
+import pandas as pd
+
+from .loader import CSV_DTYPES
+
+# Résultat → (type de transaction, colonne de comptage, nombre minimal d'occurrences)
+PAIR_REPEATS = {
+    # Paiements marchands répétitifs (> 2)
+    'repeat_mp': ('mp', 'nb_paiements', 3),
+    # Cash In répétitifs
+    'repeat_cashin': ('cashin', 'nb_cashin', 2),
+    # W2B répétitifs
+    'repeat_w2b': ('w2b', 'nb_W2B', 2),
+}
+
+# Résultat → type de transaction agrégé par bénéficiaire
+RECEIVER_VOLUMES = {
+    # Points de fidélité
+    'redeem': 'redeem',
+    # Cash In fragmenté
+    'cashin_volume': 'cashin',
+}
+
+# Ordre d'affichage / d'écriture des résultats
+REPEAT_RESULTS = ['repeat_mp', 'redeem', 'repeat_cashin', 'repeat_w2b', 'cashin_volume']
+
+
+def repeat_pairs(transactions, count_column, min_count):
+    """
+    Couples (DEBIT_MSISDN, CREDIT_MSISDN) apparaissant au moins `min_count` fois.
+
+    Args:
+        transactions: DataFrame d'un type de transaction
+        count_column: nom de la colonne de comptage en sortie
+        min_count: nombre minimal d'occurrences
+
+    Returns:
+        DataFrame (DEBIT_MSISDN, CREDIT_MSISDN, count_column)
+    """
+    counts = (
+        transactions.groupby(['DEBIT_MSISDN', 'CREDIT_MSISDN'], as_index=False)
+        .size()
+        .rename(columns={'size': count_column})
+    )
+    return counts[counts[count_column] >= min_count]
+
+
+def volume_by_receiver(transactions):
+    """
+    Volume (nombre) et valeur (somme) des transactions par CREDIT_MSISDN.
+
+    Returns:
+        DataFrame (CREDIT_MSISDN, volume, valeur)
+    """
+    return (
+        transactions.groupby('CREDIT_MSISDN', as_index=False)
+        .agg(
+            volume=('ACTUAL_AMOUNT', 'count'),
+            valeur=('ACTUAL_AMOUNT', 'sum')
+        )
+    )
+
+
+def detect_repeats(types):
+    """
+    Détections simples sur les sous-ensembles classifiés.
+
+    Args:
+        types: dict type → DataFrame (voir classify.classify_transactions)
+
+    Returns:
+        dict nom de résultat → DataFrame
+    """
+    results = {}
+    for name in REPEAT_RESULTS:
+        if name in PAIR_REPEATS:
+            tx_type, count_column, min_count = PAIR_REPEATS[name]
+            results[name] = repeat_pairs(types[tx_type], count_column, min_count)
+        else:
+            results[name] = volume_by_receiver(types[RECEIVER_VOLUMES[name]])
+    return results
+
+
+def partial_repeats(types):
+    """
+    Agrégats partiels (sans seuil) d'un sous-ensemble de transactions, par
+    exemple une journée, à combiner avec combine_repeats.
+
+    Returns:
+        dict nom de résultat → DataFrame partiel
+    """
+    partials = {}
+    for name in REPEAT_RESULTS:
+        if name in PAIR_REPEATS:
+            tx_type, count_column, _ = PAIR_REPEATS[name]
+            partials[name] = repeat_pairs(types[tx_type], count_column, 0)
+        else:
+            # Sommes partielles en float64 pour ne pas cumuler les arrondis float32
+            transactions = types[RECEIVER_VOLUMES[name]]
+            partials[name] = volume_by_receiver(
+                transactions.assign(ACTUAL_AMOUNT=transactions['ACTUAL_AMOUNT'].astype('float64'))
+            )
+    return partials
+
+
+def combine_repeats(partials):
+    """
+    Combine des agrégats partiels en résultats identiques à detect_repeats.
+
+    Args:
+        partials: liste de dict produits par partial_repeats
+
+    Returns:
+        dict nom de résultat → DataFrame
+    """
+    results = {}
+    for name in REPEAT_RESULTS:
+        combined = pd.concat([partial[name] for partial in partials], ignore_index=True)
+        if name in PAIR_REPEATS:
+            _, count_column, min_count = PAIR_REPEATS[name]
+            counts = combined.groupby(['DEBIT_MSISDN', 'CREDIT_MSISDN'], as_index=False)[count_column].sum()
+            results[name] = counts[counts[count_column] >= min_count]
+        else:
+            totals = combined.groupby('CREDIT_MSISDN', as_index=False)[['volume', 'valeur']].sum()
+            totals['valeur'] = totals['valeur'].astype(CSV_DTYPES['ACTUAL_AMOUNT'])
+            results[name] = totals
+    return results
@@ -0,0 +1,347 @@
+"""
+Anneaux de transferts : portefeuilles qui se renvoient l'argent en circuit fermé
+
+Un anneau est un cycle A → B → ... → A de Send Money (et, en option, de
+paiements marchands) dont chaque transfert suit strictement le précédent dans
+le temps. La recherche se fait en deux temps, sans filtrage ligne à ligne :
+
+    1. graphe creux (CSR, scipy.sparse) des portefeuilles, un nœud par
+       portefeuille et par jour (ou par portefeuille avec une fenêtre
+       glissante) ; seules les arêtes internes à une composante fortement
+       connexe de plus d'un nœud peuvent appartenir à un cycle, les autres
+       sont écartées en temps linéaire ;
+    2. extension des chemins niveau par niveau : les transferts suivants de
+       tous les chemins en cours sont générés d'un coup par plages d'indices
+       dans les transferts triés par (émetteur, temps), trouvées par
+       dichotomie vectorisée (searchsorted) ; les chemins qui reviennent à
+       leur premier portefeuille sont émis comme anneaux, ceux qui repassent
+       par un portefeuille déjà visité sont abandonnés.
+
+Chaque anneau est trouvé une seule fois, à partir de son premier transfert
+(le plus ancien, puisque les temps sont strictement croissants).
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from .instrument import count
+from .scheduler import checkpoint
+from .scoring import score_cases
+from .windows import key_codes, minutes_to_ns
+
+# Nombre maximal de transferts (et de portefeuilles) d'un anneau
+RING_MAX_LENGTH = 5
+
+# Nombre minimal de portefeuilles (2 = simple aller-retour A → B → A)
+RING_MIN_LENGTH = 3
+
+# Délai maximal par défaut entre deux transferts d'un anneau (minutes)
+RING_HOP_DELAY = 60
+
+# Nombre maximal de chemins en cours par niveau de recherche (mémoire bornée)
+RING_MAX_PATHS = 5_000_000
+
+RING_COLUMNS = [
+    'date', 'nb_wallets', 'wallets', 'start_time', 'end_time', 'duration_minutes',
+    'total_amount', 'amount_retention', 'nb_merchant_payments', 'component_size',
+    'risk_score', 'flags', 'full_ring',
+]
+
+# Métriques d'un anneau avant calcul du score (voir score_cases)
+RING_METRICS = [column for column in RING_COLUMNS if column not in ('risk_score', 'flags')]
+
+# Libellés des transferts dans full_ring (indice = type d'arête)
+SEND_EDGE, PAYMENT_EDGE = 0, 1
+_EDGE_LABELS = np.array(['SEND', 'MP'], dtype=object)
+
+_DAY_NS = 86_400 * 10 ** 9
+
+
+def _edges(send_all, mp_all):
+    """Transferts candidats (Send Money puis paiements marchands), triés par temps."""
+    columns = ['DEBIT_MSISDN', 'CREDIT_MSISDN', 'ACTUAL_AMOUNT', 'INITATE_DATE', 'DATE']
+    frames = [send_all[columns].assign(kind=SEND_EDGE)]
+    if mp_all is not None:
+        frames.append(mp_all[columns].assign(kind=PAYMENT_EDGE))
+    edges = pd.concat(frames, ignore_index=True).dropna(subset=columns[:2] + ['INITATE_DATE'])
+    edges = edges[edges['DEBIT_MSISDN'] != edges['CREDIT_MSISDN']]
+    return edges.sort_values('INITATE_DATE', kind='stable').reset_index(drop=True)
+
+
+def _cyclic_edges(senders, receivers):
+    """
+    Arêtes internes à une composante fortement connexe de plus d'un nœud.
+
+    Returns:
+        (masque des arêtes, composante de chaque nœud, taille de chaque composante)
+    """
+    nodes = int(max(senders.max(), receivers.max())) + 1
+    graph = csr_matrix((np.ones(len(senders), dtype='int8'), (senders, receivers)), shape=(nodes, nodes))
+    _, labels = connected_components(graph, directed=True, connection='strong')
+    sizes = np.bincount(labels)
+    cyclic = (labels[senders] == labels[receivers]) & (sizes[labels[senders]] > 1)
+    return cyclic, labels, sizes
+
+
+def _window_component_sizes(senders, receivers, times, firsts, horizon_ns):
+    """
+    Taille de la composante fortement connexe du premier transfert de chaque
+    anneau (fenêtre glissante), dans le graphe des transferts de son jour de
+    départ et de l'horizon qui le suit : la taille ne dépend pas des jours
+    chargés autour (mêmes valeurs en mémoire et en mode --streaming).
+
+    Args:
+        senders, receivers, times: transferts triés par temps (times en ns)
+        firsts: indices des premiers transferts des anneaux
+        horizon_ns: durée maximale d'un anneau après minuit (ns), None = illimitée
+
+    Returns:
+        tableau des tailles, aligné sur firsts
+    """
+    nodes = int(max(senders.max(), receivers.max())) + 1
+    starts = times[firsts] - times[firsts] % _DAY_NS
+    result = np.empty(len(firsts), dtype='int64')
+    for day in np.unique(starts):
+        lo = np.searchsorted(times, day, side='left')
+        hi = len(times) if horizon_ns is None else np.searchsorted(times, day + _DAY_NS + horizon_ns, side='left')
+        graph = csr_matrix(
+            (np.ones(hi - lo, dtype='int8'), (senders[lo:hi], receivers[lo:hi])), shape=(nodes, nodes)
+        )
+        _, labels = connected_components(graph, directed=True, connection='strong')
+        selected = starts == day
+        result[selected] = np.bincount(labels)[labels[senders[firsts[selected]]]]
+    return result
+
+
+class _TransferGraph:
+    """
+    Transferts triés par (émetteur, temps), comme les lignes d'une matrice CSR
+    dont les colonnes seraient ordonnées par temps : les transferts émis par
+    le destinataire d'un transfert e après lui (et au plus délai après)
+    forment une plage d'indices [next_lo[e], next_hi[e]), calculée une fois
+    pour tous les transferts par dichotomie sur une clé composite (nœud,
+    rang du temps).
+    """
+
+    def __init__(self, senders, receivers, times, max_delay_ns=None):
+        unique_times, time_rank = np.unique(times, return_inverse=True)
+        width = len(unique_times) + 1
+        keys = senders.astype('int64') * width + time_rank
+        self.order = np.argsort(keys, kind='stable')
+        keys = keys[self.order]
+
+        base = receivers.astype('int64') * width
+        if max_delay_ns is None:
+            limit = np.full(len(times), width - 1)
+        else:
+            limit = np.searchsorted(unique_times, times + max_delay_ns, side='right') - 1
+        self.next_lo = self._search(keys, base + time_rank, 'right')
+        self.next_hi = np.maximum(self._search(keys, base + limit, 'right'), self.next_lo)
+
+    @staticmethod
+    def _search(keys, values, side):
+        """searchsorted sur des valeurs triées au préalable (accès mémoire séquentiels)."""
+        order = np.argsort(values, kind='stable')
+        positions = np.empty(len(values), dtype='int64')
+        positions[order] = np.searchsorted(keys, values[order], side=side)
+        return positions
+
+
+def find_ring_paths(senders, receivers, times, max_length=RING_MAX_LENGTH, min_length=RING_MIN_LENGTH,
+                    max_hop_delay=RING_HOP_DELAY, max_paths=RING_MAX_PATHS):
+    """
+    Cycles temporels d'un graphe de transferts, par extension vectorisée des chemins.
+
+    Args:
+        senders, receivers: codes entiers des nœuds émetteur et destinataire de chaque transfert
+        times: horodatages des transferts (int64, ns)
+        max_length: nombre maximal de transferts d'un cycle
+        min_length: nombre minimal de transferts d'un cycle
+        max_hop_delay: délai maximal (minutes) entre deux transferts, None = illimité
+        max_paths: nombre maximal de chemins candidats par niveau (ceux des
+            premiers transferts sont conservés), None = illimité
+
+    Returns:
+        liste de tableaux (cycles × longueur) d'indices de transferts, un par
+        longueur de cycle trouvée, dans l'ordre des transferts
+    """
+    graph = _TransferGraph(
+        senders, receivers, times, None if max_hop_delay is None else minutes_to_ns(max_hop_delay)
+    )
+    paths = np.arange(len(senders))[:, None]   # indices des transferts de chaque chemin
+    visited = np.stack([senders, receivers], axis=1)
+    cycles, truncated = [], 0
+    for length in range(2, max_length + 1):
+        if not len(paths):
+            break
+        checkpoint()
+        last = paths[:, -1]
+        lo = graph.next_lo[last]
+        lengths = graph.next_hi[last] - lo
+        if max_paths is not None and lengths.sum() > max_paths:
+            # Chemins candidats bornés avant d'être matérialisés
+            allowed = np.clip(max_paths - (np.cumsum(lengths) - lengths), 0, lengths)
+            truncated += int(lengths.sum() - max_paths)
+            lengths = allowed
+        starts = np.cumsum(lengths) - lengths
+        left = np.repeat(np.arange(len(paths)), lengths)
+        following = graph.order[np.repeat(lo, lengths) + np.arange(len(left)) - np.repeat(starts, lengths)]
+        count(f'ring_level{length}', len(left))
+
+        hits = visited[left] == receivers[following][:, None]
+        closed = hits[:, 0]
+        if length >= min_length and closed.any():
+            cycles.append(np.column_stack([paths[left[closed]], following[closed]]))
+
+        # Chemins prolongés : aucun portefeuille déjà visité
+        if length < max_length:
+            extended = ~hits.any(axis=1)
+            left, following = left[extended], following[extended]
+            paths = np.column_stack([paths[left], following])
+            visited = np.column_stack([visited[left], receivers[following]])
+    if truncated:
+        count('ring_truncated_paths', truncated)
+        warnings.warn(f"Anneaux : {truncated} chemin(s) au-delà de {max_paths} par niveau non explorés")
+    return cycles
+
+
+def _ring_metrics(edges, cycles, component_sizes, decode):
+    """Métriques des anneaux (colonnes RING_METRICS) à partir des indices de leurs transferts."""
+    senders = edges['DEBIT_MSISDN'].to_numpy()
+    if decode is not None:
+        senders = decode(senders)
+    senders = np.asarray(senders, dtype=object).astype(str).astype(object)
+    times = edges['INITATE_DATE'].to_numpy(dtype='datetime64[ns]')
+    amounts = edges['ACTUAL_AMOUNT'].to_numpy(dtype='float64')
+    kinds = edges['kind'].to_numpy()
+    days = edges['DATE'].to_numpy(dtype=object)
+
+    frames = []
+    for cycle in cycles:
+        first, last = cycle[:, 0], cycle[:, -1]
+        wallets = senders[first]
+        full_ring = _EDGE_LABELS[kinds[first]] + '(' + np.char.mod('%.0f', amounts[first]).astype(object) + ')'
+        for step in range(1, cycle.shape[1]):
+            wallets = wallets + ' → ' + senders[cycle[:, step]]
+            full_ring = (full_ring + ' → ' + _EDGE_LABELS[kinds[cycle[:, step]]] + '('
+                         + np.char.mod('%.0f', amounts[cycle[:, step]]).astype(object) + ')')
+        wallets = wallets + ' → ' + senders[first]
+        duration = (times[last] - times[first]) / np.timedelta64(1, 'm')
+        first_amount = amounts[first]
+        retention = np.divide(amounts[last], first_amount, out=np.full(len(cycle), np.nan),
+                              where=first_amount != 0)
+        frames.append(pd.DataFrame({
+            'date': days[first],
+            'nb_wallets': np.full(len(cycle), cycle.shape[1], dtype='int64'),
+            'wallets': wallets,
+            'start_time': times[first],
+            'end_time': times[last],
+            'duration_minutes': np.round(duration, 2),
+            'total_amount': np.round(amounts[cycle].sum(axis=1), 2),
+            'amount_retention': np.round(retention, 4),
+            'nb_merchant_payments': (kinds[cycle] == PAYMENT_EDGE).sum(axis=1),
+            'component_size': component_sizes[first],
+            'full_ring': full_ring,
+            '_order': first,
+        }))
+    rings = pd.concat(frames, ignore_index=True)
+    # Ordre des premiers transferts, puis du nombre de portefeuilles
+    return rings.sort_values(['_order', 'nb_wallets'], kind='stable').drop(columns='_order')
+
+
+def detect_rings(send_all, mp_all=None, max_length=RING_MAX_LENGTH, min_length=RING_MIN_LENGTH,
+                 max_hop_delay=RING_HOP_DELAY, by_day=True, decode=None, risk_rules=None, max_paths=RING_MAX_PATHS):
+    """
+    Détecte les anneaux de transferts A → B → ... → A à temps croissants.
+
+    Args:
+        send_all: DataFrame des Send Money
+        mp_all: DataFrame des paiements marchands ajoutés au graphe, None = Send Money seulement
+        max_length: nombre maximal de portefeuilles (et de transferts) d'un anneau
+        min_length: nombre minimal de portefeuilles d'un anneau
+        max_hop_delay: délai maximal (minutes) entre deux transferts, None =
+            illimité (à réserver aux petits volumes : le nombre de chemins croît
+            avec le nombre de transferts suivants de chaque portefeuille)
+        by_day: limiter chaque anneau au jour de son premier transfert ; sinon
+            seul max_hop_delay borne l'anneau (fenêtre glissante, y compris après minuit)
+        decode: fonction vectorisée code → MSISDN si les MSISDN sont encodés
+        risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+        max_paths: nombre maximal de chemins candidats par niveau de recherche
+            (mémoire bornée, avertissement si atteint), None = illimité
+
+    Returns:
+        DataFrame des anneaux (colonnes RING_COLUMNS), dans l'ordre de leur premier transfert
+    """
+    edges = _edges(send_all, mp_all)
+    count('ring_edges', len(edges))
+    if len(edges) < min_length:
+        return pd.DataFrame(columns=RING_COLUMNS)
+
+    # Nœuds du graphe : portefeuille, ou couple (portefeuille, jour)
+    by = (edges['DATE'], edges['DATE']) if by_day else None
+    senders, receivers = key_codes(edges['DEBIT_MSISDN'], edges['CREDIT_MSISDN'], by=by)
+    cyclic, labels, sizes = _cyclic_edges(senders, receivers)
+    count('ring_scc_edges', int(cyclic.sum()))
+    if cyclic.sum() < min_length:
+        return pd.DataFrame(columns=RING_COLUMNS)
+
+    all_times = edges['INITATE_DATE'].to_numpy(dtype='datetime64[ns]').view('int64')
+    kept = np.flatnonzero(cyclic)
+    edges = edges.iloc[kept].reset_index(drop=True)
+    cycles = find_ring_paths(
+        senders[kept], receivers[kept], all_times[kept], max_length, min_length, max_hop_delay, max_paths
+    )
+    count('rings_found', sum(map(len, cycles)))
+    if not cycles:
+        return pd.DataFrame(columns=RING_COLUMNS)
+
+    if by_day:
+        component_sizes = sizes[labels[senders[kept]]]
+    else:
+        # Composantes du graphe global : elles dépendraient de la période chargée
+        firsts = np.unique(np.concatenate([cycle[:, 0] for cycle in cycles]))
+        horizon = None if max_hop_delay is None else minutes_to_ns(max_hop_delay) * (max_length - 1)
+        component_sizes = np.zeros(len(kept), dtype='int64')
+        component_sizes[firsts] = _window_component_sizes(senders, receivers, all_times, kept[firsts], horizon)
+    rings = _ring_metrics(edges, cycles, component_sizes, decode)
+    return score_rings(rings.reset_index(drop=True), risk_rules)
+
+
+def score_rings(rings_df, risk_rules=None):
+    """
+    Ajoute risk_score et flags aux anneaux (règles « rings »).
+
+    Returns:
+        DataFrame (colonnes RING_COLUMNS)
+    """
+    return score_cases(rings_df, 'rings', risk_rules)[RING_COLUMNS]
+
+
+def ring_wallets(rings_df):
+    """
+    Portefeuilles impliqués dans les anneaux.
+
+    Returns:
+        DataFrame (wallet, nb_anneaux, montant_total, score_max), trié par
+        nombre d'anneaux décroissant
+    """
+    if rings_df.empty:
+        return pd.DataFrame(columns=['wallet', 'nb_anneaux', 'montant_total', 'score_max'])
+    # Le premier portefeuille est répété en fin d'anneau
+    wallets = rings_df['wallets'].str.split(' → ').str[:-1]
+    members = pd.DataFrame({
+        'wallet': wallets.explode().to_numpy(dtype=object),
+        'total_amount': np.repeat(rings_df['total_amount'].to_numpy(dtype='float64'), wallets.str.len()),
+        'risk_score': np.repeat(rings_df['risk_score'].to_numpy(dtype='int64'), wallets.str.len()),
+    })
+    return (
+        members.groupby('wallet', sort=False)
+        .agg(nb_anneaux=('risk_score', 'size'), montant_total=('total_amount', 'sum'),
+             score_max=('risk_score', 'max'))
+        .reset_index()
+        .sort_values(['nb_anneaux', 'score_max'], ascending=False, kind='stable')
+        .reset_index(drop=True)
+    )
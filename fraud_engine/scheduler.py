@@ -0,0 +1,292 @@
+"""
+Ordonnancement concurrent des étapes de détection
+
+Les étapes forment un graphe de dépendances (chargement → classification →
+détecteurs indépendants) : chaque étape démarre dès que ses dépendances sont
+terminées, dans un pool de threads (défaut : les DataFrames sont partagés sans
+copie et NumPy/pandas libèrent le GIL dans les opérations vectorisées) ou de
+processus. Scheduler.run rend la main à chaque étape terminée, ce qui permet
+d'afficher chaque résultat dès qu'il est prêt.
+
+Annulation : une étape en attente n'est jamais démarrée ; une étape en cours
+d'un pool de threads s'arrête au prochain point de contrôle (checkpoint(),
+appelé dans les boucles des détecteurs : lots de Cash In des chaînes,
+niveaux de recherche des anneaux, étapes des scénarios joints). Dans un pool de processus, une étape en cours ne peut pas
+être interrompue : elle est abandonnée et son résultat ignoré. Le budget de
+temps annule, à son échéance, toutes les étapes non terminées.
+
+Exemple :
+    scheduler = Scheduler(time_budget=60)
+    scheduler.add('types', classify_transactions, transactions)
+    scheduler.add('repeats', detect_repeats, after=['types'])
+    for name in scheduler.run():
+        print(name, scheduler.state(name))
+"""
+import contextvars
+import threading
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from .instrument import row_count
+
+# États d'une étape
+PENDING, RUNNING, DONE, FAILED, CANCELLED, TIMEOUT = 'pending', 'running', 'done', 'failed', 'cancelled', 'timeout'
+FINISHED_STATES = (DONE, FAILED, CANCELLED, TIMEOUT)
+
+_cancel_event = contextvars.ContextVar('fraud_engine_cancel', default=None)
+
+
+class Cancelled(Exception):
+    """Étape annulée (levée par checkpoint() ou par Scheduler.result)."""
+
+
+def checkpoint():
+    """Point d'annulation : lève Cancelled si l'étape en cours a été annulée (sans effet hors Scheduler)."""
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise Cancelled()
+
+
+class _Task:
+    def __init__(self, name, function, args, params, after):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.params = params
+        self.after = after
+        self.state = PENDING
+        self.started = None
+        self.wall_s = None
+        self.error = None
+        self.result = None
+        self.future = None
+        self.event = threading.Event()
+
+
+def _call_cancellable(event, function, args, params):
+    token = _cancel_event.set(event)
+    try:
+        checkpoint()
+        return function(*args, **params)
+    finally:
+        _cancel_event.reset(token)
+
+
+class Scheduler:
+    """Graphe d'étapes exécutées en parallèle dès que leurs dépendances sont prêtes."""
+
+    def __init__(self, workers=None, processes=False, time_budget=None):
+        """
+        Args:
+            workers: nombre d'étapes simultanées, None = défaut de concurrent.futures
+            processes: pool de processus (fonctions et résultats picklables,
+                dépendances copiées vers chaque processus) au lieu de threads
+            time_budget: durée maximale de run() (secondes), None = illimitée
+        """
+        self.workers = workers
+        self.processes = processes
+        self.time_budget = time_budget
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, function, *args, after=(), **params):
+        """
+        Ajoute une étape : function(*résultats de `after`, *args, **params).
+
+        Args:
+            name: nom unique de l'étape
+            function: fonction exécutée (picklable avec processes=True)
+            after: noms des étapes dont les résultats sont passés en premiers
+                arguments, dans l'ordre (déjà ajoutées : le graphe reste acyclique)
+
+        Returns:
+            self
+        """
+        if name in self._tasks:
+            raise ValueError(f"Étape {name!r} déjà ajoutée")
+        unknown = [dependency for dependency in after if dependency not in self._tasks]
+        if unknown:
+            raise ValueError(f"Étape {name!r} : dépendance(s) inconnue(s) {', '.join(map(repr, unknown))}")
+        self._tasks[name] = _Task(name, function, args, params, tuple(after))
+        return self
+
+    def __contains__(self, name):
+        return name in self._tasks
+
+    def state(self, name):
+        """État de l'étape (pending, running, done, failed, cancelled, timeout)."""
+        return self._tasks[name].state
+
+    def result(self, name):
+        """Résultat d'une étape terminée ; relève son erreur, Cancelled si elle a été annulée."""
+        task = self._tasks[name]
+        if task.state == DONE:
+            return task.result
+        if task.state == FAILED:
+            raise task.error
+        if task.state in (CANCELLED, TIMEOUT):
+            reason = 'interrompue (budget de temps)' if task.state == TIMEOUT else 'annulée'
+            raise Cancelled(f"Étape {name!r} {reason}")
+        raise RuntimeError(f"Étape {name!r} non terminée ({task.state})")
+
+    @property
+    def finished(self):
+        """Toutes les étapes sont terminées (quel que soit leur état)."""
+        return all(task.state in FINISHED_STATES for task in self._tasks.values())
+
+    def cancel(self, name=None, state=CANCELLED):
+        """
+        Annule une étape non terminée ; les étapes qui en dépendent sont
+        annulées à leur tour par run().
+
+        Args:
+            name: étape à annuler, None = toutes les étapes non terminées
+            state: état enregistré (CANCELLED ou TIMEOUT)
+
+        Returns:
+            noms des étapes annulées
+        """
+        with self._lock:
+            cancelled = []
+            for task in self._tasks.values():
+                if task.state in FINISHED_STATES:
+                    continue
+                if name is None or task.name == name:
+                    task.event.set()
+                    if task.future is not None:
+                        task.future.cancel()
+                    task.state = state
+                    if task.started is not None:
+                        task.wall_s = round(time.perf_counter() - task.started, 4)
+                    cancelled.append(task.name)
+            return cancelled
+
+    def progress(self):
+        """
+        Avancement des étapes.
+
+        Returns:
+            DataFrame (stage, state, wall_s, rows_out, error), temps écoulé pour les étapes en cours
+        """
+        now = time.perf_counter()
+        return pd.DataFrame([
+            {
+                'stage': task.name,
+                'state': task.state,
+                'wall_s': round(now - task.started, 1) if task.state == RUNNING else task.wall_s,
+                'rows_out': row_count(task.result) if task.state == DONE else None,
+                'error': None if task.error is None else repr(task.error),
+            }
+            for task in self._tasks.values()
+        ], columns=['stage', 'state', 'wall_s', 'rows_out', 'error'])
+
+    # ------------------------------------------------------------------
+    # Exécution
+    # ------------------------------------------------------------------
+
+    def _submit(self, executor, task):
+        args = tuple(self._tasks[dependency].result for dependency in task.after) + task.args
+        task.state = RUNNING
+        task.started = time.perf_counter()
+        if self.processes:
+            task.future = executor.submit(task.function, *args, **task.params)
+        else:
+            # Contexte copié : profil actif (instrument) et point d'annulation propres à l'étape
+            context = contextvars.copy_context()
+            task.future = executor.submit(context.run, _call_cancellable, task.event, task.function, args, task.params)
+
+    def _collect(self, task):
+        """Enregistre l'issue d'une étape dont le calcul s'est terminé."""
+        with self._lock:
+            if task.state != RUNNING:
+                # Annulée entre-temps : résultat ignoré
+                return False
+            task.wall_s = round(time.perf_counter() - task.started, 4)
+            error = task.future.exception()
+            if error is None:
+                task.result, task.state = task.future.result(), DONE
+            elif isinstance(error, Cancelled):
+                task.state = CANCELLED
+            else:
+                task.error, task.state = error, FAILED
+            return True
+
+    def _ready(self):
+        """Étapes en attente dont toutes les dépendances sont prêtes ; annule celles dont une dépendance a échoué."""
+        ready = []
+        for task in self._tasks.values():
+            if task.state != PENDING:
+                continue
+            states = [self._tasks[dependency].state for dependency in task.after]
+            if all(state == DONE for state in states):
+                ready.append(task)
+            elif any(state in (FAILED, CANCELLED, TIMEOUT) for state in states):
+                task.state = CANCELLED
+        return ready
+
+    def run(self, poll=None):
+        """
+        Exécute les étapes et rend la main à chaque étape terminée.
+
+        Args:
+            poll: intervalle (secondes) auquel None est produit tant qu'aucune
+                étape ne se termine (rafraîchir un affichage, réagir à une
+                annulation), None = uniquement aux fins d'étapes
+
+        Yields:
+            nom de chaque étape terminée (voir state/result), ou None (poll)
+        """
+        deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        pool = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+        executor = pool(max_workers=self.workers)
+        reported = set()
+        try:
+            while True:
+                with self._lock:
+                    for task in self._ready():
+                        self._submit(executor, task)
+                for task in self._tasks.values():
+                    if task.state in FINISHED_STATES and task.name not in reported:
+                        reported.add(task.name)
+                        yield task.name
+                running = [task.future for task in self._tasks.values() if task.state == RUNNING]
+                if not running:
+                    if self.finished and reported.issuperset(self._tasks):
+                        return
+                    continue
+
+                timeout = poll
+                if deadline is not None:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        interrupted = self.cancel(state=TIMEOUT)
+                        warnings.warn(
+                            f"Budget de temps de {self.time_budget} s atteint : étape(s) interrompue(s) "
+                            f"{', '.join(interrupted)}"
+                        )
+                        continue
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                changed = [task for task in self._tasks.values() if task.future in done and self._collect(task)]
+                if not changed and poll is not None and not any(
+                    task.state in FINISHED_STATES and task.name not in reported for task in self._tasks.values()
+                ):
+                    yield None
+        finally:
+            # Arrêt anticipé (exception, générateur fermé) : étapes restantes annulées
+            self.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def run_all(self):
+        """
+        Exécute toutes les étapes jusqu'à la fin (ou l'échéance du budget de temps).
+
+        Returns:
+            dict nom → résultat des étapes terminées avec succès
+        """
+        for _ in self.run():
+            pass
+        return {name: task.result for name, task in self._tasks.items() if task.state == DONE}
@@ -0,0 +1,227 @@
+"""
+Score de risque déclaratif et vectorisé
+
+Les règles de chaque scénario (condition, points, libellé, seuils) sont lues
+depuis un fichier JSON (config/risk_rules.json par défaut, ou
+FRAUD_RISK_RULES). Chaque condition est évaluée une seule fois comme
+expression de colonnes sur l'ensemble des cas ; risk_score est la somme des
+points des règles vérifiées et flags la concaténation de leurs libellés,
+construite une fois par combinaison distincte de libellés plutôt que ligne
+par ligne.
+"""
+import hashlib
+import json
+import os
+import string
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RISK_RULES_PATH = os.path.join(os.path.dirname(__file__), 'config', 'risk_rules.json')
+
+FLAG_SEPARATOR = "; "
+
+
+class RiskRule:
+    """Règle condition → points et libellé."""
+
+    def __init__(self, condition, points, flag, group=None):
+        """
+        Args:
+            condition: expression sur les colonnes (DataFrame.eval), seuils en @nom
+            points: points ajoutés au score si la condition est vérifiée
+            flag: libellé (format str ; {seuil} ou {colonne})
+            group: groupe de règles exclusives (la première vérifiée s'applique)
+        """
+        self.condition = condition
+        self.points = points
+        self.flag = flag
+        self.group = group
+        self.fields = [name for _, name, _, _ in string.Formatter().parse(flag) if name]
+
+
+class ScenarioScoring:
+    """Règles de score d'un scénario."""
+
+    def __init__(self, rules, thresholds=None, default=None):
+        """
+        Args:
+            rules: liste de RiskRule, dans l'ordre des libellés
+            thresholds: dict nom → valeur, référencés par les conditions et libellés
+            default: (points, libellé) des cas sans point, None = aucun
+        """
+        self.rules = list(rules)
+        self.thresholds = dict(thresholds or {})
+        self.default = default
+
+    @classmethod
+    def from_config(cls, config):
+        default = config.get('default')
+        return cls(
+            [
+                RiskRule(rule['condition'], rule['points'], rule['flag'], group=rule.get('group'))
+                for rule in config['rules']
+            ],
+            thresholds=config.get('thresholds'),
+            default=(default['points'], default['flag']) if default else None,
+        )
+
+    def masks(self, frame):
+        """
+        Masque booléen de chaque règle (groupes exclusifs appliqués).
+
+        Returns:
+            liste de tableaux NumPy (un par règle)
+        """
+        masks, taken = [], {}
+        for rule in self.rules:
+            mask = np.asarray(frame.eval(rule.condition, local_dict=self.thresholds), dtype=bool)
+            if rule.group is not None:
+                previous = taken.get(rule.group, np.zeros(len(frame), dtype=bool))
+                mask = mask & ~previous
+                taken[rule.group] = previous | mask
+            masks.append(mask)
+        return masks
+
+    def _label_codes(self, frame, rule, mask):
+        """Code du libellé de la règle par ligne (-1 si inactive) et libellés distincts."""
+        codes = np.full(len(frame), -1, dtype='int64')
+        columns = [field for field in rule.fields if field not in self.thresholds]
+        if not columns:
+            codes[mask] = 0
+            return codes, [rule.flag.format(**self.thresholds)]
+
+        # Libellé dépendant de colonnes : formaté une fois par valeur distincte
+        values = frame.loc[mask, columns]
+        if len(columns) > 1:
+            value_codes, uniques = pd.factorize(pd.MultiIndex.from_frame(values))
+        else:
+            value_codes, uniques = pd.factorize(values[columns[0]])
+        codes[mask] = value_codes
+        labels = []
+        for unique in uniques:
+            row = dict(zip(columns, unique if len(columns) > 1 else (unique,)))
+            labels.append(rule.flag.format(**self.thresholds, **row))
+        return codes, labels
+
+    def score(self, frame):
+        """
+        Calcule risk_score et flags comme expressions de colonnes.
+
+        Args:
+            frame: DataFrame des cas
+
+        Returns:
+            (risk_score, flags) sous forme de tableaux NumPy
+        """
+        n = len(frame)
+        masks = self.masks(frame) if n else [np.zeros(0, dtype=bool) for _ in self.rules]
+        scores = np.zeros(n, dtype='int64')
+        for rule, mask in zip(self.rules, masks):
+            scores += np.where(mask, rule.points, 0)
+
+        # Libellés actifs combinés en un seul code (base mixte, un chiffre par
+        # règle + un pour le libellé par défaut) : une concaténation par combinaison
+        rule_labels = [self._label_codes(frame, rule, mask) for rule, mask in zip(self.rules, masks)]
+        combo = np.zeros(n, dtype='int64')
+        bases, base = [], 1
+        for codes, labels in rule_labels:
+            combo += (codes + 1) * base
+            bases.append(base)
+            base *= len(labels) + 1
+        if self.default:
+            defaulted = scores == 0
+            scores[defaulted] = self.default[0]
+            combo += defaulted * base
+
+        uniques, inverse = np.unique(combo, return_inverse=True)
+        texts = []
+        for key in uniques:
+            flags = [
+                labels[key // digit % (len(labels) + 1) - 1]
+                for digit, (_, labels) in zip(bases, rule_labels) if key // digit % (len(labels) + 1)
+            ]
+            if key // base:
+                flags.append(self.default[1])
+            texts.append(FLAG_SEPARATOR.join(flags))
+        return scores, np.asarray(texts, dtype=object)[inverse.reshape(n)]
+
+    def apply(self, frame):
+        """Ajoute les colonnes risk_score et flags au DataFrame (modifié en place)."""
+        frame['risk_score'], frame['flags'] = self.score(frame)
+        return frame
+
+
+class RiskRules(Mapping):
+    """Règles de score par scénario (dict scénario → ScenarioScoring)."""
+
+    def __init__(self, scenarios, config=None):
+        """
+        Args:
+            scenarios: dict scénario → ScenarioScoring
+            config: dict source des règles (pour l'empreinte), si construit depuis un fichier
+        """
+        self._scenarios = dict(scenarios)
+        self.config = config
+
+    def __getitem__(self, scenario):
+        return self._scenarios[scenario]
+
+    def __iter__(self):
+        return iter(self._scenarios)
+
+    def __len__(self):
+        return len(self._scenarios)
+
+    @classmethod
+    def from_config(cls, config):
+        """Construit les règles depuis un dict {"scenarios": {nom: {...}}}."""
+        return cls(
+            {
+                scenario: ScenarioScoring.from_config(scenario_config)
+                for scenario, scenario_config in config['scenarios'].items()
+            },
+            config=config,
+        )
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as handle:
+            return cls.from_config(json.load(handle))
+
+    def fingerprint(self):
+        """Empreinte des règles (clé de cache des résultats notés)."""
+        payload = json.dumps(self.config, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def load_risk_rules(path=None):
+    """
+    Charge les règles de score depuis un fichier.
+
+    Args:
+        path: fichier JSON ; défaut FRAUD_RISK_RULES ou config/risk_rules.json
+    """
+    return RiskRules.from_file(path or os.environ.get('FRAUD_RISK_RULES') or DEFAULT_RISK_RULES_PATH)
+
+
+DEFAULT_RISK_RULES = load_risk_rules()
+
+
+def score_cases(frame, scenario, risk_rules=None):
+    """
+    Ajoute risk_score et flags aux cas d'un scénario.
+
+    Args:
+        frame: DataFrame des cas (modifié en place)
+        scenario: nom du scénario dans les règles ('circular', 'chains', 'rings', 'velocity', 'entities')
+        risk_rules: RiskRules, défaut règles de config/risk_rules.json ; un
+            scénario absent des règles fournies est noté avec les règles par défaut
+
+    Returns:
+        DataFrame
+    """
+    if risk_rules is None or scenario not in risk_rules:
+        risk_rules = DEFAULT_RISK_RULES
+    return risk_rules[scenario].apply(frame)
@@ -0,0 +1,709 @@
+"""
+Backend d'exécution SQL hors mémoire (DuckDB embarqué)
+
+Les transactions sont chargées dans une base DuckDB (fichier temporaire ou
+`database`) au lieu d'un DataFrame : le prétraitement du loader (REASON_NAME
+et MSISDN normalisés, DATE, tri par INITATE_DATE) est fait en SQL et la
+classification ajoute à chaque ligne le masque de types calculé par le
+TransactionClassifier sur les REASON_NAME distincts. Chaque détecteur est
+ensuite une requête SQL :
+
+    - détections simples : GROUP BY ;
+    - circulaire : jointure ASOF (dernier Cash In avant le paiement) puis
+      jointure sur (marchand, montant) ;
+    - Cash In → W2B et B2W → Send Money → W2B : jointures sur clé et
+      intervalle de temps (plafond de candidats par ROW_NUMBER) ;
+    - chaînes Cash In → Send Money (N) → W2B : CTE récursive de profondeur
+      bornée, clients déjà visités exclus ;
+    - anneaux de transferts : seuls les transferts dont le destinataire émet
+      et l'émetteur reçoit (même jour sans fenêtre) sortent de DuckDB, puis
+      le graphe est analysé par rings.detect_rings (composantes fortement
+      connexes et cycles temporels ne s'expriment pas en SQL) ;
+    - vélocité : fenêtres RANGE par (flux, portefeuille), pic du jour par
+      QUALIFY et habitude par fenêtre sur les pics ; seules les rafales
+      sortent de DuckDB.
+
+DuckDB exécute les requêtes sur plusieurs threads et déborde sur disque
+au-delà de `memory_limit`. Seuls les cas détectés reviennent en pandas, où
+les scores de risque et les tableaux dérivés sont calculés par les mêmes
+fonctions que le backend pandas : les résultats sont identiques.
+"""
+import os
+import shutil
+import tempfile
+import warnings
+from collections import Counter
+from contextlib import contextmanager
+
+import duckdb
+import pandas as pd
+
+from .b2w_chain import (
+    B2W_SEND_W2B_COLUMNS,
+    MAX_CANDIDATES_PER_CLIENT,
+    SCENARIO as B2W_SEND_W2B_SCENARIO,
+    report_capped,
+)
+from .cashin_w2b import CASHIN_W2B_COLUMNS, SCENARIO as CASHIN_W2B_SCENARIO
+from .chains import CASHIN_COMMISSION_RATE, CHAIN_METRICS, report_pruned, score_chains, top_chains
+from .circular import CIRCULAR_COLUMNS, score_circular
+from .classify import DEFAULT_CLASSIFIER
+from .instrument import count, row_count, stage
+from .loader import TRANSACTION_COLUMNS
+from .repeats import PAIR_REPEATS, RECEIVER_VOLUMES, REPEAT_RESULTS
+from .rings import RING_HOP_DELAY, RING_MAX_LENGTH, detect_rings
+from .scheduler import checkpoint
+from .scoring import score_cases
+from .velocity import (
+    FLOW_SIDES, PEAK_COLUMNS, VELOCITY_BURST_RATIO, VELOCITY_COLUMNS, VELOCITY_FLOWS, VELOCITY_MIN_BURST,
+    VELOCITY_WINDOWS
+)
+from .windows import validate_windows
+
+# Nom du fichier de base créé dans un dossier temporaire si `database` est absent
+DATABASE_FILE = 'transactions.duckdb'
+
+# Types SQL des colonnes lues (ceux de loader.CSV_DTYPES)
+SQL_TYPES = {
+    'INITATE_DATE': 'TIMESTAMP',
+    'DEBIT_MSISDN': 'VARCHAR',
+    'CREDIT_MSISDN': 'VARCHAR',
+    'REASON_NAME': 'VARCHAR',
+    'ACTUAL_AMOUNT': 'FLOAT',
+}
+
+# Caractères retirés par str.strip() en bordure des valeurs
+_WHITESPACE = " \t\n\r\x0b\x0c"
+
+_NOT_NULL = "INITATE_DATE IS NOT NULL AND DEBIT_MSISDN IS NOT NULL AND CREDIT_MSISDN IS NOT NULL"
+
+
+def _minutes_sql(later, earlier):
+    """Délai en minutes entre deux TIMESTAMP (même calcul que Timedelta.total_seconds() / 60)."""
+    return f"(epoch_us({later}) - epoch_us({earlier})) / 1e6 / 60"
+
+
+def _within(earlier, later, max_delay):
+    """Condition 0 < later - earlier (<= max_delay minutes si fourni)."""
+    condition = f"{later} > {earlier}"
+    if max_delay is not None:
+        condition += f" AND {later} <= {earlier} + to_microseconds({round(max_delay * 60e6)})"
+    return condition
+
+
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class SqlBackend:
+    """Transactions chargées dans DuckDB et détecteurs exprimés en SQL."""
+
+    def __init__(self, database=None, memory_limit=None, threads=None, temp_directory=None):
+        """
+        Args:
+            database: fichier de base DuckDB (remplacé à chaque chargement),
+                None = fichier dans un dossier temporaire supprimé par close()
+            memory_limit: limite mémoire de DuckDB (ex. '4GB'), au-delà les
+                opérateurs débordent sur disque ; None = défaut DuckDB
+            threads: nombre de threads, None ou 0 = nombre de cœurs
+            temp_directory: dossier de débordement, défaut à côté de la base
+        """
+        self._temporary_dir = None
+        if database is None:
+            self._temporary_dir = tempfile.mkdtemp(prefix='fraud_duckdb_')
+            database = os.path.join(self._temporary_dir, DATABASE_FILE)
+        self.connection = duckdb.connect(database)
+        if memory_limit:
+            self.connection.execute(f"SET memory_limit = {_literal(memory_limit)}")
+        if threads:
+            self.connection.execute(f"SET threads = {int(threads)}")
+        if temp_directory:
+            self.connection.execute(f"SET temp_directory = {_literal(temp_directory)}")
+        self.types = {}
+
+    def close(self):
+        self.connection.close()
+        if self._temporary_dir is not None:
+            shutil.rmtree(self._temporary_dir, ignore_errors=True)
+            self._temporary_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def query(self, sql, parameters=None):
+        """Résultat d'une requête sous forme de DataFrame."""
+        return self.connection.execute(sql, parameters).df()
+
+    # ------------------------------------------------------------------
+    # Chargement
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _source_path(self, source):
+        """Chemin lisible par DuckDB ; un objet fichier est d'abord recopié sur disque par blocs."""
+        if isinstance(source, (str, os.PathLike)):
+            yield os.fspath(source)
+            return
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        handle = tempfile.NamedTemporaryFile(suffix='.csv', dir=self._temporary_dir, delete=False)
+        try:
+            with handle:
+                shutil.copyfileobj(source, handle)
+            yield handle.name
+        finally:
+            os.unlink(handle.name)
+
+    def _read_source(self, path):
+        """Expression FROM d'un fichier CSV ou Parquet de transactions."""
+        if path.lower().endswith('.parquet'):
+            return f"read_parquet({_literal(path)})"
+        types = ', '.join(f"{_literal(column)}: {_literal(sql_type)}" for column, sql_type in SQL_TYPES.items())
+        return f"read_csv({_literal(path)}, header = true, types = {{{types}}})"
+
+    def _insert_batches(self, source, columns):
+        """Ajoute à raw_transactions les lots lus en flux depuis une source base de données."""
+        for batch in source.iter_batches():
+            self.connection.register('source_batch', batch)
+            try:
+                self.connection.execute(f"INSERT INTO raw_transactions SELECT {columns} FROM source_batch")
+            finally:
+                self.connection.unregister('source_batch')
+
+    def load(self, *sources, classifier=None):
+        """
+        Charge, prétraite et classe les transactions (table `transactions`).
+
+        Args:
+            sources: chemins (CSV ou Parquet), objets fichiers CSV ou sources base de
+                données (database.DatabaseSource), concaténés dans l'ordre
+            classifier: TransactionClassifier, défaut règles de config/transaction_types.json
+
+        Returns:
+            nombre de transactions chargées
+        """
+        classifier = classifier or DEFAULT_CLASSIFIER
+        columns = ', '.join(f"CAST({column} AS {SQL_TYPES[column]}) AS {column}" for column in TRANSACTION_COLUMNS)
+        self.connection.execute(
+            "CREATE OR REPLACE TEMP TABLE raw_transactions ("
+            + ', '.join(f"{column} {SQL_TYPES[column]}" for column in TRANSACTION_COLUMNS) + ")"
+        )
+        for source in sources:
+            if hasattr(source, 'iter_batches'):
+                self._insert_batches(source, columns)
+                continue
+            with self._source_path(source) as path:
+                self.connection.execute(
+                    f"INSERT INTO raw_transactions SELECT {columns} FROM {self._read_source(path)}"
+                )
+
+        # Classification une fois par REASON_NAME distinct (voir classify.TransactionClassifier)
+        reasons = self.query(
+            f"SELECT DISTINCT lower(trim(REASON_NAME, '{_WHITESPACE}')) AS REASON_NAME FROM raw_transactions "
+            "WHERE REASON_NAME IS NOT NULL"
+        )['REASON_NAME']
+        masks, _ = classifier.reason_masks(list(reasons))
+        reason_types = pd.DataFrame({'REASON_NAME': reasons.astype(object), 'type_mask': masks})
+        self.types = {tx_type: 1 << code for code, tx_type in enumerate(classifier.types)}
+
+        self.connection.register('reason_types', reason_types)
+        try:
+            # rid : position de la ligne après le tri stable par INITATE_DATE (loader.preprocess)
+            self.connection.execute(f"""
+                CREATE OR REPLACE TABLE transactions AS
+                WITH cleaned AS (
+                    SELECT
+                        INITATE_DATE,
+                        trim(DEBIT_MSISDN, '{_WHITESPACE}') AS DEBIT_MSISDN,
+                        trim(CREDIT_MSISDN, '{_WHITESPACE}') AS CREDIT_MSISDN,
+                        lower(trim(REASON_NAME, '{_WHITESPACE}')) AS REASON_NAME,
+                        ACTUAL_AMOUNT,
+                        CAST(INITATE_DATE AS DATE) AS DATE,
+                        rowid AS source_order
+                    FROM raw_transactions
+                )
+                SELECT
+                    cleaned.* EXCLUDE (source_order),
+                    coalesce(reason_types.type_mask, 0) AS type_mask,
+                    row_number() OVER (ORDER BY INITATE_DATE NULLS LAST, source_order) AS rid
+                FROM cleaned LEFT JOIN reason_types USING (REASON_NAME)
+                ORDER BY rid
+            """)
+        finally:
+            self.connection.unregister('reason_types')
+            self.connection.execute("DROP TABLE raw_transactions")
+        return self.connection.execute("SELECT count(*) FROM transactions").fetchone()[0]
+
+    def typed(self, tx_type):
+        """Sous-requête des transactions d'un type (voir classify.TypedTransactions)."""
+        return f"(SELECT * FROM transactions WHERE type_mask & {self.types[tx_type]} <> 0)"
+
+    # ------------------------------------------------------------------
+    # Détections simples
+    # ------------------------------------------------------------------
+
+    def repeats(self):
+        """
+        Détections simples (voir repeats.detect_repeats).
+
+        Returns:
+            dict nom de résultat → DataFrame
+        """
+        results = {}
+        for name in REPEAT_RESULTS:
+            if name in PAIR_REPEATS:
+                tx_type, count_column, min_count = PAIR_REPEATS[name]
+                results[name] = self.query(f"""
+                    SELECT DEBIT_MSISDN, CREDIT_MSISDN, count(*) AS {count_column}
+                    FROM {self.typed(tx_type)}
+                    WHERE DEBIT_MSISDN IS NOT NULL AND CREDIT_MSISDN IS NOT NULL
+                    GROUP BY DEBIT_MSISDN, CREDIT_MSISDN
+                    HAVING count(*) >= {min_count}
+                    ORDER BY DEBIT_MSISDN, CREDIT_MSISDN
+                """)
+            else:
+                # Sommes en DOUBLE, comme repeats.combine_repeats
+                results[name] = self.query(f"""
+                    SELECT
+                        CREDIT_MSISDN,
+                        count(ACTUAL_AMOUNT) AS volume,
+                        CAST(coalesce(sum(CAST(ACTUAL_AMOUNT AS DOUBLE)), 0) AS FLOAT) AS valeur
+                    FROM {self.typed(RECEIVER_VOLUMES[name])}
+                    WHERE CREDIT_MSISDN IS NOT NULL
+                    GROUP BY CREDIT_MSISDN
+                    ORDER BY CREDIT_MSISDN
+                """)
+        return results
+
+    # ------------------------------------------------------------------
+    # Scénarios
+    # ------------------------------------------------------------------
+
+    def circular(self, max_delays=None, risk_rules=None):
+        """Cash In → Merchant Payment → Cash Out (voir circular.detect_circular)."""
+        windowed = max_delays is not None
+        by_day = "" if windowed else "mp.DATE = ci.DATE AND "
+        ci_window = f"AND mp.mp_time <= ci.ci_time + to_microseconds({round(max_delays[0] * 60e6)})" \
+            if windowed else ""
+        co_day = "" if windowed else "AND co.DATE = mp_ci.DATE "
+        matches = self.query(f"""
+            WITH
+            mp AS (
+                SELECT rid AS mp_rid, DATE, DEBIT_MSISDN AS client, CREDIT_MSISDN AS merchant,
+                       INITATE_DATE AS mp_time, REASON_NAME AS mp_reason, ACTUAL_AMOUNT AS amount,
+                       CAST(round_even(CAST(ACTUAL_AMOUNT AS DOUBLE) * 100, 0) AS BIGINT) AS amount_key
+                FROM {self.typed('mp')} WHERE {_NOT_NULL}
+            ),
+            -- Un Cash In par (jour, client, horodatage) : le dernier, comme merge_asof
+            ci AS (
+                SELECT DATE, CREDIT_MSISDN AS client, INITATE_DATE AS ci_time,
+                       arg_max(DEBIT_MSISDN, rid) AS cashin_from
+                FROM {self.typed('cashin')} WHERE {_NOT_NULL}
+                GROUP BY DATE, CREDIT_MSISDN, INITATE_DATE
+            ),
+            mp_ci AS (
+                SELECT mp.*, ci.cashin_from, ci.ci_time, CAST(ci.ci_time AS DATE) AS ci_date
+                FROM mp ASOF JOIN ci ON {by_day}mp.client = ci.client AND mp.mp_time > ci.ci_time
+                WHERE true {ci_window}
+            ),
+            co AS (
+                SELECT rid AS co_rid, DATE, DEBIT_MSISDN AS merchant, INITATE_DATE AS bco_time,
+                       REASON_NAME AS bco_reason, CREDIT_MSISDN AS cashout_to,
+                       CAST(round_even(CAST(ACTUAL_AMOUNT AS DOUBLE) * 100, 0) AS BIGINT) AS amount_key
+                FROM {self.typed('cashout')} WHERE {_NOT_NULL}
+            )
+            SELECT
+                {'mp_ci.ci_date' if windowed else 'mp_ci.DATE'} AS date, cashin_from, ci_time, client,
+                mp_ci.merchant, mp_time, mp_reason, bco_time, bco_reason, amount, cashout_to,
+                {_minutes_sql('bco_time', 'mp_time')} AS delay_minutes
+            FROM mp_ci JOIN co
+                ON co.merchant = mp_ci.merchant AND co.amount_key = mp_ci.amount_key {co_day}
+                AND {_within('mp_ci.mp_time', 'co.bco_time', max_delays[1] if windowed else None)}
+            ORDER BY mp_rid, bco_time, co_rid
+        """)
+        count('cashout_join', len(matches))
+        if matches.empty:
+            return pd.DataFrame(columns=CIRCULAR_COLUMNS)
+        matches['date'] = matches['date'].dt.date
+        return score_circular(matches, risk_rules)
+
+    def cashin_w2b(self, max_delay=None):
+        """Cash In suivi de W2B (voir cashin_w2b.detect_cashin_w2b)."""
+        same_day = "AND w2b.DATE = ci.DATE " if max_delay is None else ""
+        merged = self.query(f"""
+            SELECT
+                ci.DATE AS date, ci.DEBIT_MSISDN AS Distributeur, ci.CREDIT_MSISDN AS client,
+                ci.ACTUAL_AMOUNT AS cashin_amount, ci.INITATE_DATE AS cashin_time,
+                w2b.ACTUAL_AMOUNT AS w2b_amount, w2b.INITATE_DATE AS w2b_time, w2b.CREDIT_MSISDN AS Banque,
+                {_minutes_sql('w2b.INITATE_DATE', 'ci.INITATE_DATE')} AS delay_minutes,
+                {_literal(CASHIN_W2B_SCENARIO)} AS scenario
+            FROM {self.typed('cashin')} ci JOIN {self.typed('w2b')} w2b
+                ON w2b.DEBIT_MSISDN = ci.CREDIT_MSISDN {same_day}
+                AND {_within('ci.INITATE_DATE', 'w2b.INITATE_DATE', max_delay)}
+            ORDER BY ci.rid, w2b.INITATE_DATE, w2b.rid
+        """)
+        count('join', len(merged))
+        if merged.empty:
+            return pd.DataFrame(columns=CASHIN_W2B_COLUMNS)
+        merged['date'] = merged['date'].dt.date
+        return merged[CASHIN_W2B_COLUMNS]
+
+    def chains(self, max_depth=10, max_hop_delay=None, by_day=True, risk_rules=None, budget=None):
+        """
+        Chaînes Cash In → Send Money (N) → W2B (voir chains.collect_money_chains),
+        par CTE récursive : chaque itération ajoute un Send Money émis par le
+        dernier client du chemin, ni déjà destinataire ni au-delà de max_depth.
+
+        Le budget (chains.ChainBudget) s'applique au résultat de la requête,
+        dont les chemins sont classés par Cash In puis par longueur : dedup et
+        max_paths gardent les premiers chemins de chaque Cash In dans cet
+        ordre (les plus courts), puis top_k les meilleurs scores. max_nodes
+        n'a pas d'équivalent (la CTE explore tous les chemins) et est ignoré.
+        """
+        if max_depth < 1:
+            return score_chains(pd.DataFrame(columns=CHAIN_METRICS), risk_rules)
+        same_day = "AND send.DATE = path.date " if by_day else ""
+        w2b_day = "AND w2b.DATE = path.date " if by_day else ""
+        # Sans Send Money (le jour même, ou sur la période), le Cash In n'est pas exploré
+        explored = "ci.DATE IN (SELECT DATE FROM send)" if by_day else "EXISTS (SELECT 1 FROM send)"
+        chains = self.query(f"""
+            WITH RECURSIVE
+            ci AS (
+                SELECT rid AS ci_rid, DATE, DEBIT_MSISDN AS distributor, CREDIT_MSISDN AS client,
+                       ACTUAL_AMOUNT AS cashin_amount, INITATE_DATE AS cashin_time
+                FROM {self.typed('cashin')} WHERE {_NOT_NULL} AND ACTUAL_AMOUNT IS NOT NULL
+            ),
+            send AS (SELECT * FROM {self.typed('send')} WHERE {_NOT_NULL}),
+            w2b AS (SELECT * FROM {self.typed('w2b')} WHERE {_NOT_NULL}),
+            path(ci_rid, date, client, time, depth, receivers, amounts, sends) AS (
+                SELECT ci_rid, DATE, client, cashin_time, 1, []::VARCHAR[], []::FLOAT[], []::BIGINT[]
+                FROM ci WHERE {explored}
+                UNION ALL
+                SELECT path.ci_rid, path.date, send.CREDIT_MSISDN, send.INITATE_DATE, path.depth + 1,
+                       list_append(path.receivers, send.CREDIT_MSISDN),
+                       list_append(path.amounts, send.ACTUAL_AMOUNT),
+                       list_append(path.sends, send.rid)
+                FROM path JOIN send
+                    ON send.DEBIT_MSISDN = path.client {same_day}
+                    AND {_within('path.time', 'send.INITATE_DATE', max_hop_delay)}
+                WHERE path.depth < {int(max_depth)} AND NOT list_contains(path.receivers, send.CREDIT_MSISDN)
+            )
+            SELECT
+                ci.ci_rid,
+                ci.DATE AS date,
+                ci.distributor,
+                CAST(path.depth - 1 AS BIGINT) AS nb_send_money,
+                list_prepend(ci.client, path.receivers) AS clients_chain,
+                CAST(ci.cashin_amount AS DOUBLE) AS cashin_amount,
+                ci.cashin_time,
+                w2b.ACTUAL_AMOUNT AS w2b_amount,
+                w2b.INITATE_DATE AS w2b_time,
+                w2b.CREDIT_MSISDN AS w2b_bank,
+                round_even({_minutes_sql('w2b.INITATE_DATE', 'ci.cashin_time')}, 2) AS total_delay_minutes,
+                round_even(CAST(ci.cashin_amount AS DOUBLE) * {CASHIN_COMMISSION_RATE}, 2) AS cashin_commission_djf,
+                round_even(
+                    round_even(CAST(ci.cashin_amount AS DOUBLE) * {CASHIN_COMMISSION_RATE}, 2)
+                    / CASE WHEN path.depth > 1 THEN path.depth ELSE 1 END, 2
+                ) AS commission_per_person,
+                list_append(
+                    list_prepend(CAST(ci.cashin_amount AS DOUBLE), CAST(path.amounts AS DOUBLE[])),
+                    CAST(w2b.ACTUAL_AMOUNT AS DOUBLE)
+                ) AS full_chain,
+                row_number() OVER (
+                    PARTITION BY ci.ci_rid, path.receivers
+                    ORDER BY path.sends, w2b.INITATE_DATE, w2b.rid
+                ) AS path_rank
+            FROM path
+                JOIN ci USING (ci_rid)
+                JOIN w2b ON w2b.DEBIT_MSISDN = path.client {w2b_day}
+                    AND {_within('path.time', 'w2b.INITATE_DATE', max_hop_delay)}
+            ORDER BY ci.ci_rid, path.depth, path.time, path.receivers, path.sends, w2b.INITATE_DATE, w2b.rid
+        """)
+        count('chains_found', len(chains))
+        if budget:
+            chains = self._budgeted_chains(chains, budget)
+        if chains.empty:
+            return score_chains(pd.DataFrame(columns=CHAIN_METRICS), risk_rules)
+        chains['date'] = chains['date'].dt.date
+        pruned = Counter()
+        scored = top_chains(score_chains(chains[CHAIN_METRICS], risk_rules), budget.top_k if budget else None, pruned)
+        report_pruned(pruned)
+        return scored
+
+    @staticmethod
+    def _budgeted_chains(chains, budget):
+        """Applique dedup et max_paths (par Cash In) aux chemins de la requête."""
+        pruned = Counter()
+        if budget.max_nodes is not None:
+            warnings.warn("Chaînes : max_nodes n'est pas pris en charge par le backend duckdb, ignoré")
+        if budget.dedup:
+            # Chemin déjà rencontré pour ce Cash In (rang calculé par la requête)
+            duplicated = (chains['path_rank'] > 1).to_numpy()
+            pruned['duplicate'] = int(duplicated.sum())
+            chains = chains[~duplicated]
+        if budget.max_paths is not None:
+            rank = chains.groupby('ci_rid', sort=False).cumcount().to_numpy()
+            pruned['max_paths'] = chains.loc[rank == budget.max_paths, 'ci_rid'].nunique()
+            chains = chains[rank < budget.max_paths]
+        report_pruned(pruned)
+        return chains.reset_index(drop=True)
+
+    def _capped_step(self, name, select, source, key, key_columns, order, max_candidates):
+        """
+        Étape ordonnée de B2W → Send Money → W2B (table temporaire `name`) ;
+        les candidats sont plafonnés par clé dans l'ordre chronologique des
+        événements de gauche (voir windows.range_pairs).
+
+        Args:
+            key: expressions de la clé dans `source`
+            key_columns: colonnes de la clé dans la table produite
+            order: ordre des candidats d'une clé
+        """
+        candidate = f", row_number() OVER (PARTITION BY {key} ORDER BY {order}) AS candidate" \
+            if max_candidates is not None else ""
+        self.connection.execute(f"CREATE OR REPLACE TEMP TABLE {name} AS SELECT {select}{candidate} FROM {source}")
+        count(f'{name}_join', self.connection.execute(f"SELECT count(*) FROM {name}").fetchone()[0])
+        if max_candidates is not None:
+            capped = self.connection.execute(
+                f"SELECT count(DISTINCT ({key_columns})) FROM {name} WHERE candidate > {int(max_candidates)}"
+            ).fetchone()[0]
+            report_capped(name, capped, max_candidates)
+            self.connection.execute(f"DELETE FROM {name} WHERE candidate > {int(max_candidates)}")
+            self.connection.execute(f"ALTER TABLE {name} DROP COLUMN candidate")
+
+    def b2w_send_w2b(self, max_delays=None, amount_tolerance=None, max_candidates=MAX_CANDIDATES_PER_CLIENT):
+        """B2W → Send Money → W2B (voir b2w_chain.detect_b2w_send_w2b)."""
+        b2w_delay, w2b_delay = max_delays if max_delays is not None else (None, None)
+
+        def outside_tolerance(reference, amount):
+            reference = f"CAST({reference} AS DOUBLE)"
+            return f"abs(CAST({amount} AS DOUBLE) - {reference}) > {float(amount_tolerance)!r} * abs({reference})"
+
+        # Étape 1 : B2W → Send Money émis par le client A
+        self._capped_step(
+            'step1',
+            select="""
+                b2w.rid AS b2w_rid, b2w.DATE AS date, b2w.DEBIT_MSISDN AS source_bank,
+                b2w.CREDIT_MSISDN AS client_A, b2w.ACTUAL_AMOUNT AS b2w_amount, b2w.INITATE_DATE AS b2w_time,
+                send.rid AS send_rid, send.CREDIT_MSISDN AS client_B, send.ACTUAL_AMOUNT AS send_amount,
+                send.INITATE_DATE AS sm_time_1
+            """,
+            source=f"""
+                (SELECT * FROM {self.typed('b2w')} WHERE {_NOT_NULL}) b2w
+                JOIN (SELECT * FROM {self.typed('send')} WHERE {_NOT_NULL}) send
+                    ON send.DEBIT_MSISDN = b2w.CREDIT_MSISDN {'AND send.DATE = b2w.DATE' if b2w_delay is None else ''}
+                    AND {_within('b2w.INITATE_DATE', 'send.INITATE_DATE', b2w_delay)}
+            """,
+            key='b2w.CREDIT_MSISDN' + (', b2w.DATE' if b2w_delay is None else ''),
+            key_columns='client_A' + (', date' if b2w_delay is None else ''),
+            order='b2w.INITATE_DATE, b2w.rid, send.INITATE_DATE, send.rid',
+            max_candidates=max_candidates,
+        )
+        if amount_tolerance is not None:
+            self.connection.execute(f"DELETE FROM step1 WHERE {outside_tolerance('b2w_amount', 'send_amount')}")
+        count('step1', self.connection.execute("SELECT count(*) FROM step1").fetchone()[0])
+
+        # Étape 2 : Send Money → W2B émis par le client B
+        self._capped_step(
+            'step2',
+            select="""
+                step1.*, w2b.rid AS w2b_rid, w2b.ACTUAL_AMOUNT AS w2b_amount, w2b.INITATE_DATE AS w2b_time,
+                w2b.CREDIT_MSISDN AS destination_bank
+            """,
+            source=f"""
+                step1 JOIN (SELECT * FROM {self.typed('w2b')} WHERE {_NOT_NULL}) w2b
+                    ON w2b.DEBIT_MSISDN = step1.client_B {'AND w2b.DATE = step1.date' if w2b_delay is None else ''}
+                    AND {_within('step1.sm_time_1', 'w2b.INITATE_DATE', w2b_delay)}
+            """,
+            key='step1.client_B' + (', step1.date' if w2b_delay is None else ''),
+            key_columns='client_B' + (', date' if w2b_delay is None else ''),
+            order='step1.sm_time_1, step1.b2w_rid, step1.send_rid, w2b.INITATE_DATE, w2b.rid',
+            max_candidates=max_candidates,
+        )
+        if amount_tolerance is not None:
+            self.connection.execute(f"DELETE FROM step2 WHERE {outside_tolerance('send_amount', 'w2b_amount')}")
+
+        cases = self.query(f"""
+            SELECT
+                date, source_bank AS "Source Bank", client_A, b2w_amount, b2w_time, client_B,
+                send_amount, sm_time_1, w2b_amount, w2b_time, destination_bank AS "Destination Bank",
+                {_minutes_sql('sm_time_1', 'b2w_time')} AS delay_B2W_to_Send_min,
+                {_minutes_sql('w2b_time', 'sm_time_1')} AS delay_Send_to_W2B_min,
+                {_literal(B2W_SEND_W2B_SCENARIO)} AS scenario
+            FROM step2
+            ORDER BY b2w_rid, sm_time_1, send_rid, w2b_time, w2b_rid
+        """)
+        self.connection.execute("DROP TABLE step1; DROP TABLE step2")
+        count('step2', len(cases))
+        if cases.empty:
+            return pd.DataFrame(columns=B2W_SEND_W2B_COLUMNS)
+        cases['date'] = cases['date'].dt.date
+        return cases
+
+    def rings(self, max_length=RING_MAX_LENGTH, max_hop_delay=RING_HOP_DELAY, by_day=True, payments=False,
+              risk_rules=None):
+        """
+        Anneaux de transferts (voir rings.detect_rings). Un transfert ne peut
+        appartenir à un cycle que si son destinataire émet et son émetteur
+        reçoit au moins un transfert : les autres restent dans DuckDB.
+        """
+        same_day = "AND other.DATE = edge.DATE " if by_day else ""
+        payment_edges = (
+            f"UNION ALL SELECT *, 1 AS kind FROM {self.typed('mp')} WHERE {_NOT_NULL}" if payments else ""
+        )
+        edges = self.query(f"""
+            WITH edges AS (
+                SELECT *, 0 AS kind FROM {self.typed('send')} WHERE {_NOT_NULL}
+                {payment_edges}
+            )
+            SELECT edge.DEBIT_MSISDN, edge.CREDIT_MSISDN, edge.ACTUAL_AMOUNT, edge.INITATE_DATE, edge.DATE,
+                   edge.kind
+            FROM edges AS edge
+            WHERE edge.DEBIT_MSISDN <> edge.CREDIT_MSISDN
+                AND EXISTS (SELECT 1 FROM edges AS other
+                            WHERE other.DEBIT_MSISDN = edge.CREDIT_MSISDN {same_day})
+                AND EXISTS (SELECT 1 FROM edges AS other
+                            WHERE other.CREDIT_MSISDN = edge.DEBIT_MSISDN {same_day})
+            ORDER BY edge.INITATE_DATE, edge.kind, edge.rid
+        """)
+        count('ring_candidate_edges', len(edges))
+        edges['DATE'] = edges['DATE'].dt.date
+        kinds = edges.pop('kind').to_numpy()
+        return detect_rings(
+            edges[kinds == 0], edges[kinds == 1] if payments else None, max_length=max_length,
+            max_hop_delay=max_hop_delay, by_day=by_day, risk_rules=risk_rules
+        )
+
+    def velocity(self, windows=VELOCITY_WINDOWS, burst_ratio=VELOCITY_BURST_RATIO, risk_rules=None):
+        """Rafales de transactions par portefeuille (voir velocity.detect_velocity)."""
+        if not windows:
+            return pd.DataFrame(columns=VELOCITY_COLUMNS)
+        events = " UNION ALL ".join(
+            f"SELECT {_literal(tx_type)} AS tx_type, {_literal(direction)} AS direction, "
+            f"{FLOW_SIDES[direction][0]} AS msisdn, {FLOW_SIDES[direction][1]} AS counterparty, "
+            f"INITATE_DATE, DATE, ACTUAL_AMOUNT FROM {self.typed(tx_type)} WHERE {_NOT_NULL}"
+            for tx_type, direction in VELOCITY_FLOWS
+        )
+        # Une fenêtre [t, t + durée] par transaction (RANGE : transactions de même instant incluses)
+        framed = " UNION ALL ".join(f"""
+            SELECT DATE AS date, msisdn, tx_type, direction, {window_minutes} AS window_minutes,
+                INITATE_DATE AS start, max(INITATE_DATE) OVER frame_{index} AS "end",
+                count(*) OVER frame_{index} AS nb_transactions,
+                sum(CAST(ACTUAL_AMOUNT AS DOUBLE)) OVER frame_{index} AS total_amount,
+                count(DISTINCT counterparty) OVER frame_{index} AS nb_counterparties
+            FROM events
+            WINDOW frame_{index} AS (
+                PARTITION BY tx_type, direction, msisdn ORDER BY INITATE_DATE
+                RANGE BETWEEN CURRENT ROW AND to_microseconds({round(window_minutes * 60e6)}) FOLLOWING
+            )
+        """ for index, window_minutes in enumerate(windows))
+        thresholds = " ".join(
+            f"WHEN {window_minutes} THEN {threshold}"
+            for window_minutes, threshold in windows.items() if threshold is not None
+        )
+        conditions = [f"nb_transactions >= CASE window_minutes {thresholds} END"] if thresholds else []
+        if burst_ratio is not None:
+            conditions.append(f"(burst_ratio >= {burst_ratio} AND nb_transactions >= {VELOCITY_MIN_BURST})")
+        if not conditions:
+            return pd.DataFrame(columns=VELOCITY_COLUMNS)
+        bursts = self.query(f"""
+            WITH events AS ({events}),
+            peaks AS (
+                SELECT * FROM ({framed})
+                QUALIFY row_number() OVER (
+                    PARTITION BY tx_type, direction, msisdn, window_minutes, date ORDER BY nb_transactions DESC, start
+                ) = 1
+            ),
+            habits AS (
+                SELECT *,
+                    CASE WHEN count(*) OVER flow > 1
+                        THEN (sum(nb_transactions) OVER flow - nb_transactions) / (count(*) OVER flow - 1)
+                    END AS baseline
+                FROM peaks
+                WINDOW flow AS (PARTITION BY tx_type, direction, msisdn, window_minutes)
+            )
+            SELECT {', '.join(f'"{column}"' for column in PEAK_COLUMNS)}, baseline, burst_ratio
+            FROM (SELECT *, nb_transactions / baseline AS burst_ratio FROM habits)
+            WHERE {' OR '.join(conditions)}
+        """)
+        if bursts.empty:
+            return pd.DataFrame(columns=VELOCITY_COLUMNS)
+        bursts['date'] = bursts['date'].dt.date
+        return score_cases(bursts, 'velocity', risk_rules)[VELOCITY_COLUMNS]
+
+    def run(self, max_depth=10, max_hop_delay=None, windows=None, risk_rules=None, amount_tolerance=None,
+            max_candidates=MAX_CANDIDATES_PER_CLIENT, chain_budget=None, ring_length=RING_MAX_LENGTH,
+            ring_hop_delay=RING_HOP_DELAY, ring_payments=False, velocity_windows=VELOCITY_WINDOWS,
+            velocity_ratio=VELOCITY_BURST_RATIO):
+        """
+        Exécute tous les détecteurs sur les transactions chargées.
+
+        Args:
+            max_depth: Profondeur maximale de recherche des chaînes
+            max_hop_delay: Délai maximal (minutes) entre deux étapes d'une chaîne
+            windows: fenêtres glissantes par scénario (voir pipeline.run_scenarios)
+            risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+            amount_tolerance: écart relatif maximal des montants B2W → Send Money → W2B
+            max_candidates: nombre maximal de candidats par client et par étape B2W → Send Money → W2B
+            chain_budget: ChainBudget de la recherche des chaînes (voir chains)
+            ring_length, ring_hop_delay, ring_payments: anneaux de transferts (voir pipeline.run_scenarios)
+            velocity_windows, velocity_ratio: rafales de vélocité (voir pipeline.run_detectors)
+
+        Returns:
+            dict nom de résultat → DataFrame (mêmes tableaux que pipeline.run_detectors)
+        """
+        from .pipeline import finalize_results
+
+        windows = validate_windows(windows)
+        chain_window = windows.get('chains')
+        cashin_w2b_window = windows.get('cashin_w2b')
+        ring_window = windows.get('rings')
+        detectors = [
+            ('circular', lambda: self.circular(windows.get('circular'), risk_rules)),
+            ('cashin_w2b', lambda: self.cashin_w2b(cashin_w2b_window[0] if cashin_w2b_window else None)),
+            ('chains', lambda: self.chains(
+                max_depth, chain_window[0] if chain_window else max_hop_delay, by_day=chain_window is None,
+                risk_rules=risk_rules, budget=chain_budget,
+            )),
+            ('b2w_send_w2b', lambda: self.b2w_send_w2b(
+                windows.get('b2w_send_w2b'), amount_tolerance=amount_tolerance, max_candidates=max_candidates,
+            )),
+            ('rings', lambda: self.rings(
+                ring_length, ring_window[0] if ring_window else ring_hop_delay, by_day=ring_window is None,
+                payments=ring_payments, risk_rules=risk_rules,
+            )),
+            ('velocity', lambda: self.velocity(velocity_windows, velocity_ratio, risk_rules)),
+        ]
+        with stage('repeats') as record:
+            results = self.repeats()
+            record['rows_out'] = row_count(results)
+        for name, detect in detectors:
+            checkpoint()
+            with stage(name) as record:
+                results[name] = detect()
+                record['rows_out'] = len(results[name])
+        with stage('finalize'):
+            return finalize_results(results, risk_rules)
+
+
+def run_sql_detection(*sources, classifier=None, database=None, memory_limit=None, threads=None,
+                      temp_directory=None, **params):
+    """
+    Charge un ou plusieurs fichiers dans DuckDB et exécute tous les détecteurs en SQL.
+
+    Args:
+        sources: chemins (CSV ou Parquet) ou objets fichiers CSV
+        classifier: TransactionClassifier, défaut règles de config/transaction_types.json
+        database, memory_limit, threads, temp_directory: voir SqlBackend
+        params: paramètres transmis aux détecteurs (voir SqlBackend.run)
+
+    Returns:
+        dict nom de résultat → DataFrame
+    """
+    with SqlBackend(database, memory_limit=memory_limit, threads=threads, temp_directory=temp_directory) as backend:
+        with stage('load') as record:
+            record['rows_out'] = backend.load(*sources, classifier=classifier)
+        return backend.run(**params)
@@ -0,0 +1,269 @@
+"""
+Stockage colonnaire (Parquet) des transactions prétraitées
+
+Au premier chargement, les transactions sont écrites une fois pour toutes,
+partitionnées par jour et par type :
+
+    <store_dir>/DATE=2024-01-31/TYPE=cashin/part-00000.parquet
+    <store_dir>/msisdn.parquet      dictionnaire partagé code → MSISDN
+    <store_dir>/store.json          métadonnées (sources, REASON_NAME, règles de classification)
+
+Les colonnes sont compactes : DEBIT_MSISDN / CREDIT_MSISDN en codes int32
+(dictionnaire partagé), REASON_NAME en code de catégorie, montants en entiers
+(centimes). Les montants sont donc conservés au centime : au-delà, ils sont
+arrondis (avertissement à l'écriture) et les résultats peuvent différer d'une
+exécution en mémoire. Les chargements suivants relisent les fichiers par
+memory-map, uniquement pour les partitions et colonnes demandées ; les
+détecteurs travaillent sur les codes entiers et les MSISDN ne sont décodés
+que pour l'affichage.
+"""
+import json
+import os
+import shutil
+import warnings
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .cache import content_hash
+from .circular import amount_to_int
+from .classify import DEFAULT_CLASSIFIER, classify_transactions
+from .ingest import DEFAULT_CHUNKSIZE, iter_chunks
+from .loader import CSV_DTYPES, TRANSACTION_COLUMNS, empty_transactions
+
+STORE_VERSION = 2
+METADATA_FILE = 'store.json'
+DICTIONARY_FILE = 'msisdn.parquet'
+
+# Code réservé aux MSISDN manquants
+MISSING_CODE = -1
+
+STORED_COLUMNS = ['INITATE_DATE', 'DEBIT_MSISDN', 'CREDIT_MSISDN', 'REASON_CODE', 'AMOUNT']
+
+
+class CodeDictionary:
+    """Dictionnaire valeur → code entier, enrichi au fil des blocs."""
+
+    def __init__(self, values=()):
+        self._index = pd.Index(list(values), dtype=object)
+        self._labels = None
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def values(self):
+        """Valeurs, dans l'ordre des codes."""
+        return self._index.to_numpy()
+
+    def encode(self, values, dtype='int32'):
+        """
+        Codes des valeurs ; les valeurs inconnues sont ajoutées au dictionnaire.
+
+        Returns:
+            tableau NumPy de codes (MISSING_CODE pour les valeurs manquantes)
+        """
+        values = pd.Series(values, dtype=object)
+        codes = self._index.get_indexer(values)
+        unknown = (codes == -1) & values.notna().to_numpy()
+        if unknown.any():
+            self._index = self._index.append(pd.Index(values[unknown].unique(), dtype=object))
+            self._labels = None
+            codes = self._index.get_indexer(values)
+        return codes.astype(dtype)
+
+    def decode(self, codes):
+        """
+        Valeurs correspondant à des codes (None pour MISSING_CODE).
+
+        Returns:
+            tableau NumPy d'objets
+        """
+        if self._labels is None:
+            # Dernière case : libellé des codes manquants
+            self._labels = np.append(self._index.to_numpy(dtype=object), None)
+        codes = np.asarray(codes, dtype='int64')
+        return self._labels[np.where(codes < 0, len(self._labels) - 1, codes)]
+
+
+def _sub_cent_count(amounts):
+    """Nombre de montants que le stockage au centime ne restitue pas à l'identique."""
+    values = np.asarray(amounts, dtype=CSV_DTYPES['ACTUAL_AMOUNT'])
+    restored = (amount_to_int(values) / 100).astype(values.dtype)
+    return int(((restored != values) & ~np.isnan(values)).sum())
+
+
+def _partition_dir(store_dir, day, tx_type):
+    return os.path.join(store_dir, f"DATE={day.isoformat()}", f"TYPE={tx_type}")
+
+
+def _source_fingerprints(sources):
+    return [content_hash(source) for source in sources]
+
+
+class TransactionStore:
+    """Accès aux transactions prétraitées, par jour et par type."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, METADATA_FILE), encoding='utf-8') as handle:
+            self.metadata = json.load(handle)
+        self.reasons = pd.Index(self.metadata['reasons'], dtype=object)
+        self.transaction_types = list(self.metadata['transaction_types'])
+        dictionary = pq.read_table(os.path.join(store_dir, DICTIONARY_FILE), memory_map=True)
+        self.msisdns = CodeDictionary(dictionary.column('MSISDN').to_pylist())
+
+    @staticmethod
+    def exists(store_dir):
+        return os.path.exists(os.path.join(store_dir, METADATA_FILE))
+
+    def days(self):
+        """Jours disponibles, triés chronologiquement."""
+        return sorted(
+            pd.Timestamp(name.split('=', 1)[1]).date()
+            for name in os.listdir(self.store_dir) if name.startswith('DATE=')
+        )
+
+    def load(self, day, tx_type, columns=None, decode=False):
+        """
+        Transactions d'un type pour une journée, triées par INITATE_DATE.
+
+        Args:
+            day: jour (datetime.date)
+            tx_type: type de transaction (voir transaction_types)
+            columns: colonnes à charger (sous-ensemble de TRANSACTION_COLUMNS), None = toutes
+            decode: décoder les MSISDN en chaînes (sinon codes int32)
+
+        Returns:
+            DataFrame au format du loader (+ DATE), vide si la partition est absente
+        """
+        columns = list(columns or TRANSACTION_COLUMNS)
+        directory = _partition_dir(self.store_dir, day, tx_type) if day else None
+        if directory is None or not os.path.isdir(directory):
+            df = empty_transactions()
+            if not decode:
+                df['DEBIT_MSISDN'] = df['DEBIT_MSISDN'].astype('int32')
+                df['CREDIT_MSISDN'] = df['CREDIT_MSISDN'].astype('int32')
+            return df[columns + ['DATE']]
+
+        stored = {'REASON_NAME': 'REASON_CODE', 'ACTUAL_AMOUNT': 'AMOUNT'}
+        read_columns = sorted({stored.get(column, column) for column in columns} | {'INITATE_DATE'})
+        table = pq.read_table(directory, columns=read_columns, memory_map=True)
+        raw = table.to_pandas()
+
+        df = pd.DataFrame(index=raw.index)
+        for column in columns:
+            if column == 'REASON_NAME':
+                df[column] = pd.Categorical.from_codes(raw['REASON_CODE'], categories=self.reasons)
+            elif column == 'ACTUAL_AMOUNT':
+                df[column] = (raw['AMOUNT'] / 100).astype(CSV_DTYPES['ACTUAL_AMOUNT'])
+            elif column in ('DEBIT_MSISDN', 'CREDIT_MSISDN') and decode:
+                df[column] = self.msisdns.decode(raw[column])
+            else:
+                df[column] = raw[column]
+        df['DATE'] = raw['INITATE_DATE'].dt.date
+        order = np.argsort(raw['INITATE_DATE'].to_numpy(), kind='stable')
+        return df.iloc[order].reset_index(drop=True)
+
+    def load_day(self, day, tx_types=None, columns=None, decode=False):
+        """
+        Sous-ensembles typés d'une journée.
+
+        Returns:
+            dict type → DataFrame (même format que classify_transactions)
+        """
+        return {
+            tx_type: self.load(day, tx_type, columns=columns, decode=decode)
+            for tx_type in (tx_types or self.transaction_types)
+        }
+
+
+def build_store(sources, store_dir, chunksize=DEFAULT_CHUNKSIZE, rebuild=False, classifier=None):
+    """
+    Écrit (ou réutilise) le stockage colonnaire des transactions.
+
+    Le stockage existant est réutilisé si les empreintes des fichiers sources
+    et les règles de classification n'ont pas changé, réécrit sinon. Un
+    dossier non vide qui n'est pas un stockage (store.json absent) est refusé
+    (ValueError) plutôt qu'effacé. Les montants sont arrondis au centime ; un
+    avertissement signale les montants plus précis.
+
+    Args:
+        sources: liste de chemins ou objets fichiers CSV
+        store_dir: dossier du stockage
+        chunksize: nombre de lignes lues par bloc
+        rebuild: forcer la réécriture
+        classifier: TransactionClassifier, défaut DEFAULT_CLASSIFIER
+
+    Returns:
+        TransactionStore ouvert sur `store_dir`
+    """
+    classifier = classifier or DEFAULT_CLASSIFIER
+    fingerprints = _source_fingerprints(sources)
+    rules = classifier.metadata()
+    if not rebuild and TransactionStore.exists(store_dir):
+        store = TransactionStore(store_dir)
+        metadata = store.metadata
+        if (metadata.get('version') == STORE_VERSION and metadata.get('sources') == fingerprints
+                and metadata.get('rules') == rules):
+            return store
+
+    # Seul un stockage reconnu (store.json présent) est effacé : un dossier
+    # quelconque désigné par erreur n'est jamais supprimé
+    if TransactionStore.exists(store_dir):
+        shutil.rmtree(store_dir)
+    elif os.path.isdir(store_dir) and os.listdir(store_dir):
+        raise ValueError(
+            f"Stockage {store_dir} : dossier non vide qui n'est pas un stockage de transactions "
+            f"({METADATA_FILE} absent), choisir un autre dossier"
+        )
+    os.makedirs(store_dir, exist_ok=True)
+
+    msisdns = CodeDictionary()
+    reasons = CodeDictionary()
+    part = 0
+    sub_cent = 0
+    for source in sources:
+        for chunk in iter_chunks(source, chunksize):
+            for tx_type, subset in classify_transactions(chunk, classifier).items():
+                if subset.empty:
+                    continue
+                sub_cent += _sub_cent_count(subset['ACTUAL_AMOUNT'])
+                encoded = pd.DataFrame({
+                    'INITATE_DATE': subset['INITATE_DATE'],
+                    'DEBIT_MSISDN': msisdns.encode(subset['DEBIT_MSISDN']),
+                    'CREDIT_MSISDN': msisdns.encode(subset['CREDIT_MSISDN']),
+                    'REASON_CODE': reasons.encode(subset['REASON_NAME'], dtype='int16'),
+                    'AMOUNT': amount_to_int(subset['ACTUAL_AMOUNT']),
+                    'DATE': subset['DATE'],
+                })
+                for day, day_rows in encoded.groupby('DATE', sort=False):
+                    directory = _partition_dir(store_dir, day, tx_type)
+                    os.makedirs(directory, exist_ok=True)
+                    pq.write_table(
+                        pa.Table.from_pandas(day_rows[STORED_COLUMNS], preserve_index=False),
+                        os.path.join(directory, f"part-{part:05d}.parquet")
+                    )
+            part += 1
+    if sub_cent:
+        warnings.warn(
+            f"Stockage {store_dir} : {sub_cent} montant(s) au-delà du centime arrondi(s) au centime, "
+            f"les résultats peuvent différer d'une exécution en mémoire"
+        )
+
+    pq.write_table(
+        pa.table({'MSISDN': pa.array(msisdns.values, type=pa.string())}),
+        os.path.join(store_dir, DICTIONARY_FILE)
+    )
+    with open(os.path.join(store_dir, METADATA_FILE), 'w', encoding='utf-8') as handle:
+        json.dump({
+            'version': STORE_VERSION,
+            'sources': fingerprints,
+            'reasons': [str(reason) for reason in reasons.values],
+            'transaction_types': classifier.types,
+            'rules': rules,
+        }, handle, ensure_ascii=False, indent=2)
+
+    return TransactionStore(store_dir)
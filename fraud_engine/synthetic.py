@@ -0,0 +1,259 @@
+"""
+Générateur de transactions synthétiques
+
+Produit des fichiers au schéma exact des extractions D-Money (INITATE_DATE,
+DEBIT_MSISDN, CREDIT_MSISDN, REASON_NAME, ACTUAL_AMOUNT) : un bruit de fond
+respectant les rôles de chaque type (distributeur → client pour un Cash In,
+client → marchand pour un paiement, banque → client pour un B2W...) et des
+scénarios de fraude plantés dont la liste est renvoyée pour vérifier que les
+détecteurs les retrouvent.
+"""
+import numpy as np
+import pandas as pd
+
+from .chains import chain_labels
+
+# REASON_NAME bruts (casse et espaces des extractions) et part dans le bruit de fond
+DEFAULT_TYPE_MIX = {
+    'Merchant Payment': 0.22,
+    'Customer Cash In': 0.18,
+    'Customer Cash Out': 0.10,
+    'Merchant Cash Out': 0.04,
+    'Send Money': 0.22,
+    'W2B Transfer': 0.06,
+    'B2W Transfer': 0.06,
+    'Customer Redeem Point to Balance': 0.04,
+    'Airtime Purchase': 0.08,
+}
+
+# Type → (rôle du débiteur, rôle du créditeur)
+_ROLES = {
+    'Merchant Payment': ('client', 'merchant'),
+    'Customer Cash In': ('distributor', 'client'),
+    'Customer Cash Out': ('client', 'distributor'),
+    'Merchant Cash Out': ('merchant', 'distributor'),
+    'Send Money': ('client', 'client'),
+    'W2B Transfer': ('client', 'bank'),
+    'B2W Transfer': ('bank', 'client'),
+    'Customer Redeem Point to Balance': ('system', 'client'),
+    'Airtime Purchase': ('client', 'system'),
+}
+
+_SECONDS_PER_DAY = 86_400
+
+# Durée maximale d'un scénario planté (secondes), pour rester dans la journée
+_SCENARIO_SPAN = 4 * 3600
+
+# Durée maximale d'une rafale plantée (secondes)
+_BURST_SPAN = 50 * 60
+
+
+class Population:
+    """MSISDN des différents acteurs (clients, distributeurs, marchands, banques)."""
+
+    def __init__(self, n_clients, n_distributors=None, n_merchants=None, n_banks=8):
+        n_distributors = n_distributors or max(1, n_clients // 50)
+        n_merchants = n_merchants or max(1, n_clients // 20)
+        self.roles = {
+            'client': _msisdns(77_000_000, n_clients),
+            'distributor': _msisdns(78_000_000, n_distributors),
+            'merchant': _msisdns(79_000_000, n_merchants),
+            'bank': np.array([f"BANK{index:03d}" for index in range(n_banks)], dtype=object),
+            'system': np.array(["DMONEY"], dtype=object),
+        }
+
+    def sample(self, role, rng, size=None):
+        return rng.choice(self.roles[role], size=size)
+
+
+def _msisdns(first, count):
+    return np.array([f"253{first + index:08d}" for index in range(count)], dtype=object)
+
+
+def _amounts(rng, size):
+    """Montants log-normaux arrondis à 100 DJF."""
+    return np.maximum(100, np.round(rng.lognormal(8.0, 1.0, size) / 100) * 100)
+
+
+def _background(population, rng, start, days, tx_per_day, type_mix):
+    total = days * tx_per_day
+    reasons = np.array(list(type_mix), dtype=object)
+    weights = np.array(list(type_mix.values()), dtype='float64')
+    counts = rng.multinomial(total, weights / weights.sum())
+
+    frames = []
+    for reason, count in zip(reasons, counts):
+        debit_role, credit_role = _ROLES[reason]
+        frames.append(pd.DataFrame({
+            'DEBIT_MSISDN': population.sample(debit_role, rng, count),
+            'CREDIT_MSISDN': population.sample(credit_role, rng, count),
+            'REASON_NAME': reason,
+            'ACTUAL_AMOUNT': _amounts(rng, count),
+        }))
+    df = pd.concat(frames, ignore_index=True)
+    seconds = rng.integers(0, days * _SECONDS_PER_DAY, len(df))
+    df.insert(0, 'INITATE_DATE', start + pd.to_timedelta(seconds, unit='s'))
+    return df
+
+
+def _scenario_start(rng, start, days):
+    day = int(rng.integers(0, days))
+    return start + pd.Timedelta(days=day, seconds=int(rng.integers(0, _SECONDS_PER_DAY - _SCENARIO_SPAN)))
+
+
+def _minutes(rng, low, high):
+    return pd.Timedelta(minutes=int(rng.integers(low, high)))
+
+
+def generate_transactions(n_clients=1000, days=7, tx_per_day=10_000, n_circular=10, n_chains=10,
+                          chain_length=(1, 5), n_b2w=10, n_rings=10, ring_length=(3, 5), n_bursts=10,
+                          burst_size=(25, 40), start='2024-01-01', type_mix=None, seed=0):
+    """
+    Génère un jeu de transactions synthétiques avec des fraudes plantées.
+
+    Args:
+        n_clients: nombre de clients (distributeurs, marchands et banques en découlent)
+        days: nombre de jours
+        tx_per_day: nombre de transactions de fond par jour
+        n_circular: nombre de scénarios Cash In → Paiement → Cash Out plantés
+        n_chains: nombre de chaînes Cash In → Send Money (N) → W2B plantées
+        chain_length: (min, max) du nombre de Send Money des chaînes plantées
+        n_b2w: nombre de scénarios B2W → Send Money → W2B plantés
+        n_rings: nombre d'anneaux de Send Money A → B → ... → A plantés
+        ring_length: (min, max) du nombre de portefeuilles des anneaux plantés
+        n_bursts: nombre de rafales plantées (en alternance : Cash In reçus de
+            distributeurs, Send Money émis vers des clients, en moins d'une heure)
+        burst_size: (min, max) du nombre de transactions des rafales plantées
+        start: premier jour
+        type_mix: dict REASON_NAME → part du bruit de fond, défaut DEFAULT_TYPE_MIX
+        seed: graine aléatoire
+
+    Returns:
+        (DataFrame au schéma des extractions, dict scénario → liste des cas plantés)
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(start)
+    population = Population(n_clients)
+    df = _background(population, rng, start, days, tx_per_day, type_mix or DEFAULT_TYPE_MIX)
+
+    # Les fraudes plantées utilisent des clients dédiés, hors du bruit de fond
+    ring = iter(_msisdns(
+        76_000_000,
+        n_circular + n_chains * (chain_length[1] + 1) + 2 * n_b2w + n_rings * ring_length[1] + n_bursts
+    ))
+    planted = {'circular': [], 'chains': [], 'b2w_send_w2b': [], 'rings': [], 'velocity': []}
+    rows = []
+
+    for _ in range(n_circular):
+        client = next(ring)
+        distributor, cashout_to = population.sample('distributor', rng, 2)
+        merchant = population.sample('merchant', rng)
+        amount = float(_amounts(rng, 1)[0])
+        ci_time = _scenario_start(rng, start, days)
+        mp_time = ci_time + _minutes(rng, 1, 30)
+        co_time = mp_time + _minutes(rng, 1, 30)
+        rows += [
+            (ci_time, distributor, client, 'Customer Cash In', amount),
+            (mp_time, client, merchant, 'Merchant Payment', amount),
+            (co_time, merchant, cashout_to, 'Merchant Cash Out', amount),
+        ]
+        planted['circular'].append({'client': client, 'merchant': merchant, 'mp_time': mp_time, 'bco_time': co_time})
+
+    for _ in range(n_chains):
+        length = int(rng.integers(chain_length[0], chain_length[1] + 1))
+        clients = [next(ring) for _ in range(length + 1)]
+        distributor = population.sample('distributor', rng)
+        amount = float(_amounts(rng, 1)[0])
+        time = cashin_time = _scenario_start(rng, start, days)
+        rows.append((time, distributor, clients[0], 'Customer Cash In', amount))
+        for sender, receiver in zip(clients, clients[1:]):
+            time += _minutes(rng, 1, 20)
+            rows.append((time, sender, receiver, 'Send Money', amount))
+        time += _minutes(rng, 1, 20)
+        rows.append((time, clients[-1], population.sample('bank', rng), 'W2B Transfer', amount))
+        planted['chains'].append({
+            'distributor': distributor, 'clients_chain': ' → '.join(clients),
+            'cashin_time': cashin_time, 'w2b_time': time,
+        })
+
+    for _ in range(n_b2w):
+        client_a, client_b = next(ring), next(ring)
+        source_bank, destination_bank = population.sample('bank', rng, 2)
+        amount = float(_amounts(rng, 1)[0])
+        b2w_time = _scenario_start(rng, start, days)
+        send_time = b2w_time + _minutes(rng, 1, 60)
+        w2b_time = send_time + _minutes(rng, 1, 60)
+        rows += [
+            (b2w_time, source_bank, client_a, 'B2W Transfer', amount),
+            (send_time, client_a, client_b, 'Send Money', amount),
+            (w2b_time, client_b, destination_bank, 'W2B Transfer', amount),
+        ]
+        planted['b2w_send_w2b'].append({
+            'client_A': client_a, 'client_B': client_b, 'b2w_time': b2w_time, 'w2b_time': w2b_time,
+        })
+
+    for _ in range(n_rings):
+        length = int(rng.integers(ring_length[0], ring_length[1] + 1))
+        wallets = [next(ring) for _ in range(length)]
+        amount = float(_amounts(rng, 1)[0])
+        time = start_time = _scenario_start(rng, start, days)
+        for sender, receiver in zip(wallets, wallets[1:] + wallets[:1]):
+            rows.append((time, sender, receiver, 'Send Money', amount))
+            time += _minutes(rng, 1, 20)
+        planted['rings'].append({'wallets': ' → '.join(wallets + wallets[:1]), 'start_time': start_time})
+
+    for index in range(n_bursts):
+        wallet = next(ring)
+        size = int(rng.integers(burst_size[0], burst_size[1] + 1))
+        start_time = _scenario_start(rng, start, days)
+        times = start_time + pd.to_timedelta(np.sort(rng.integers(0, _BURST_SPAN, size)), unit='s')
+        amounts = _amounts(rng, size)
+        if index % 2 == 0:
+            tx_type, direction = 'cashin', 'in'
+            counterparties = population.sample('distributor', rng, size)
+            rows += [
+                (time, distributor, wallet, 'Customer Cash In', float(amount))
+                for time, distributor, amount in zip(times, counterparties, amounts)
+            ]
+        else:
+            tx_type, direction = 'send', 'out'
+            counterparties = population.sample('client', rng, size)
+            rows += [
+                (time, wallet, client, 'Send Money', float(amount))
+                for time, client, amount in zip(times, counterparties, amounts)
+            ]
+        planted['velocity'].append({'msisdn': wallet, 'tx_type': tx_type, 'direction': direction})
+
+    if rows:
+        df = pd.concat([df, pd.DataFrame(rows, columns=df.columns)], ignore_index=True)
+    df = df.sort_values('INITATE_DATE', kind='stable').reset_index(drop=True)
+    df['ACTUAL_AMOUNT'] = df['ACTUAL_AMOUNT'].astype('float32')
+    return df, planted
+
+
+def write_transactions(df, path):
+    """Écrit les transactions au format CSV des extractions."""
+    df.to_csv(path, index=False, date_format='%Y-%m-%d %H:%M:%S')
+
+
+def recovered(results, planted):
+    """
+    Vérifie que les scénarios plantés figurent dans les résultats de détection.
+
+    Args:
+        results: dict nom de résultat → DataFrame (voir pipeline.run_detectors)
+        planted: cas plantés (voir generate_transactions)
+
+    Returns:
+        dict scénario → {'plantes', 'retrouves'}
+    """
+    report = {}
+    for name, cases in planted.items():
+        found = 0
+        if cases:
+            keys = list(cases[0])
+            # Parcours des chaînes comparés sur leurs libellés ('A → B → C')
+            detected = set(chain_labels(results[name][keys]).itertuples(index=False, name=None))
+            found = sum(tuple(case[key] for key in keys) in detected for case in cases)
+        report[name] = {'plantes': len(cases), 'retrouves': found}
+    return report
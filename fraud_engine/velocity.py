@@ -0,0 +1,216 @@
+"""
+Vélocité : rafales de transactions par portefeuille sur des fenêtres glissantes
+
+Chaque flux d'un portefeuille (type de transaction et sens : Cash In reçus,
+Send Money émis...) est examiné sur plusieurs durées (10 min, 1 h et 24 h par
+défaut). Chaque transaction ouvre une fenêtre [t, t + durée] : les
+transactions de tous les flux sont triées une seule fois par clé composite
+(flux du portefeuille, rang du temps) et la fin de chaque fenêtre est trouvée
+par dichotomie vectorisée, le nombre de transactions étant une différence
+d'indices. Aucune boucle par portefeuille.
+
+La fenêtre la plus chargée de chaque flux et de chaque jour (pic du jour)
+est retenue ; montants et contreparties distinctes sont agrégés sur sa plage
+d'indices. Un pic est une rafale s'il atteint le seuil de sa durée, ou s'il
+dépasse `burst_ratio` fois l'habitude du portefeuille : la moyenne de ses
+pics des autres jours d'activité, pour le même flux et la même durée.
+"""
+import numpy as np
+import pandas as pd
+
+from .scheduler import checkpoint
+from .scoring import score_cases
+from .windows import key_codes, minutes_to_ns
+
+# Flux examinés : (type de transaction, sens du point de vue du portefeuille)
+VELOCITY_FLOWS = [
+    ('cashin', 'in'), ('send', 'out'), ('send', 'in'), ('mp', 'out'), ('cashout', 'out'), ('w2b', 'out'),
+    ('b2w', 'in'),
+]
+
+# Types de transaction lus par le détecteur
+VELOCITY_TYPES = sorted({tx_type for tx_type, _ in VELOCITY_FLOWS})
+
+# Sens → (colonne du portefeuille, colonne de la contrepartie)
+FLOW_SIDES = {'in': ('CREDIT_MSISDN', 'DEBIT_MSISDN'), 'out': ('DEBIT_MSISDN', 'CREDIT_MSISDN')}
+
+# Durée des fenêtres (minutes) → nombre de transactions à partir duquel un pic est une rafale
+VELOCITY_WINDOWS = {10: 10, 60: 20, 1440: 50}
+
+# Pic rapporté à l'habitude du portefeuille à partir duquel il est une rafale
+VELOCITY_BURST_RATIO = 5.0
+
+# Nombre minimal de transactions d'une rafale détectée par rapport à l'habitude
+VELOCITY_MIN_BURST = 10
+
+PEAK_COLUMNS = [
+    'date', 'msisdn', 'tx_type', 'direction', 'window_minutes', 'start', 'end',
+    'nb_transactions', 'total_amount', 'nb_counterparties',
+]
+
+VELOCITY_COLUMNS = PEAK_COLUMNS + ['baseline', 'burst_ratio', 'risk_score', 'flags']
+
+_DAY_NS = 24 * 60 * minutes_to_ns(1)
+
+
+def parse_velocity_window(text):
+    """'60=20' → (60, 20) : durée de la fenêtre (minutes) et seuil du nombre de transactions."""
+    minutes, _, threshold = text.partition('=')
+    try:
+        minutes, threshold = float(minutes), int(threshold)
+    except ValueError:
+        raise ValueError(f"Fenêtre de vélocité invalide : {text} (format MIN=NOMBRE)") from None
+    if minutes <= 0 or threshold <= 0:
+        raise ValueError(f"Fenêtre de vélocité invalide : {text} (durée et nombre positifs)")
+    return (int(minutes) if minutes.is_integer() else minutes), threshold
+
+
+def _flow_events(types):
+    """Transactions de tous les flux : (flux, portefeuille, contrepartie, temps, montant, DATE)."""
+    parts = []
+    for flow, (tx_type, direction) in enumerate(VELOCITY_FLOWS):
+        wallet_column, counterparty_column = FLOW_SIDES[direction]
+        frame = types[tx_type].dropna(subset=['INITATE_DATE', wallet_column, counterparty_column])
+        parts.append((
+            np.full(len(frame), flow, dtype='int64'),
+            frame[wallet_column].to_numpy(dtype=object),
+            frame[counterparty_column].to_numpy(dtype=object),
+            frame['INITATE_DATE'].to_numpy(dtype='datetime64[ns]').view('int64'),
+            frame['ACTUAL_AMOUNT'].to_numpy(dtype='float64'),
+            frame['DATE'].to_numpy(dtype=object),
+        ))
+    return [np.concatenate(column) for column in zip(*parts)]
+
+
+def daily_peaks(types, windows=VELOCITY_WINDOWS, day=None):
+    """
+    Fenêtre la plus chargée de chaque flux de portefeuille, par jour et par durée.
+
+    Args:
+        types: dict type → DataFrame (voir classify.classify_transactions)
+        windows: durées des fenêtres (minutes), seuils éventuels en valeurs
+        day: ne garder que les pics commençant ce jour (les transactions des
+            jours suivants ne servent qu'à compléter leurs fenêtres), None = tous
+
+    Returns:
+        DataFrame (colonnes PEAK_COLUMNS), pics à égalité : le plus ancien
+    """
+    flows, wallets, counterparties, times, amounts, dates = _flow_events(types)
+    if not len(times) or not windows:
+        return pd.DataFrame(columns=PEAK_COLUMNS)
+
+    # Tri unique par (flux du portefeuille, temps) via une clé composite (groupe, rang du temps)
+    wallet_codes, counterparty_codes = key_codes(wallets, counterparties)
+    groups = wallet_codes * len(VELOCITY_FLOWS) + flows
+    unique_times, time_rank = np.unique(times, return_inverse=True)
+    width = len(unique_times) + 1
+    keys = groups * width + time_rank
+    order = np.argsort(keys, kind='stable')
+    keys, groups, times = keys[order], groups[order], times[order]
+    # Une fenêtre commence avec toutes les transactions de même instant
+    starts = np.searchsorted(keys, keys, side='left')
+
+    # Jours de chaque groupe : plages contiguës de l'ordre trié
+    days = times // _DAY_NS
+    segment_first = np.r_[True, (groups[1:] != groups[:-1]) | (days[1:] != days[:-1])]
+    segment_starts = np.flatnonzero(segment_first)
+    segments = np.cumsum(segment_first) - 1
+    span = counterparty_codes.max() + 1
+    kept_day = None if day is None else pd.Timestamp(day).value // _DAY_NS
+
+    columns = {name: [] for name in ('window_minutes', 'first', 'start', 'end', 'count', 'amount', 'distinct')}
+    for window_minutes in windows:
+        checkpoint()
+        limit = np.searchsorted(unique_times, times + minutes_to_ns(window_minutes), side='right') - 1
+        ends = np.searchsorted(keys, groups * width + limit, side='right')
+        counts = ends - starts
+
+        # Pic du jour : première transaction dont la fenêtre atteint le maximum du segment
+        is_peak = counts == np.maximum.reduceat(counts, segment_starts)[segments]
+        candidates = np.flatnonzero(is_peak)
+        peaks = candidates[np.r_[True, segments[candidates[1:]] != segments[candidates[:-1]]]]
+        if kept_day is not None:
+            peaks = peaks[days[peaks] == kept_day]
+
+        # Montants et contreparties distinctes sur les plages [début, fin) des pics
+        sizes = counts[peaks]
+        offsets = np.cumsum(sizes) - sizes
+        members = order[np.repeat(starts[peaks], sizes) + np.arange(sizes.sum()) - np.repeat(offsets, sizes)]
+        distinct = np.unique(np.repeat(np.arange(len(peaks)), sizes) * span + counterparty_codes[members])
+        columns['window_minutes'].append(np.full(len(peaks), window_minutes))
+        columns['first'].append(order[peaks])
+        columns['start'].append(times[peaks])
+        columns['end'].append(times[ends[peaks] - 1])
+        columns['count'].append(sizes)
+        columns['amount'].append(np.add.reduceat(amounts[members], offsets))
+        columns['distinct'].append(np.bincount(distinct // span, minlength=len(peaks)))
+
+    # Colonnes texte construites une seule fois pour toutes les durées
+    columns = {name: np.concatenate(values) for name, values in columns.items()}
+    first = columns['first']
+    peaks = pd.DataFrame({
+        'date': dates[first],
+        'msisdn': wallets[first],
+        'tx_type': np.array([tx_type for tx_type, _ in VELOCITY_FLOWS], dtype=object)[flows[first]],
+        'direction': np.array([direction for _, direction in VELOCITY_FLOWS], dtype=object)[flows[first]],
+        'window_minutes': columns['window_minutes'],
+        'start': columns['start'].view('datetime64[ns]'),
+        'end': columns['end'].view('datetime64[ns]'),
+        'nb_transactions': columns['count'].astype('int64'),
+        'total_amount': columns['amount'],
+        'nb_counterparties': columns['distinct'].astype('int64'),
+    })
+    return peaks
+
+
+def velocity_bursts(peaks, windows=VELOCITY_WINDOWS, burst_ratio=VELOCITY_BURST_RATIO, risk_rules=None):
+    """
+    Rafales parmi les pics journaliers : seuil de la durée atteint, ou pic
+    supérieur à burst_ratio fois la moyenne des pics des autres jours du
+    même flux (baseline, vide pour un portefeuille actif un seul jour).
+
+    Args:
+        peaks: pics de toute la période (voir daily_peaks)
+        windows: durée (minutes) → seuil du nombre de transactions, None = sans seuil
+        burst_ratio: rapport minimal à l'habitude, None = habitude ignorée
+        risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+
+    Returns:
+        DataFrame des rafales (colonnes VELOCITY_COLUMNS)
+    """
+    peaks = peaks.reset_index(drop=True)
+    flows = peaks.groupby(['msisdn', 'tx_type', 'direction', 'window_minutes'], sort=False)['nb_transactions']
+    totals, active_days = flows.transform('sum'), flows.transform('size')
+    counts = peaks['nb_transactions']
+    peaks['baseline'] = ((totals - counts) / (active_days - 1)).where(active_days > 1).astype('float64')
+    peaks['burst_ratio'] = (counts / peaks['baseline']).astype('float64')
+
+    thresholds = peaks['window_minutes'].map(dict(windows)).astype('float64')
+    keep = (counts >= thresholds).to_numpy(copy=True)
+    if burst_ratio is not None:
+        keep |= ((peaks['burst_ratio'] >= burst_ratio) & (counts >= VELOCITY_MIN_BURST)).to_numpy()
+    bursts = peaks[keep].reset_index(drop=True)
+    return score_cases(bursts, 'velocity', risk_rules)[VELOCITY_COLUMNS]
+
+
+def detect_velocity(types, windows=VELOCITY_WINDOWS, burst_ratio=VELOCITY_BURST_RATIO, risk_rules=None):
+    """
+    Détecte les rafales de transactions par portefeuille (une passe sur la période).
+
+    Args:
+        types: dict type → DataFrame (voir classify.classify_transactions)
+        windows: durée des fenêtres (minutes) → seuil du nombre de transactions
+        burst_ratio: rapport minimal à l'habitude du portefeuille, None = seuils seulement
+        risk_rules: RiskRules (voir scoring), défaut config/risk_rules.json
+
+    Returns:
+        DataFrame des rafales (colonnes VELOCITY_COLUMNS)
+    """
+    return velocity_bursts(daily_peaks(types, windows), windows, burst_ratio, risk_rules)
+
+
+def sort_velocity(velocity_df):
+    """Rafales par début, portefeuille, flux et durée de fenêtre."""
+    return velocity_df.sort_values(
+        ['start', 'msisdn', 'tx_type', 'direction', 'window_minutes'], kind='stable'
+    ).reset_index(drop=True)
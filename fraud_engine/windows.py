@@ -0,0 +1,232 @@
+"""
+Jointures par fenêtre temporelle glissante
+
+Au lieu de partitionner par jour calendaire, les événements sont répartis dans
+des intervalles de temps de largeur égale au délai maximal de l'étape : un
+événement de droite postérieur d'au plus `max_delay` à un événement de gauche
+se trouve forcément dans le même intervalle ou dans le suivant. Chaque
+intervalle n'est donc joint qu'à lui-même et au suivant, ce qui borne les
+paires candidates par la proximité temporelle réelle et rattrape les
+scénarios qui franchissent minuit.
+
+Les jointures en chaîne sur des clients très actifs utilisent plutôt
+range_pairs : les événements de droite sont triés par (clé, temps) et chaque
+événement de gauche ne reçoit que la plage d'indices qui respecte l'ordre
+temporel et le délai, sans produit cartésien intermédiaire.
+
+Une fenêtre est définie par scénario, avec un délai maximal par étape :
+    {'cashin_w2b': (120,), 'b2w_send_w2b': (60, 60)}
+Les scénarios sans fenêtre restent limités au jour calendaire.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from .instrument import count
+
+# Étapes de chaque scénario, dans l'ordre des délais d'une fenêtre
+SCENARIO_HOPS = {
+    'circular': ('Cash In → Merchant Payment', 'Merchant Payment → Cash Out'),
+    'cashin_w2b': ('Cash In → W2B',),
+    'chains': ("Étape d'une chaîne (Cash In → Send Money → ... → W2B)",),
+    'b2w_send_w2b': ('B2W → Send Money', 'Send Money → W2B'),
+    'rings': ("Étape d'un anneau (Send Money → ... → retour au premier portefeuille)",),
+}
+
+_BUCKET = '_bucket'
+_INT64_MAX = np.iinfo('int64').max
+_NS_PER_MINUTE = 60 * 1_000_000_000
+_MINUTES_PER_DAY = 24 * 60
+
+
+def minutes_to_ns(minutes):
+    return int(minutes * _NS_PER_MINUTE)
+
+
+def _time_ns(series):
+    return series.to_numpy(dtype='datetime64[ns]').view('int64')
+
+
+def validate_windows(windows):
+    """
+    Normalise les fenêtres : scénario → tuple de délais (minutes), un par étape.
+
+    Raises:
+        ValueError: scénario inconnu, nombre de délais incorrect ou délai non positif
+    """
+    normalized = {}
+    for scenario, delays in (windows or {}).items():
+        if scenario not in SCENARIO_HOPS:
+            raise ValueError(f"Scénario inconnu : {scenario} (attendus : {', '.join(SCENARIO_HOPS)})")
+        delays = (delays,) if isinstance(delays, (int, float)) else tuple(delays)
+        if len(delays) != len(SCENARIO_HOPS[scenario]):
+            raise ValueError(
+                f"{scenario} attend {len(SCENARIO_HOPS[scenario])} délai(s) : {', '.join(SCENARIO_HOPS[scenario])}"
+            )
+        if any(delay <= 0 for delay in delays):
+            raise ValueError(f"Les délais de {scenario} doivent être positifs")
+        normalized[scenario] = tuple(float(delay) for delay in delays)
+    return normalized
+
+
+def parse_window(text):
+    """'b2w_send_w2b=60,30' → ('b2w_send_w2b', (60.0, 30.0))."""
+    scenario, _, delays = text.partition('=')
+    try:
+        values = tuple(float(value) for value in delays.split(','))
+    except ValueError:
+        raise ValueError(f"Fenêtre invalide : {text} (format SCENARIO=MIN[,MIN])") from None
+    scenario = scenario.strip()
+    return scenario, validate_windows({scenario: values})[scenario]
+
+
+def window_span(windows, max_depth=10, ring_length=None):
+    """
+    Durée maximale (minutes) d'un scénario fenêtré, de sa première à sa
+    dernière transaction (une chaîne compte au plus max_depth étapes, un
+    anneau au plus ring_length transferts, défaut max_depth).
+    """
+    steps = {'chains': max_depth, 'rings': ring_length or max_depth}
+    spans = [
+        delays[0] * steps[scenario] if scenario in steps else sum(delays)
+        for scenario, delays in validate_windows(windows).items()
+    ]
+    return max(spans, default=0)
+
+
+def span_days(span):
+    """Nombre de jours suivants couverts par une durée (minutes)."""
+    return math.ceil(span / _MINUTES_PER_DAY)
+
+
+def window_join(left, right, left_on, right_on, left_time, right_time, max_delay, suffixes=('_x', '_y'),
+                counter='window_candidates'):
+    """
+    Jointure sur clés limitée aux paires 0 < temps droite - temps gauche <= max_delay.
+
+    Args:
+        left, right: DataFrames
+        left_on, right_on: colonnes de clé (listes de même longueur)
+        left_time, right_time: colonnes d'horodatage
+        max_delay: délai maximal (minutes)
+        suffixes: suffixes des colonnes homonymes
+        counter: nom du compteur des paires candidates (voir instrument.count)
+
+    Returns:
+        DataFrame des paires, dans l'ordre (ligne de gauche, temps de droite)
+    """
+    width = minutes_to_ns(max_delay)
+    if width <= 0:
+        raise ValueError("Le délai maximal doit être positif")
+    left_on, right_on = list(left_on), list(right_on)
+
+    left = left.dropna(subset=left_on + [left_time]).assign(_left_order=lambda df: np.arange(len(df)))
+    right = right.dropna(subset=right_on + [right_time])
+    left_bucket = _time_ns(left[left_time]) // width
+    right = right.assign(**{_BUCKET: _time_ns(right[right_time]) // width})
+
+    # Même intervalle, puis intervalle suivant
+    pairs = [
+        pd.merge(
+            left.assign(**{_BUCKET: left_bucket + shift}), right,
+            left_on=left_on + [_BUCKET], right_on=right_on + [_BUCKET], suffixes=suffixes,
+        )
+        for shift in (0, 1)
+    ]
+    merged = pd.concat(pairs, ignore_index=True)
+    count(counter, len(merged))
+
+    left_name = left_time if left_time not in right.columns else left_time + suffixes[0]
+    right_name = right_time if right_time not in left.columns else right_time + suffixes[1]
+    delay = _time_ns(merged[right_name]) - _time_ns(merged[left_name])
+    merged = merged[(delay > 0) & (delay <= width)]
+    merged = merged.sort_values(['_left_order', right_name], kind='stable')
+    return merged.drop(columns=['_left_order', _BUCKET]).reset_index(drop=True)
+
+
+def _rank(sorted_keys, sorted_times, keys, times):
+    """
+    Nombre d'événements triés (clé, temps) inférieurs ou égaux à chaque (clé, temps)
+    demandé : équivalent de searchsorted(side='right') sur un couple de colonnes.
+    """
+    known = len(sorted_keys)
+    order = np.lexsort((
+        np.concatenate([np.zeros(known, dtype='int8'), np.ones(len(keys), dtype='int8')]),
+        np.concatenate([sorted_times, times]),
+        np.concatenate([sorted_keys, keys]),
+    ))
+    is_query = order >= known
+    ranks = np.cumsum(~is_query)
+    result = np.empty(len(keys), dtype='int64')
+    result[order[is_query] - known] = ranks[is_query]
+    return result
+
+
+def range_pairs(left_keys, left_times, right_keys, right_times, max_delay=None, max_per_key=None):
+    """
+    Paires (gauche, droite) de même clé, droite strictement postérieure à
+    gauche et au plus max_delay après.
+
+    Les paires sont générées par plages d'indices dans les événements de droite
+    triés par (clé, temps) : aucune paire hors fenêtre n'est matérialisée.
+
+    Args:
+        left_keys, right_keys: codes entiers des clés (voir key_codes)
+        left_times, right_times: horodatages en nanosecondes (int64)
+        max_delay: délai maximal (minutes), None = tous les événements suivants de la clé
+        max_per_key: nombre maximal de paires par clé (celles des événements
+            de gauche les plus anciens sont conservées), None = illimité
+
+    Returns:
+        (indices gauche, indices droite, nombre de clés plafonnées) ; les
+        paires sont triées par indice de gauche puis par temps de droite
+    """
+    right_order = np.lexsort((right_times, right_keys))
+    sorted_keys, sorted_times = right_keys[right_order], right_times[right_order]
+
+    lo = _rank(sorted_keys, sorted_times, left_keys, left_times)
+    limit = np.full(len(left_keys), _INT64_MAX) if max_delay is None else left_times + minutes_to_ns(max_delay)
+    lengths = _rank(sorted_keys, sorted_times, left_keys, limit) - lo
+
+    capped = 0
+    if max_per_key is not None and len(lengths):
+        # Paires déjà attribuées à la clé avant chaque événement de gauche (ordre chronologique)
+        order = np.lexsort((left_times, left_keys))
+        ordered_keys, ordered_lengths = left_keys[order], lengths[order]
+        first = np.concatenate(([True], ordered_keys[1:] != ordered_keys[:-1]))
+        before = np.cumsum(ordered_lengths) - ordered_lengths
+        before -= before[first][np.cumsum(first) - 1]
+        allowed = np.clip(max_per_key - before, 0, ordered_lengths)
+        capped = len(np.unique(ordered_keys[allowed < ordered_lengths]))
+        lengths[order] = allowed
+
+    starts = np.cumsum(lengths) - lengths
+    left_index = np.repeat(np.arange(len(lengths)), lengths)
+    offsets = np.arange(len(left_index)) - np.repeat(starts, lengths)
+    right_index = right_order[np.repeat(lo, lengths) + offsets]
+    return left_index, right_index, capped
+
+
+def key_codes(*columns, by=None):
+    """
+    Codes entiers communs à plusieurs colonnes de clé de même nature
+    (ex. CREDIT_MSISDN des B2W et DEBIT_MSISDN des Send Money).
+
+    Args:
+        columns: colonnes de clé (Series ou tableaux)
+        by: colonnes de clé secondaires, une par colonne (ex. DATE), None = aucune
+
+    Returns:
+        liste de tableaux de codes int64, un par colonne
+    """
+    def factorize(values):
+        combined = pd.concat([pd.Series(np.asarray(value)) for value in values], ignore_index=True)
+        codes, uniques = pd.factorize(combined)
+        return codes.astype('int64'), len(uniques)
+
+    codes, _ = factorize(columns)
+    if by is not None:
+        secondary, count = factorize(by)
+        codes = codes * count + secondary
+    return np.split(codes, np.cumsum([len(column) for column in columns])[:-1])